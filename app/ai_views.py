@@ -0,0 +1,40 @@
+"""Gemini-assisted tender analysis."""
+from flask import Blueprint, current_app, render_template, request, jsonify
+
+from app import gemini_request, login_required
+
+bp = Blueprint('ai', __name__)
+
+# Tender analysis routes
+@bp.route('/tender-analysis')
+@login_required
+def tender_analysis():
+    """Tender analysis page"""
+    return render_template('tender_analysis.html')
+
+@bp.route('/api/analyze-tender', methods=['POST'])
+@login_required
+def analyze_tender():
+    """API for tender analysis with Gemini"""
+    if request.method == 'POST':
+        tender_text = request.form.get('tender_text', '').strip()
+        if not tender_text:
+            return jsonify({"error": "Tender text is required"}), 400
+        
+        try:
+            prompt = f"""Analyze the following tender document and provide:
+1. Summary of main requirements
+2. Important deadlines
+3. Evaluation criteria
+4. Recommendations for proposal preparation
+
+Document:
+{tender_text}"""
+            
+            analysis = gemini_request(prompt)
+            return jsonify({'analysis': analysis})
+        except Exception as e:
+            current_app.logger.error(f"Tender analysis error: {str(e)}")
+            return jsonify({'error': 'Analysis error'}), 500
+    
+    return jsonify({'error': 'Invalid method'}), 405
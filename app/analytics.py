@@ -0,0 +1,408 @@
+"""Columnar per-tenant snapshots of the ledger for ad-hoc analytics.
+
+income, expenses and general_expenses of a company are copied into Parquet
+files under ``ANALYTICS_DIR/company_<id>/`` and queried with Arrow compute
+kernels, so multi-year group-bys never touch the OLTP tables.
+
+Refreshes are incremental: every table keeps an id watermark and only rows
+above it are appended, as a new part file.  The row count and amount sum
+below the watermark are stored as a fingerprint; when they no longer match
+(a project and its entries were deleted) the table is rebuilt.  Part files
+are compacted once there are more than ``COMPACT_PARTS`` of them.  Projects
+(names, start dates) are small and rewritten on every refresh.
+
+A refresh takes a per-company advisory lock, so several workers (or the CLI)
+never write the same snapshot at once.  Needs pyarrow; without it
+``available()`` is False and the API answers 503.
+
+    python app/analytics.py refresh                  # every company with a snapshot
+    python app/analytics.py refresh --company-id 42
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+
+from lazy import optional_import
+
+# Optional, imported on first use; analytics endpoints are disabled without it
+pa = optional_import('pyarrow')
+pc = optional_import('pyarrow.compute')
+pq = optional_import('pyarrow.parquet')
+
+ADVISORY_LOCK_ID = 4_512_041
+BATCH_ROWS = 50_000
+COMPACT_PARTS = 16
+GROUP_KEYS = ('project', 'month', 'year', 'currency', 'type')
+
+# Rows above the watermark, and the fingerprint of the rows at or below it
+LEDGER_SQL = {
+    'income': ("""
+        SELECT i.id, i.project_id, i.type, i.date, i.amount, i.currency
+        FROM income i JOIN projects p ON p.id = i.project_id
+        WHERE p.company_id = %s AND i.id > %s
+        ORDER BY i.id
+    """, """
+        SELECT COUNT(*), COALESCE(SUM(i.amount), 0)
+        FROM income i JOIN projects p ON p.id = i.project_id
+        WHERE p.company_id = %s AND i.id <= %s
+    """),
+    'expenses': ("""
+        SELECT e.id, e.project_id, e.type, e.date, e.amount, e.currency
+        FROM expenses e JOIN projects p ON p.id = e.project_id
+        WHERE p.company_id = %s AND e.id > %s
+        ORDER BY e.id
+    """, """
+        SELECT COUNT(*), COALESCE(SUM(e.amount), 0)
+        FROM expenses e JOIN projects p ON p.id = e.project_id
+        WHERE p.company_id = %s AND e.id <= %s
+    """),
+    'general_expenses': ("""
+        SELECT id, NULL, type, date, amount, currency
+        FROM general_expenses
+        WHERE company_id = %s AND id > %s
+        ORDER BY id
+    """, """
+        SELECT COUNT(*), COALESCE(SUM(amount), 0)
+        FROM general_expenses
+        WHERE company_id = %s AND id <= %s
+    """),
+}
+
+
+def available():
+    return pa is not None
+
+
+def snapshot_dir():
+    return os.getenv('ANALYTICS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analytics_data')
+
+
+def _ledger_schema():
+    return pa.schema([('id', pa.int64()), ('project_id', pa.int64()), ('type', pa.string()),
+                      ('date', pa.date32()), ('amount', pa.decimal128(15, 2)), ('currency', pa.string())])
+
+
+def _project_schema():
+    return pa.schema([('id', pa.int64()), ('name', pa.string()), ('start_date', pa.date32())])
+
+
+def _to_table(rows, schema):
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.table([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+class SnapshotStore:
+    """Parquet snapshots, one directory per company, plus an in-memory cache of loaded tables"""
+
+    def __init__(self, directory, cache_size=16):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, company_id, *names):
+        return os.path.join(self.directory, f"company_{company_id}", *names)
+
+    def companies(self):
+        """Companies that already have a snapshot"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(name.split('_', 1)[1]) for name in os.listdir(self.directory)
+                      if name.startswith('company_') and name.split('_', 1)[1].isdigit())
+
+    def state(self, company_id):
+        try:
+            with open(self._path(company_id, 'state.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_state(self, company_id, state):
+        target = self._path(company_id, 'state.json')
+        with open(target + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(target + '.tmp', target)
+
+    # ----- refresh -----
+
+    def refresh(self, conn, company_id, wait=False):
+        """Bring one company's snapshot up to date; returns {table: rows appended} or None if locked"""
+        cur = conn.cursor()
+        try:
+            if wait:
+                cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (ADVISORY_LOCK_ID, company_id))
+            else:
+                cur.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", (ADVISORY_LOCK_ID, company_id))
+                if not cur.fetchone()[0]:
+                    return None
+            os.makedirs(self._path(company_id), exist_ok=True)
+            state = self.state(company_id) or {'tables': {}, 'next_part': 0}
+            appended = {}
+            for table in LEDGER_SQL:
+                appended[table] = self._refresh_table(cur, company_id, table, state)
+
+            cur.execute("SELECT id, name, start_date FROM projects WHERE company_id = %s", (company_id,))
+            projects = self._path(company_id, 'projects.parquet')
+            pq.write_table(_to_table(cur.fetchall(), _project_schema()), projects + '.tmp')
+            os.replace(projects + '.tmp', projects)
+
+            state['refreshed_at'] = datetime.now().isoformat(timespec='seconds')
+            self._write_state(company_id, state)
+            self._remove_orphans(company_id, state)
+            return appended
+        finally:
+            conn.rollback()
+            cur.close()
+
+    def _refresh_table(self, cur, company_id, table, state):
+        select_sql, fingerprint_sql = LEDGER_SQL[table]
+        entry = state['tables'].setdefault(table, {'watermark': 0, 'rows': 0, 'amount': '0', 'parts': []})
+        if entry['watermark']:
+            cur.execute(fingerprint_sql, (company_id, entry['watermark']))
+            count, total = cur.fetchone()
+            if count != entry['rows'] or Decimal(total) != Decimal(entry['amount']):
+                # Rows under the watermark changed: start this table over
+                entry.update(watermark=0, rows=0, amount='0', parts=[])
+
+        cur.execute(select_sql, (company_id, entry['watermark']))
+        appended = 0
+        while True:
+            rows = cur.fetchmany(BATCH_ROWS)
+            if not rows:
+                break
+            part = f"{table}-{state['next_part']:06d}.parquet"
+            state['next_part'] += 1
+            pq.write_table(_to_table(rows, _ledger_schema()), self._path(company_id, part))
+            entry['parts'].append(part)
+            entry['watermark'] = rows[-1][0]
+            entry['rows'] += len(rows)
+            entry['amount'] = str(Decimal(entry['amount']) + sum(row[4] for row in rows))
+            appended += len(rows)
+
+        if len(entry['parts']) > COMPACT_PARTS:
+            part = f"{table}-{state['next_part']:06d}.parquet"
+            state['next_part'] += 1
+            pq.write_table(self._read_parts(company_id, entry['parts']), self._path(company_id, part))
+            entry['parts'] = [part]
+        return appended
+
+    def _remove_orphans(self, company_id, state):
+        """Delete part files no longer referenced by the state (rebuilt or compacted)"""
+        keep = {'state.json', 'projects.parquet'}
+        for entry in state['tables'].values():
+            keep.update(entry['parts'])
+        for name in os.listdir(self._path(company_id)):
+            if name not in keep and not name.endswith('.tmp'):
+                os.remove(self._path(company_id, name))
+
+    # ----- read -----
+
+    def _read_parts(self, company_id, parts):
+        if not parts:
+            return _ledger_schema().empty_table()
+        return pa.concat_tables([pq.read_table(self._path(company_id, part)) for part in parts])
+
+    def _read_tables(self, company_id, state):
+        tables = {table: self._read_parts(company_id, entry['parts']) for table, entry in state['tables'].items()}
+        tables['projects'] = pq.read_table(self._path(company_id, 'projects.parquet'))
+        return tables
+
+    def load(self, company_id):
+        """(tables, state) for a company, or (None, None) before its first refresh"""
+        for attempt in range(2):
+            state = self.state(company_id)
+            if state is None:
+                return None, None
+            key = (company_id, state['refreshed_at'])
+            with self._lock:
+                tables = self._cache.get(key)
+                if tables is not None:
+                    self._cache.move_to_end(key)
+                    return tables, state
+            try:
+                tables = self._read_tables(company_id, state)
+                break
+            except FileNotFoundError:
+                # A refresh in another process compacted and removed parts listed
+                # in the state we read; its new state.json is already in place
+                if attempt:
+                    raise
+        with self._lock:
+            for stale in [k for k in self._cache if k[0] == company_id]:
+                del self._cache[stale]
+            self._cache[key] = tables
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tables, state
+
+
+class Refresher:
+    """Background thread refreshing every snapshotted company each ``interval`` seconds"""
+
+    def __init__(self, store, connection_factory, interval, log=None):
+        self.store = store
+        self.connection_factory = connection_factory
+        self.interval = interval
+        self.log = log
+        self.pid = None
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        # Once per process, from app.init_worker(): threads do not survive a fork
+        if self.interval <= 0 or self.pid == os.getpid():
+            return
+        with self._start_lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, name='analytics-refresher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            for company_id in self.store.companies():
+                try:
+                    conn = self.connection_factory()
+                    try:
+                        self.store.refresh(conn, company_id)
+                    finally:
+                        conn.close()
+                except Exception as e:
+                    if self.log:
+                        self.log.error(f"Analytics refresh failed for company {company_id}: {str(e)}")
+
+
+# ----- queries -----
+
+def _converted(table, rate):
+    """``amount`` in PLN as float64, one rate lookup per distinct currency"""
+    currencies = pc.unique(table['currency']).to_pylist()
+    rates = pa.array([rate(currency) for currency in currencies], type=pa.float64())
+    codes = pc.index_in(table['currency'], value_set=pa.array(currencies, type=pa.string()))
+    return pc.multiply(pc.cast(table['amount'], pa.float64()), pc.take(rates, codes))
+
+
+def _between(table, date_from, date_to):
+    if date_from:
+        table = table.filter(pc.greater_equal(table['date'], pa.scalar(date_from, type=pa.date32())))
+    if date_to:
+        table = table.filter(pc.less_equal(table['date'], pa.scalar(date_to, type=pa.date32())))
+    return table
+
+
+def _entries(tables, rate, date_from=None, date_to=None, projects_only=False):
+    """One flat table of entries with ``income`` / ``expenses`` in PLN and the group-by keys"""
+    projects = tables['projects']
+    sources = [('income', True), ('expenses', False)]
+    if not projects_only:
+        sources.append(('general_expenses', False))
+    parts = []
+    for name, is_income in sources:
+        table = _between(tables[name], date_from, date_to)
+        pln = _converted(table, rate)
+        zero = pc.multiply(pln, 0.0)
+        timestamps = pc.cast(table['date'], pa.timestamp('s'))
+        parts.append(pa.table({
+            'project_id': table['project_id'],
+            'project': pc.take(projects['name'], pc.index_in(table['project_id'], value_set=projects['id'])),
+            'date': table['date'],
+            'month': pc.strftime(timestamps, format='%Y-%m'),
+            'year': pc.strftime(timestamps, format='%Y'),
+            'currency': table['currency'],
+            'type': table['type'],
+            'income': pln if is_income else zero,
+            'expenses': zero if is_income else pln,
+            'entries': pa.repeat(pa.scalar(1, type=pa.int64()), len(table)),
+        }))
+    return pa.concat_tables(parts)
+
+
+def _money(value):
+    return round(value or 0.0, 2)
+
+
+def summarize(tables, rate, group_by, date_from=None, date_to=None):
+    """PLN income / expenses / profit grouped by any of GROUP_KEYS, sorted by the keys
+
+    General expenses have ``project`` None.
+    """
+    entries = _entries(tables, rate, date_from, date_to)
+    grouped = entries.group_by(list(group_by)).aggregate([('income', 'sum'), ('expenses', 'sum'),
+                                                          ('entries', 'sum')])
+    rows = [{
+        **{key: row[key] for key in group_by},
+        'income': _money(row['income_sum']),
+        'expenses': _money(row['expenses_sum']),
+        'profit': _money((row['income_sum'] or 0.0) - (row['expenses_sum'] or 0.0)),
+        'entries': row['entries_sum'],
+    } for row in grouped.to_pylist()]
+    rows.sort(key=lambda row: tuple((row[key] is None, row[key] or '') for key in group_by))
+    return rows
+
+
+def cohort_profit(tables, rate, date_from=None, date_to=None):
+    """Project profit by start-month cohort and months since the project started"""
+    projects = tables['projects'].filter(pc.is_valid(tables['projects']['start_date']))
+    entries = _entries(tables, rate, date_from, date_to, projects_only=True)
+    position = pc.index_in(entries['project_id'], value_set=projects['id'])
+    entries = entries.filter(pc.is_valid(position))
+    start = pc.take(projects['start_date'], pc.drop_null(position))
+
+    def month_number(dates):
+        return pc.add(pc.multiply(pc.year(dates), 12), pc.month(dates))
+
+    entries = entries.append_column('cohort', pc.strftime(pc.cast(start, pa.timestamp('s')), format='%Y-%m'))
+    entries = entries.append_column('age', pc.subtract(month_number(entries['date']), month_number(start)))
+    grouped = entries.group_by(['cohort', 'age']).aggregate([('income', 'sum'), ('expenses', 'sum'),
+                                                             ('project_id', 'count_distinct')])
+
+    sizes = {}
+    for started in pc.strftime(pc.cast(projects['start_date'], pa.timestamp('s')), format='%Y-%m').to_pylist():
+        sizes[started] = sizes.get(started, 0) + 1
+    cohorts = {}
+    for row in sorted(grouped.to_pylist(), key=lambda row: (row['cohort'], row['age'])):
+        cohort = cohorts.setdefault(row['cohort'], {'cohort': row['cohort'], 'projects': sizes[row['cohort']],
+                                                    'months': [], '_cumulative': 0.0})
+        profit = row['income_sum'] - row['expenses_sum']
+        cohort['_cumulative'] += profit
+        cohort['months'].append({
+            'age': row['age'],
+            'income': _money(row['income_sum']),
+            'expenses': _money(row['expenses_sum']),
+            'profit': _money(profit),
+            'cumulative_profit': _money(cohort['_cumulative']),
+            'active_projects': row['project_id_count_distinct'],
+        })
+    for cohort in cohorts.values():
+        del cohort['_cumulative']
+    return list(cohorts.values())
+
+
+def main():
+    from migrate import connect_from_env
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('refresh',))
+    parser.add_argument('--company-id', type=int, action='append', help='default: every snapshotted company')
+    parser.add_argument('--directory', default=snapshot_dir())
+    args = parser.parse_args()
+    if not available():
+        parser.error('pyarrow is not installed')
+
+    store = SnapshotStore(args.directory)
+    for company_id in args.company_id or store.companies():
+        started = time.perf_counter()
+        conn = connect_from_env()
+        try:
+            appended = store.refresh(conn, company_id, wait=True)
+        finally:
+            conn.close()
+        print(f"company {company_id}: {appended} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,138 +1,181 @@
+import time
+_import_started = time.perf_counter()
+
+if __name__ == '__main__':
+    # Run as the importable `app` module that the blueprints import from,
+    # rather than a second copy of it under __main__
+    import app
+    app.run_development_server()
+    raise SystemExit
+
 import os
-import secrets
-import stripe
-import sqlite3
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import (Flask, request, redirect, url_for, flash, session, jsonify, g, make_response, current_app,
+                   has_request_context)
 from flask_mail import Mail, Message
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 import psycopg2
-from psycopg2 import sql
 from dotenv import load_dotenv
 from functools import wraps
+from contextlib import contextmanager
 import requests
-import functools
-import google.generativeai as genai
 import re
 import logging
-from logging.handlers import RotatingFileHandler
-from stripe.error import StripeError
-from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
-from cryptography.fernet import Fernet
 import json
-import uuid
+from session_store import SessionStore
+from password_hasher import PasswordHasher
+from rate_limiter import create_rate_limiter
+from log_config import configure_logging, dedicated_logger, log_level
+import instrumentation
+import compression
+import timeouts
+from instrumentation import (InstrumentedConnection, InstrumentedCursor, track_outbound, record_fx_lookup,
+                             record_db_connect)
+import metrics
+from slow_query_log import SlowQueryLog
+import nplusone
+import kpi_views
+from response_cache import ResponseCache, data_version
+from change_feed import ChangeFeed
+import analytics
+from migrate import migrate
+from template_cache import FragmentCache, FragmentCacheExtension, bytecode_cache
+import assets
+import lazy
 
 # ===== LOAD ENVIRONMENT VARIABLES =====
 load_dotenv()
 
 # ===== CRITICAL ENVIRONMENT VERIFICATION =====
-# Configure basic logging for pre-initialization
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Console logging until create_app() installs the queued handlers; scripts that
+# only import this module (benchmarks, CLIs) keep it, at LOG_LEVEL
+logging.basicConfig(level=log_level(), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('init')
 
-# Verify ENCRYPTION_KEY
+# Verify ENCRYPTION_KEY (the cipher itself is built and self-tested on first use)
 if not os.getenv('ENCRYPTION_KEY'):
     logger.error(" CRITICAL ERROR: ENCRYPTION_KEY not defined!")
     raise ValueError("ENCRYPTION_KEY is required for secure operation")
 else:
     logger.info(" Encryption key loaded successfully")
-    
-    # Practical encryption test
-    try:
-        cipher_suite = Fernet(os.getenv('ENCRYPTION_KEY'))
-        
-        test_data = "test_data_ayist"
-        encrypted = cipher_suite.encrypt(test_data.encode()).decode()
-        decrypted = cipher_suite.decrypt(encrypted.encode()).decode()
-        
-        if test_data == decrypted:
-            logger.info(" Encryption/decryption test successful")
-        else:
-            logger.error(f"❌ Encryption failure! Original: '{test_data}' | Decrypted: '{decrypted}'")
-            raise ValueError("Encryption process failed")
-            
-    except Exception as e:
-        logger.error(f"❌ ERROR in encryption test: {str(e)}")
-        raise
 
-# ===== CREATE FLASK APP =====
-app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY')
+# The app object is built by create_app() (below); everything at module level is
+# shared by its blueprints and must stay safe to import in a preloading master
+log = logging.getLogger(__name__)
 
 # ===== STRIPE CONFIGURATION =====
-stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
+# The SDK is imported and configured on its first use in this process
+def _configure_stripe(module):
+    module.api_key = os.getenv('STRIPE_SECRET_KEY')
+    if os.getenv('STRIPE_API_BASE'):
+        module.api_base = os.getenv('STRIPE_API_BASE')
+    instrumentation.instrument_stripe(module)
+
+stripe = lazy.lazy_import('stripe', _configure_stripe)
 stripe_webhook_secret = os.getenv('STRIPE_WEBHOOK_SECRET')
 stripe_public_key = os.getenv('STRIPE_PUBLIC_KEY')
 
-# ===== LOGGING CONFIGURATION =====
-log_dir = os.getenv('LOG_DIR', 'logs')
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
+# ===== PERFORMANCE INSTRUMENTATION =====
+# Request/query metrics; the hooks that feed them are registered by create_app()
+def _record_request_metrics(route, status, stats, wall):
+    metrics.inc('http_requests_total', {'route': route, 'status': status})
+    metrics.observe('http_request_duration_seconds', wall, {'route': route})
+
+def _record_query_metrics(cursor, query, params, duration, rows):
+    metrics.inc('db_queries_total')
+
+def _record_connection_closed(conn):
+    metrics.gauge_add('db_connections_in_use', value=-1)
 
-# Configura o arquivo de log
-log_file = os.path.join(log_dir, 'app.log')
-handler = RotatingFileHandler(log_file, maxBytes=10000, backupCount=3)
-handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-app.logger.addHandler(handler)
+instrumentation.request_listeners.append(_record_request_metrics)
+instrumentation.query_observers.append(_record_query_metrics)
+instrumentation.connection_close_hooks.append(_record_connection_closed)
+
+# Statements slower than SLOW_QUERY_MS go to LOG_DIR/slow_queries.log with a sampled plan
+instrumentation.query_observers.append(SlowQueryLog(dedicated_logger('slow_query', 'slow_queries.log')))
 
 # ===== GEMINI CONFIGURATION =====
-if os.getenv("GOOGLE_API_KEY"):
+def _build_gemini_model():
+    import google.generativeai as genai
     genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-    model = genai.GenerativeModel('gemini-pro')
-    app.logger.info(" Gemini API configured successfully")
+    log.info(" Gemini API configured successfully")
+    return genai.GenerativeModel('gemini-pro')
+
+if os.getenv("GOOGLE_API_KEY"):
+    # The SDK (and its gRPC/protobuf stack) is only loaded by the first AI request
+    model = lazy.Lazy('gemini', _build_gemini_model)
 else:
-    app.logger.warning("⚠️ GOOGLE_API_KEY not defined. Gemini features disabled")
+    model = None
+    log.warning("⚠️ GOOGLE_API_KEY not defined. Gemini features disabled")
 
 def gemini_request(prompt):
+    start = time.perf_counter()
     try:
-        response = model.generate_content(prompt)
+        with track_outbound('gemini'):
+            response = model.generate_content(prompt)
         return response.text.strip()
     except Exception as e:
-        app.logger.error(f"Gemini API error: {str(e)}")
+        metrics.inc('gemini_errors_total')
+        log.error(f"Gemini API error: {str(e)}")
         return "There was an error processing your request."
+    finally:
+        metrics.observe('gemini_request_duration_seconds', time.perf_counter() - start)
 
 # ===== EMAIL CONFIGURATION =====
-app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
-app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
-app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True') == 'True'
-app.config['MAIL_USE_SSL'] = os.getenv('MAIL_USE_SSL', 'False') == 'True'  # Corrigido
-app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-app.config['MAIL_DEFAULT_SENDER'] = (os.getenv('MAIL_SENDER_NAME', 'Ayist Group'), 
-                                     os.getenv('MAIL_DEFAULT_SENDER'))
-app.config['MAIL_DEBUG'] = os.getenv('FLASK_DEBUG', 'False') == 'True'
-app.config['MAIL_SUPPRESS_SEND'] = os.getenv('MAIL_SUPPRESS_SEND', 'False') == 'True'
-
-if app.config['MAIL_USE_TLS'] and app.config['MAIL_USE_SSL']:
-    app.config['MAIL_USE_SSL'] = False
-    app.logger.warning("MAIL_USE_SSL desativado devido a conflito com MAIL_USE_TLS")
-
-mail = Mail(app)
+# Settings are applied per app in create_app()
+mail = Mail()
+
+@contextmanager
+def sending_email(kind):
+    """Time an SMTP send and count it by kind/result"""
+    metrics.gauge_add('email_outbox_backlog', value=1)
+    try:
+        with track_outbound('smtp'):
+            yield
+        metrics.inc('email_sent_total', {'kind': kind, 'result': 'sent'})
+    except Exception:
+        metrics.inc('email_sent_total', {'kind': kind, 'result': 'failed'})
+        raise
+    finally:
+        metrics.gauge_add('email_outbox_backlog', value=-1)
 
 # ===== ENCRYPTION FUNCTIONS =====
-def encrypt_data(data):
+def _build_cipher():
+    from cryptography.fernet import Fernet
+
     cipher_suite = Fernet(os.getenv('ENCRYPTION_KEY'))
-    return cipher_suite.encrypt(data.encode()).decode()
+    # Practical encryption test, once per process
+    test_data = "test_data_ayist"
+    decrypted = cipher_suite.decrypt(cipher_suite.encrypt(test_data.encode())).decode()
+    if test_data != decrypted:
+        logger.error(f"❌ Encryption failure! Original: '{test_data}' | Decrypted: '{decrypted}'")
+        raise ValueError("Encryption process failed")
+    logger.info(" Encryption/decryption test successful")
+    return cipher_suite
+
+cipher = lazy.Lazy('cipher', _build_cipher)
+
+def encrypt_data(data):
+    return cipher.encrypt(data.encode()).decode()
 
 def decrypt_data(encrypted_data):
-    cipher_suite = Fernet(os.getenv('ENCRYPTION_KEY'))
-    return cipher_suite.decrypt(encrypted_data.encode()).decode()
+    return cipher.decrypt(encrypted_data.encode()).decode()
 
 # Professional email sending function
 def send_verification_email(email, token, name):
     """Envia e-mail de verificação com HTML profissional"""
     try:
         if not all([
-            app.config['MAIL_SERVER'],
-            app.config['MAIL_USERNAME'],
-            app.config['MAIL_PASSWORD']
+            current_app.config['MAIL_SERVER'],
+            current_app.config['MAIL_USERNAME'],
+            current_app.config['MAIL_PASSWORD']
         ]):
-            app.logger.error("Credenciais de e-mail incompletas!")
+            log.error("Credenciais de e-mail incompletas!")
             return False
 
-        verification_url = url_for('verify_email', token=token, _external=True)
-        app.logger.debug(f"Preparando e-mail para: {email}")
-        app.logger.debug(f"URL de verificação: {verification_url}")
+        verification_url = url_for('auth.verify_email', token=token, _external=True)
+        log.debug(f"Preparando e-mail para: {email}")
+        log.debug(f"URL de verificação: {verification_url}")
 
         # Template HTML (mesmo do send_test_email.py)
         html_body = f"""
@@ -211,17 +254,18 @@ Se você não criou esta conta, por favor ignore este e-mail.
             html=html_body
         )
         
-        mail.send(msg)
+        with sending_email('verification'):
+            mail.send(msg)
         
-        app.logger.info(f"✅ E-mail de verificação enviado para {email}")
+        log.info(f"✅ E-mail de verificação enviado para {email}")
         return True
         
     except Exception as e:
-        app.logger.error(f"❌ ERRO ao enviar e-mail de verificação: {str(e)}", exc_info=True)
+        log.error(f"❌ ERRO ao enviar e-mail de verificação: {str(e)}", exc_info=True)
         
-        app.logger.debug(f"Configuração de e-mail: {app.config['MAIL_SERVER']}:{app.config['MAIL_PORT']}")
-        app.logger.debug(f"Usando TLS: {app.config['MAIL_USE_TLS']}, SSL: {app.config['MAIL_USE_SSL']}")
-        app.logger.debug(f"Autenticação: {app.config['MAIL_USERNAME']}")
+        log.debug(f"Configuração de e-mail: {current_app.config['MAIL_SERVER']}:{current_app.config['MAIL_PORT']}")
+        log.debug(f"Usando TLS: {current_app.config['MAIL_USE_TLS']}, SSL: {current_app.config['MAIL_USE_SSL']}")
+        log.debug(f"Autenticação: {current_app.config['MAIL_USERNAME']}")
         
         return False
 
@@ -229,7 +273,7 @@ Se você não criou esta conta, por favor ignore este e-mail.
 def send_reset_email(email, token, name):
     """Send password reset email"""
     try:
-        reset_url = url_for('reset_password', token=token, _external=True)
+        reset_url = url_for('auth.reset_password', token=token, _external=True)
         
         html_body = f"""
         <!DOCTYPE html>
@@ -284,11 +328,12 @@ def send_reset_email(email, token, name):
                       recipients=[email])
         msg.html = html_body
         
-        mail.send(msg)
-        app.logger.info(f"Password reset email sent to {email}")
+        with sending_email('password_reset'):
+            mail.send(msg)
+        log.info(f"Password reset email sent to {email}")
         return True
     except Exception as e:
-        app.logger.error(f"Error sending reset email: {str(e)}")
+        log.error(f"Error sending reset email: {str(e)}")
         return False
 
 # Function to send payment failure email
@@ -341,36 +386,41 @@ def send_payment_failed_email(email, name, invoice_url):
         msg = Message('Payment Failed - Ayist Group', 
                       recipients=[email])
         msg.html = html_body
-        mail.send(msg)
-        app.logger.info(f"Payment failure email sent to {email}")
+        with sending_email('payment_failed'):
+            mail.send(msg)
+        log.info(f"Payment failure email sent to {email}")
         return True
     except Exception as e:
-        app.logger.error(f"Error sending payment failure email: {str(e)}")
+        log.error(f"Error sending payment failure email: {str(e)}")
         return False
 
-# Exchange rate cache
+# Exchange rate cache (entries refresh after one day)
 exchange_rate_cache = {}
+FX_API_URL = os.getenv('FX_API_URL', 'https://api.frankfurter.app')
 
-@functools.lru_cache(maxsize=32)
 def get_exchange_rate_cached(from_currency, to_currency='PLN'):
     """Get exchange rate with cache to reduce API calls"""
+    record_fx_lookup()
     cache_key = f"{from_currency}_{to_currency}"
     
     if cache_key in exchange_rate_cache:
         cached_time, rate = exchange_rate_cache[cache_key]
         if datetime.now() - cached_time < timedelta(days=1):
-            app.logger.info(f"Using cached exchange rate for {cache_key}")
+            log.info(f"Using cached exchange rate for {cache_key}", extra={'sample': 'fx_cache_hit'})
+            metrics.inc('fx_cache_requests_total', {'result': 'hit'})
             return rate
+    metrics.inc('fx_cache_requests_total', {'result': 'miss'})
     
     try:
         if from_currency == to_currency:
             rate = 1.0
         else:
-            app.logger.info(f"Fetching new exchange rate for {cache_key}")
-            response = requests.get(
-                f'https://api.frankfurter.app/latest?from={from_currency}&to={to_currency}', 
-                timeout=5
-            )
+            log.info(f"Fetching new exchange rate for {cache_key}")
+            with track_outbound('fx'):
+                response = requests.get(
+                    f'{FX_API_URL}/latest?from={from_currency}&to={to_currency}', 
+                    timeout=5
+                )
             response.raise_for_status()
             data = response.json()
             rate = data['rates'][to_currency]
@@ -378,7 +428,7 @@ def get_exchange_rate_cached(from_currency, to_currency='PLN'):
         exchange_rate_cache[cache_key] = (datetime.now(), rate)
         return rate
     except requests.exceptions.RequestException as e:
-        app.logger.error(f"Error fetching exchange rate: {str(e)}")
+        log.error(f"Error fetching exchange rate: {str(e)}")
         if cache_key in exchange_rate_cache:
             return exchange_rate_cache[cache_key][1]
         return 1.0  # Safe fallback
@@ -388,9 +438,13 @@ def convert_to_pln(amount, currency):
     try:
         return float(amount) * get_exchange_rate_cached(currency)
     except Exception as e:
-        app.logger.error(f"Currency conversion error: {str(e)}")
+        log.error(f"Currency conversion error: {str(e)}")
         return float(amount)  # Fallback without conversion
 
+def pln_rate(currency):
+    """PLN per unit of ``currency`` (1.0 if the rate cannot be determined)"""
+    return convert_to_pln(1, currency)
+
 # CNPJ validation
 def validate_cnpj(cnpj):
     """Validate Brazilian CNPJ"""
@@ -422,45 +476,205 @@ def validate_cnpj(cnpj):
 def get_db_connection():
     """Establish connection to PostgreSQL"""
     try:
+        start = time.perf_counter()
         conn = psycopg2.connect(
             host=os.getenv('DB_HOST'),
             database=os.getenv('DB_NAME'),
             user=os.getenv('DB_USER'),
             password=os.getenv('DB_PASSWORD'),
-            port=os.getenv('DB_PORT', 5432)
+            port=os.getenv('DB_PORT', 5432),
+            connection_factory=InstrumentedConnection,
+            cursor_factory=InstrumentedCursor,
+            # Statements stop at the request's deadline (see timeouts.py)
+            options=timeouts.statement_timeout_option()
         )
-        app.logger.info("Database connection established successfully")
+        record_db_connect(time.perf_counter() - start)
+        metrics.inc('db_connections_opened_total')
+        metrics.gauge_add('db_connections_in_use', value=1)
+        log.info("Database connection established successfully", extra={'sample': 'db_connect'})
         return conn
     except Exception as e:
-        app.logger.error(f"Error connecting to database: {str(e)}")
+        log.error(f"Error connecting to database: {str(e)}")
         raise
 
+# Server-side sessions: the cookie only carries the session id, the resolved
+# user/company/plan context is cached in-process and backed by user_sessions
+session_store = SessionStore(get_db_connection)
+
+def load_user_context():
+    """Resolve the server-side session context for the current request"""
+    if 'user_id' not in session:
+        return None
+    context = session_store.get(session.get('sid'))
+    if context is None or context['user_id'] != session['user_id']:
+        # Revoked, expired or issued before the session store existed
+        session.clear()
+        return None
+    return context
+
 # Authentication decorators
 def login_required(f):
-    """Decorator to verify user is logged in"""
+    """Decorator to verify user is logged in and expose g.current_user"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        context = load_user_context()
+        if context is None:
             flash('Please log in to access this page', 'warning')
-            return redirect(url_for('login'))
+            return redirect(url_for('auth.login'))
+        g.current_user = context
         return f(*args, **kwargs)
     return decorated_function
 
 def admin_required(f):
-    """Decorator to verify user is admin"""
+    """Decorator to verify user is admin and expose g.current_user"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        context = load_user_context()
+        if context is None:
             flash('Please log in to access this page', 'warning')
-            return redirect(url_for('login'))
+            return redirect(url_for('auth.login'))
+        g.current_user = context
         
-        if not session.get('is_admin', False):
+        if not context['is_admin']:
             flash('Admin access required', 'danger')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('projects.dashboard'))
         
         return f(*args, **kwargs)
     return decorated_function
 
+# KPI materialized views are refreshed from a background thread once writes settle
+# (KPI_REFRESH_POLL_SECONDS=0 leaves it to `python app/kpi_views.py refresh` from cron)
+kpi_refresher = kpi_views.Refresher(get_db_connection, float(os.getenv('KPI_REFRESH_POLL_SECONDS', 5)),
+                                    log=log)
+# Expired rows of user_sessions are deleted by the same thread (with the refresher
+# off, run `python app/session_store.py purge` from cron instead)
+kpi_refresher.every(float(os.getenv('SESSION_PURGE_SECONDS', 3600)), session_store.purge_expired)
+
+# Tenant JSON APIs polled by the dashboard are cached per data version (see response_cache.py)
+response_cache = ResponseCache(int(os.getenv('RESPONSE_CACHE_ENTRIES', 2048)), float(os.getenv('RESPONSE_CACHE_TTL', 300)))
+
+# Open dashboards are told about their tenant's writes over SSE (see change_feed.py)
+change_feed = ChangeFeed(get_db_connection, int(os.getenv('SSE_MAX_CLIENTS', 100)), log=log)
+SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+
+# Rendered {% cache %} fragments, scoped to the current tenant
+fragment_cache = FragmentCache(int(os.getenv('TEMPLATE_FRAGMENT_CACHE_ENTRIES', 1024)),
+                               float(os.getenv('TEMPLATE_FRAGMENT_CACHE_TTL', 300)))
+
+# Fingerprinted, precompressed JS/CSS from `python app/assets.py build` (see assets.py)
+asset_manifest = assets.AssetManifest()
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+def asset_url(filename):
+    """Immutable /assets URL of a static file, or its plain static URL until assets are built"""
+    path = asset_manifest.path(filename)
+    if path is None:
+        return url_for('static', filename=filename)
+    return url_for('main.asset', filename=path)
+
+# Whole anonymous pages; the TTL bounds how long e.g. plan changes take to show
+page_cache = FragmentCache(64, float(os.getenv('PUBLIC_PAGE_CACHE_TTL', 300)))
+
+def cached_page(f):
+    """Decorator serving a public (session-independent) HTML page from page_cache"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = (request.endpoint, tuple(sorted(kwargs.items())), request.query_string)
+        html = page_cache.get(key)
+        if html is not None:
+            metrics.inc('template_cache_requests_total', {'kind': 'page', 'result': 'hit'})
+            return current_app.response_class(html, mimetype='text/html')
+        metrics.inc('template_cache_requests_total', {'kind': 'page', 'result': 'miss'})
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200 and response.mimetype == 'text/html':
+            page_cache.set(key, response.get_data())
+        return response
+    return decorated_function
+
+def cached_json(f):
+    """Decorator serving a tenant's JSON response from response_cache, with ETag / 304 support"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        company_id = session['company_id']
+        try:
+            conn = get_db_connection()
+            try:
+                cur = conn.cursor()
+                version = data_version(cur, company_id)
+                cur.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            log.error(f"Error reading data version, serving uncached: {str(e)}")
+            return f(*args, **kwargs)
+
+        key = (company_id, request.endpoint, tuple(sorted(kwargs.items())),
+               tuple(sorted(request.args.items(multi=True))))
+        etag, cached = response_cache.lookup(key, version)
+        if request.if_none_match.contains_weak(etag):
+            metrics.inc('response_cache_requests_total', {'result': 'not_modified'})
+            response = current_app.response_class(status=304)
+        elif cached is not None:
+            metrics.inc('response_cache_requests_total', {'result': 'hit'})
+            response = current_app.response_class(cached[0], mimetype=cached[1])
+        else:
+            metrics.inc('response_cache_requests_total', {'result': 'miss'})
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            response_cache.store(key, etag, response.get_data(), response.mimetype)
+        response.set_etag(etag)
+        # Browsers keep the body but revalidate every poll, which is the cheap 304
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
+
+# Token-bucket throttling for unauthenticated, expensive endpoints
+# (RATE_LIMIT_BACKEND=local keeps buckets per process, =database shares them)
+rate_limiter = create_rate_limiter(get_db_connection)
+# Idle buckets (rate_limits rows with RATE_LIMIT_BACKEND=database) are deleted by the KPI refresher thread
+kpi_refresher.every(float(os.getenv('RATE_LIMIT_PURGE_SECONDS', 900)), rate_limiter.purge)
+
+def form_email():
+    return request.form.get('email', '').strip().lower()
+
+def api_admin_email():
+    data = request.get_json(silent=True) or {}
+    return str((data.get('admin') or {}).get('email', '')).strip().lower()
+
+def pending_email():
+    return session.get('pending_email') or session.get('user_email') or ''
+
+def rate_limit(scope, per_ip, per_email=None, email_getter=form_email, redirect_endpoint=None):
+    """Decorator rejecting POSTs that exceed the (count, seconds) budgets per IP and per email"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method == 'POST':
+                # The client's address, not the proxy's, when TRUSTED_PROXY_HOPS is set
+                checks = [(f"{scope}:ip:{request.remote_addr}", per_ip)]
+                email = email_getter() if per_email else ''
+                if email:
+                    checks.append((f"{scope}:email:{email}", per_email))
+                for key, (count, seconds) in checks:
+                    allowed, retry_after = rate_limiter.hit(key, count / seconds, count)
+                    if not allowed:
+                        log.warning(f"Rate limit exceeded for {key}")
+                        if request.path.startswith('/api/'):
+                            response = jsonify({'error': 'Too many requests'})
+                            response.status_code = 429
+                        else:
+                            flash('Too many attempts. Please try again later.', 'danger')
+                            response = redirect(url_for(redirect_endpoint or request.endpoint))
+                        response.headers['Retry-After'] = str(retry_after)
+                        return response
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+# Password hashing runs in a bounded process pool (PASSWORD_HASH_* settings)
+password_hasher = PasswordHasher()
+
 # Password validation
 def is_password_valid(password):
     if len(password) < 8:
@@ -519,7 +733,7 @@ def check_company_limits(company_id, resource):
         
         return True, ""
     except Exception as e:
-        app.logger.error(f"Error checking limits: {str(e)}")
+        log.error(f"Error checking limits: {str(e)}")
         return False, "Internal error"
     finally:
         cur.close()
@@ -537,7 +751,7 @@ def log_audit_event(user_id, action, details):
         """, (user_id, action, json.dumps(details)))
         conn.commit()
     except Exception as e:
-        app.logger.error(f"Error logging audit event: {str(e)}")
+        log.error(f"Error logging audit event: {str(e)}")
     finally:
         conn.close()
 
@@ -562,2916 +776,129 @@ def check_user_limit(company_id):
             return False
         return True
     except Exception as e:
-        app.logger.error(f"Error checking user limit: {str(e)}")
+        log.error(f"Error checking user limit: {str(e)}")
         return False
     finally:
         cur.close()
         conn.close()
 
-# Public plans route
-@app.route('/plans-public')
-def public_plans():
-    """Public plans page for registration"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
-        plans = cur.fetchall()
-        
-        # Debug log
-        app.logger.info(f"Plans found: {len(plans)}")
-        
-        return render_template('plans_public.html', plans=plans)
-    except Exception as e:
-        app.logger.error(f"Error loading public plans: {str(e)}", exc_info=True)
-        flash('Error loading plans. Please try again later.', 'danger')
-        return redirect(url_for('home'))
-    finally:
-        cur.close()
-        conn.close()
-
-
-
-@app.route('/checkout/<int:plan_id>')
-@login_required
-def checkout(plan_id):
-    """Redireciona para o Stripe Checkout com o plano selecionado"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Buscar plano e verificar existência
-        cur.execute("""
-            SELECT id, stripe_price_id 
-            FROM plans 
-            WHERE id = %s AND is_active = TRUE
-        """, (plan_id,))
-        plan = cur.fetchone()
-        
-        if not plan:
-            flash('Plano não encontrado ou inativo', 'danger')
-            return redirect(url_for('public_plans'))
-        
-        stripe_price_id = result[0]
-
-        # Buscar stripe_customer_id da empresa
-        cur.execute("SELECT stripe_customer_id FROM companies WHERE id = %s", (session['company_id'],))
-        company_result = cur.fetchone()
-        if not company_result or not company_result[0]:
-            flash('Empresa sem cliente Stripe', 'danger')
-            return redirect(url_for('dashboard'))
-        
-        # Decriptografar customer ID
-        stripe_customer_id = decrypt_data(company_result[0])
-
-        # Criar sessão do Stripe
-        session_stripe = stripe.checkout.Session.create(
-            customer=stripe_customer_id,
-            payment_method_types=['card'],
-            line_items=[{
-                'price': stripe_price_id,
-                'quantity': 1,
-            }],
-            mode='subscription',
-            success_url=url_for('subscription_success', _external=True),
-            cancel_url=url_for('public_plans', _external=True),
-        )
-
-        return redirect(session_stripe.url, code=303)
-
-    except Exception as e:
-        app.logger.error(f"Erro ao criar sessão de checkout: {str(e)}")
-        flash('Erro ao redirecionar para o pagamento.', 'danger')
-        return redirect(url_for('public_plans'))
-    finally:
-        cur.close()
-        conn.close()
-# Registration route
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        try:
-            # Coletar dados do formulário CORRETAMENTE
-            company_name = request.form.get('company_name', '').strip()
-            email = request.form.get('email', '').strip().lower()
-            password = request.form.get('password', '')
-            confirm_password = request.form.get('confirm_password', '')
-            country = request.form.get('country', '').strip()
-            industry = request.form.get('industry', '').strip()
-            full_name = request.form.get('full_name', '').strip()  # Nome completo
-            
-            # VALIDAÇÃO REVISTA
-            if not all([company_name, email, password, confirm_password, country, industry, full_name]):
-                flash('All fields are required', 'danger')
-                return render_template('register.html')
-            
-            if password != confirm_password:
-                flash('Passwords do not match', 'danger')
-                return render_template('register.html')
-            
-            # Validação de força de senha (adicionar esta função se não existir)
-            is_valid, error_msg = is_password_valid(password)
-            if not is_valid:
-                flash(error_msg, 'danger')
-                return render_template('register.html')
-            
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            # Verificar email existente
-            cur.execute("SELECT id FROM companies WHERE email = %s", (email,))
-            if cur.fetchone():
-                flash('This email is already registered', 'danger')
-                return render_template('register.html')
-            
-            # Inserir empresa
-            cur.execute(
-                "INSERT INTO companies (name, email, country, industry, date_registered) "
-                "VALUES (%s, %s, %s, %s, %s) RETURNING id",
-                (company_name, email, country, industry, datetime.now())
-            )
-            company_id = cur.fetchone()[0]
-            
-            # Dividir nome completo (primeiro nome e sobrenome)
-            name_parts = full_name.split(' ', 1)
-            first_name = name_parts[0]
-            last_name = name_parts[1] if len(name_parts) > 1 else ''
-            
-            # Criar token de verificação
-            verification_token = secrets.token_urlsafe(32)
-            verification_token_expiry = datetime.now() + timedelta(hours=24)
-            hashed_password = generate_password_hash(password)
-            
-            # Inserir usuário admin
-            cur.execute(
-                "INSERT INTO users (first_name, last_name, email, password, "
-                "company_id, is_admin, verification_token, verification_token_expiry) "
-                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-                (first_name, last_name, email, hashed_password, company_id, True, verification_token, verification_token_expiry)
-            )
-            
-            # COMMIT ESSENCIAL
-            conn.commit()
-            
-            # Armazenar dados para possível reenvio
-            session['pending_email'] = email
-            session['pending_token'] = verification_token
-            session['pending_name'] = first_name
-            
-            # Enviar email de verificação
-            if send_verification_email(email, verification_token, first_name):
-                flash('Verification email sent! Please check your inbox.', 'success')
-            else:
-                flash('Failed to send verification email. Please contact support.', 'warning')
-            
-            return redirect(url_for('verify_email_waiting'))
-            
-        except Exception as e:
-            conn.rollback()
-            app.logger.error(f"Registration error: {str(e)}")
-            flash(f'Registration error: {str(e)}', 'danger')
-            return render_template('register.html')
-        finally:
-            if 'cur' in locals(): cur.close()
-            if 'conn' in locals(): conn.close()
-    
-    # GET: Mostrar formulário
-    return render_template('register.html')
-
+# Ad-hoc analytics queries run over per-tenant Parquet snapshots (see analytics.py)
+analytics_store = analytics.SnapshotStore(analytics.snapshot_dir())
+analytics_refresher = analytics.Refresher(analytics_store, get_db_connection,
+                                          float(os.getenv('ANALYTICS_REFRESH_SECONDS', 300)), log=log)
 
-@app.route('/verify-email-waiting')
-def verify_email_waiting():
-    """Email verification waiting page"""
-    return render_template('verify_email_waiting.html')
-
-# Rota para reenviar verificação
-@app.route('/resend-verification', methods=['POST'])
-def resend_verification():
-    """Resend verification email"""
-    try:
-        # Tentar usar dados da sessão primeiro
-        email = session.get('pending_email')
-        token = session.get('pending_token')
-        name = session.get('pending_name')
-        
-        # Se não estiver na sessão, verificar no banco de dados
-        if not email or not token:
-            conn = get_db_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT email, verification_token, first_name
-                FROM users
-                WHERE email = %s AND email_verified = FALSE
-            """, (session.get('user_email'),))
-            user_data = cur.fetchone()
-            
-            if user_data:
-                email, token, name = user_data
-            else:
-                flash('No pending verification found', 'danger')
-                return redirect(url_for('verify_email_waiting'))
-        
-        # Tentar reenviar
-        if send_verification_email(email, token, name):
-            flash('New verification email sent successfully!', 'success')
-        else:
-            flash('Failed to resend email. Please try again later.', 'danger')
-        
-        return redirect(url_for('verify_email_waiting'))
-    
-    except Exception as e:
-        app.logger.error(f"Error resending verification: {str(e)}")
-        flash('Error resending verification email', 'danger')
-        return redirect(url_for('verify_email_waiting'))
-
-# API endpoint for company registration
-@app.route('/api/register-company', methods=['POST'])
-def api_register_company():
-    """Endpoint for company registration via API"""
-    try:
-        app.logger.info("Receiving company registration request via API")
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        company_data = data.get('company', {})
-        admin_data = data.get('admin', {})
-        
-        # Validate required data
-        required_company = ['name', 'email', 'country', 'industry', 'cnpj']
-        required_admin = ['name', 'email', 'password']
-        
-        if not all(key in company_data for key in required_company) or \
-           not all(key in admin_data for key in required_admin):
-            return jsonify({'error': 'Missing required fields'}), 400
-        
-        # Validate CNPJ for Brazilian companies
-        if company_data['country'].upper() == 'BR' and not validate_cnpj(company_data['cnpj']):
-            return jsonify({'error': 'Invalid CNPJ'}), 400
-        
-        # Split admin name
-        name_parts = admin_data['name'].split(' ', 1)
-        first_name = name_parts[0]
-        last_name = name_parts[1] if len(name_parts) > 1 else ''
-        
-        # Validate password
-        is_valid, error_msg = is_password_valid(admin_data['password'])
-        if not is_valid:
-            return jsonify({'error': error_msg}), 400
-        
-        # Connect to database
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Check if email exists
-        cur.execute("SELECT id FROM companies WHERE email = %s", (company_data['email'],))
-        if cur.fetchone():
-            return jsonify({'error': 'Email already registered'}), 409
-        
-        # Insert company
-        cur.execute(
-            "INSERT INTO companies (name, email, country, industry, date_registered, is_active, cnpj) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id",
-            (
-                company_data['name'], 
-                company_data['email'], 
-                company_data['country'], 
-                company_data['industry'],
-                datetime.now(),
-                False,
-                company_data.get('cnpj', '')
-            )
-        )
-        company_id = cur.fetchone()[0]
-        
-        # Create Stripe customer
-        try:
-            customer = stripe.Customer.create(
-                email=company_data['email'],
-                name=company_data['name'],
-                metadata={
-                    'company_id': company_id,
-                    'country': company_data['country'],
-                    'industry': company_data['industry']
-                }
-            )
-            # Encrypt and store customer ID
-            encrypted_customer_id = encrypt_data(customer.id)
-            cur.execute(
-                "UPDATE companies SET stripe_customer_id = %s WHERE id = %s",
-                (encrypted_customer_id, company_id)
-            )
-            app.logger.info(f"Stripe customer created and encrypted: {customer.id}")
-        except stripe.error.StripeError as e:
-            app.logger.error(f"Error creating Stripe customer: {str(e)}")
-            # Don't fail registration, just log error
-        
-        # Insert admin user
-        verification_token = secrets.token_urlsafe(32)
-        hashed_password = generate_password_hash(admin_data['password'])
-        verification_token_expiry = datetime.now() + timedelta(hours=24)
-        
-        cur.execute(
-            "INSERT INTO users (first_name, last_name, email, password, "
-            "company_id, is_admin, email_verified, verification_token, verification_token_expiry) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
-            (
-                first_name, 
-                last_name, 
-                admin_data['email'], 
-                hashed_password, 
-                company_id, 
-                True,
-                False,
-                verification_token,
-                verification_token_expiry
-            )
-        )
-        admin_id = cur.fetchone()[0]
-        
-        conn.commit()
-        
-        # Send verification email
-        send_verification_email(admin_data['email'], verification_token, first_name)
-        
-        return jsonify({
-            'company_id': company_id,
-            'admin_id': admin_id,
-            'stripe_customer_id': customer.id,
-            'verification_token': verification_token
-        }), 201
-        
-    except Exception as e:
-        app.logger.error(f"API registration error: {str(e)}", exc_info=True)
-        if 'conn' in locals():
-            conn.rollback()
-        return jsonify({'error': 'Internal server error'}), 500
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
-
-# Endpoint for company status
-@app.route('/api/companies/<int:company_id>/status', methods=['GET'])
-def api_company_status(company_id):
-    """Endpoint to check company status"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Consulta melhorada com ordenação e limite
-        cur.execute("""
-            SELECT 
-                c.id AS project_id,
-                c.name,
-                c.description,
-                c.start_date,
-                c.end_date,
-                COALESCE(SUM(i.amount), 0) AS income,
-                COALESCE(SUM(e.amount), 0) AS expenses,
-                (COALESCE(SUM(i.amount), 0) - COALESCE(SUM(e.amount), 0)) AS profit,
-                -- Task data for completion calculation
-                (SELECT COUNT(*) FROM tasks t WHERE t.project_id = p.id) AS total_tasks,
-                (SELECT COUNT(*) FROM tasks t WHERE t.project_id = p.id AND t.status = 'Completed') AS completed_tasks
-            FROM projects p
-            LEFT JOIN income i ON p.id = i.project_id
-            LEFT JOIN expenses e ON p.id = e.project_id
-            WHERE p.company_id = %s
-            GROUP BY p.id
-        """, (company_id,))
-        
-        projects = []
-        current_date = datetime.now().date()
-        for row in cur.fetchall():
-            # Calculate status based on dates
-            status = "Not Started"
-            if row[4]:  # end_date
-                if current_date > row[4]:
-                    status = "Completed"
-                elif row[3] and current_date >= row[3]:  # start_date
-                    status = "In Progress"
-            elif row[3] and current_date >= row[3]:
-                status = "In Progress"
-            
-            # Calculate completion percentage
-            total_tasks = row[8] or 0
-            completed_tasks = row[9] or 0
-            completion = 0
-            if total_tasks > 0:
-                completion = int((completed_tasks / total_tasks) * 100)
-            
-            projects.append({
-                'project_id': row[0],
-                'name': row[1],
-                'description': row[2],
-                'start_date': row[3].strftime('%Y-%m-%d') if row[3] else None,
-                'end_date': row[4].strftime('%Y-%m-%d') if row[4] else None,
-                'income': float(row[5]),
-                'expenses': float(row[6]),
-                'profit': float(row[7]),
-                'status': status,
-                'completion': completion
-            })
-        
-        return jsonify(projects)
-        
-    except Exception as e:
-        app.logger.error(f"Error fetching dashboard data: {str(e)}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
-        
-@app.route('/verify-email/<token>')
-def verify_email(token):
-    """Route for email verification"""
-    conn = get_db_connection()
+# Database initialization
+def init_db():
+    """Bring the database schema up to date (see migrations/)"""
     try:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id, email, company_id FROM users WHERE verification_token = %s "
-            "AND verification_token_expiry > %s",
-            (token, datetime.now())
-        )
-        user = cur.fetchone()
-        
-        if user:
-            # Update user as verified
-            cur.execute(
-                "UPDATE users SET email_verified = TRUE, "
-                "verification_token = NULL, verification_token_expiry = NULL "
-                "WHERE id = %s", (user[0],)
-            )
-            
-            # Don't activate company yet - wait for plan selection
-            conn.commit()
-            flash('Email verified successfully! You can now log in.', 'success')
-            # FLUXO CORRIGIDO: Redireciona para login após verificação
-            return redirect(url_for('login'))
+        log.info("Applying database migrations...")
+        applied = migrate(get_db_connection, log=log)
+        if applied:
+            log.info(f"Applied migrations: {', '.join(str(v) for v in applied)}")
         else:
-            flash('Invalid or expired token', 'danger')
-            # FLUXO CORRIGIDO: Redireciona para registro se token inválido
-            return redirect(url_for('register'))
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Email verification error: {str(e)}")
-        flash('Verification error', 'danger')
-        return redirect(url_for('register'))
-    finally:
-        conn.close()
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    """Login route"""
-    if request.method == 'POST':
-        email = request.form['email'].strip().lower()
-        password = request.form['password']
-        
-        conn = get_db_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT u.id, u.password, u.company_id, u.email_verified, u.is_admin, 
-                       c.is_active, c.stripe_customer_id, u.first_name
-                FROM users u
-                JOIN companies c ON u.company_id = c.id
-                WHERE u.email = %s
-            """, (email,))
-            user = cur.fetchone()
-            
-            if user and check_password_hash(user[1], password):
-                if not user[3]:  # email_verified
-                    # FLUXO CORRIGIDO: Redireciona para tela de espera se não verificado
-                    return redirect(url_for('verify_email_waiting'))
-                else:
-                    # Set session
-                    session['user_id'] = user[0]
-                    session['company_id'] = user[2]
-                    session['is_admin'] = user[4]
-                    session['user_email'] = email
-                    session['user_name'] = user[7]
-                    
-                    # Verify if company has active plan
-                    if not user[5]:  # is_active
-                        return redirect(url_for('plans'))  # Redirect to plan selection
-                    
-                    # Update last login
-                    cur.execute(
-                        "UPDATE users SET last_login = %s WHERE id = %s",
-                        (datetime.now(), user[0]))
-                    conn.commit()
-                    
-                    app.logger.info(f"User {email} logged in successfully")
-                    flash('Login successful!', 'success')
-                    return redirect(url_for('dashboard'))
-            else:
-                app.logger.warning(f"Failed login attempt for {email}")
-                flash('Invalid email or password', 'danger')
-        except Exception as e:
-            app.logger.error(f"Login error: {str(e)}")
-            flash('Login error', 'danger')
-        finally:
-            conn.close()
-    
-    return render_template('login.html')
-
-@app.route('/logout')
-def logout():
-    """Logout route"""
-    session.clear()
-    flash('You have been logged out', 'info')
-    return redirect(url_for('home'))
-
-# Password recovery routes
-@app.route('/forgot-password', methods=['GET', 'POST'])
-def forgot_password():
-    """Route to request password reset"""
-    if request.method == 'POST':
-        email = request.form['email'].strip().lower()
-        
-        conn = get_db_connection()
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT id, first_name FROM users WHERE email = %s AND email_verified = TRUE",
-                (email,)
-            )
-            user = cur.fetchone()
-            
-            if user:
-                reset_token = secrets.token_urlsafe(32)
-                reset_expiry = datetime.now() + timedelta(hours=1)
-                
-                cur.execute(
-                    "UPDATE users SET reset_token = %s, "
-                    "reset_token_expiry = %s WHERE id = %s",
-                    (reset_token, reset_expiry, user[0])
-                )
-                conn.commit()
-                
-                send_reset_email(email, reset_token, user[1])
-                flash('Reset link sent to your email', 'success')
-            else:
-                flash('Email not found or not verified', 'danger')
-        except Exception as e:
-            conn.rollback()
-            app.logger.error(f"Error processing password reset: {str(e)}")
-            flash('Error processing request', 'danger')
-        finally:
-            conn.close()
-    
-    return render_template('forgot_password.html')
-
-@app.route('/reset-password/<token>', methods=['GET', 'POST'])
-def reset_password(token):
-    """Route to reset password"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id FROM users WHERE reset_token = %s "
-            "AND reset_token_expiry > %s",
-            (token, datetime.now())
-        )
-        user = cur.fetchone()
-        
-        if not user:
-            flash('Invalid or expired token', 'danger')
-            return redirect(url_for('forgot_password'))
-        
-        if request.method == 'POST':
-            new_password = request.form['new_password']
-            confirm_password = request.form['confirm_password']
-            
-            # Password validation
-            is_valid, error_msg = is_password_valid(new_password)
-            if not is_valid:
-                flash(error_msg, 'danger')
-                return redirect(url_for('reset_password', token=token))
-            
-            if new_password != confirm_password:
-                flash('Passwords do not match', 'danger')
-                return redirect(url_for('reset_password', token=token))
-            else:
-                hashed_password = generate_password_hash(new_password)
-                cur.execute(
-                    "UPDATE users SET password = %s, reset_token = NULL, "
-                    "reset_token_expiry = NULL WHERE id = %s",
-                    (hashed_password, user[0])
-                )
-                conn.commit()
-                flash('Password updated successfully', 'success')
-                return redirect(url_for('login'))
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Error resetting password: {str(e)}")
-        flash('Error resetting password', 'danger')
-    finally:
-        conn.close()
-    
-    return render_template('reset_password.html', token=token)
-
-# Main routes
-@app.route('/')
-def home():
-    """Home page"""
-    return render_template('home.html')
-
-# Endpoint for dashboard data
-@app.route('/api/project-dashboard-data')
-@login_required
-def project_dashboard_data():
-    """Endpoint for dashboard data"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Fetch company projects with financial data
-        cur.execute('''
-            SELECT 
-                p.id AS project_id,
-                p.name,
-                p.description,
-                p.start_date,
-                p.end_date,
-                COALESCE(SUM(i.amount), 0) AS income,
-                COALESCE(SUM(e.amount), 0) AS expenses,
-                (COALESCE(SUM(i.amount), 0) - COALESCE(SUM(e.amount), 0)) AS profit,
-                -- Task data for completion calculation
-                (SELECT COUNT(*) FROM tasks t WHERE t.project_id = p.id) AS total_tasks,
-                (SELECT COUNT(*) FROM tasks t WHERE t.project_id = p.id AND t.status = 'Completed') AS completed_tasks
-            FROM projects p
-            LEFT JOIN income i ON p.id = i.project_id
-            LEFT JOIN expenses e ON p.id = e.project_id
-            WHERE p.company_id = %s
-            GROUP BY p.id
-        ''', (session['company_id'],))
-        
-        projects = []
-        current_date = datetime.now().date()
-        for row in cur.fetchall():
-            # Calculate status based on dates
-            status = "Not Started"
-            if row[4]:  # end_date
-                if current_date > row[4]:
-                    status = "Completed"
-                elif row[3] and current_date >= row[3]:  # start_date
-                    status = "In Progress"
-            elif row[3] and current_date >= row[3]:
-                status = "In Progress"
-            
-            # Calculate completion percentage
-            total_tasks = row[8] or 0
-            completed_tasks = row[9] or 0
-            completion = 0
-            if total_tasks > 0:
-                completion = int((completed_tasks / total_tasks) * 100)
-            
-            projects.append({
-                'project_id': row[0],
-                'name': row[1],
-                'description': row[2],
-                'start_date': row[3].strftime('%Y-%m-%d') if row[3] else None,
-                'end_date': row[4].strftime('%Y-%m-%d') if row[4] else None,
-                'income': float(row[5]),
-                'expenses': float(row[6]),
-                'profit': float(row[7]),
-                'status': status,
-                'completion': completion
-            })
-        
-        return jsonify(projects)
-        
-    except Exception as e:
-        app.logger.error(f"Error fetching dashboard data: {str(e)}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
-        
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    """Main dashboard after login"""
-    conn = get_db_connection()
-    cur = None
-    try:
-        app.logger.info(f"Loading dashboard for user {session['user_id']}")
-        cur = conn.cursor()
-        
-        # User and company data
-        cur.execute("""
-            SELECT u.first_name, u.last_name, u.email, u.is_admin,
-                   c.name as company_name, c.email as company_email, 
-                   c.country, c.industry, c.is_active,
-                   s.status, s.current_period_end,
-                   p.name as plan_name, p.features
-            FROM users u
-            JOIN companies c ON u.company_id = c.id
-            LEFT JOIN subscriptions s ON c.id = s.company_id
-            LEFT JOIN plans p ON s.plan_id = p.id
-            WHERE u.id = %s
-        """, (session['user_id'],))
-        user_data = cur.fetchone()
-        
-        # Available plans
-        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
-        plans = cur.fetchall()
-        
-        # Company projects
-        cur.execute('SELECT * FROM projects WHERE company_id = %s', (session['company_id'],))
-        projects = cur.fetchall()
-        
-        # Prepare dashboard data
-        dashboard_data = []
-        total_income = 0
-        total_expenses = 0
-        monthly_data = {}
-        upcoming_payments = []
-        
-        for project in projects:
-            # Project income
-            cur.execute('SELECT SUM(amount) as total FROM income WHERE project_id = %s', 
-                       (project[0],))  # project[0] is id
-            incomes = cur.fetchone()
-            total_income_val = incomes[0] if incomes[0] else 0
-            
-            # Project expenses
-            cur.execute('SELECT SUM(amount) as total FROM expenses WHERE project_id = %s', 
-                       (project[0],))
-            expenses = cur.fetchone()
-            total_expenses_val = expenses[0] if expenses[0] else 0
-            
-            # Project tasks
-            cur.execute('SELECT COUNT(*) as total, SUM(CASE WHEN status = \'Completed\' THEN 1 ELSE 0 END) as completed FROM tasks WHERE project_id = %s',
-                        (project[0],))
-            tasks = cur.fetchone()
-            
-            # Calculate completion percentage
-            completion_percentage = 0
-            if tasks[0] and tasks[0] > 0:
-                completion_percentage = round((tasks[1] / tasks[0]) * 100)
-            
-            # Determine status
-            status = "Not Started"
-            current_date = datetime.now().strftime('%Y-%m-%d')
-            
-            if completion_percentage == 100:
-                status = "Completed"
-            elif current_date >= str(project[3]):  # project[3] is start_date
-                status = "In Progress"
-            
-            # Convert to PLN
-            income_pln = float(total_income_val) * get_exchange_rate_cached('USD')
-            expenses_pln = float(total_expenses_val) * get_exchange_rate_cached('USD')
-            
-            dashboard_data.append({
-                'project_id': project[0],
-                'name': project[1],
-                'description': project[2],
-                'start_date': project[3],
-                'end_date': project[4],
-                'status': status,
-                'income': income_pln,
-                'expenses': expenses_pln,
-                'profit': income_pln - expenses_pln,
-                'completion': completion_percentage
-            })
-            
-            # Details for monthly charts
-            cur.execute('SELECT * FROM income WHERE project_id = %s', (project[0],))
-            incomes = cur.fetchall()
-            for income in incomes:
-                amount_pln = convert_to_pln(income[4], income[5])  # amount and currency
-                total_income += amount_pln
-                month_key = datetime.strptime(str(income[3]), '%Y-%m-%d').strftime('%Y-%m')
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {'income': 0, 'expenses': 0}
-                monthly_data[month_key]['income'] += amount_pln
-                upcoming_payments.append({
-                    'type': 'income',
-                    'project_name': project[1],
-                    'date': income[3],
-                    'amount': amount_pln,
-                    'currency': 'PLN'
-                })
-
-            # Detailed expenses
-            cur.execute('SELECT * FROM expenses WHERE project_id = %s', (project[0],))
-            expenses = cur.fetchall()
-            for expense in expenses:
-                amount_pln = convert_to_pln(expense[4], expense[5])  # amount and currency
-                total_expenses += amount_pln
-                month_key = datetime.strptime(str(expense[3]), '%Y-%m-%d').strftime('%Y-%m')
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {'income': 0, 'expenses': 0}
-                monthly_data[month_key]['expenses'] += amount_pln
-                upcoming_payments.append({
-                    'type': 'expense',
-                    'project_name': project[1],
-                    'date': expense[3],
-                    'amount': amount_pln,
-                    'currency': 'PLN'
-                })
-
-        # Format monthly data for charts
-        monthly_chart_data = [
-            {
-                'month': k,
-                'income': round(v['income'], 2),
-                'expenses': round(v['expenses'], 2),
-                'profit': round(v['income'] - v['expenses'], 2)
-            }
-            for k, v in sorted(monthly_data.items())
-        ]
-        
-        # Sort upcoming payments by date
-        upcoming_payments.sort(key=lambda x: datetime.strptime(str(x['date']), '%Y-%m-%d'), reverse=True)
-
-        app.logger.info(f"Dashboard loaded with {len(dashboard_data)} projects")
-        return render_template('dashboard.html', 
-                             user=user_data, 
-                             plans=plans,
-                             projects=dashboard_data,
-                             monthly_data=monthly_chart_data,
-                             upcoming_payments=upcoming_payments,
-                             total_income=round(total_income, 2),
-                             total_expenses=round(total_expenses, 2),
-                             profit_loss=round(total_income - total_expenses, 2))
-        
-    except Exception as e:
-        app.logger.error(f"Dashboard error: {str(e)}", exc_info=True)
-        flash(f'Error loading dashboard: {str(e)}', 'danger')
-        return redirect(url_for('home'))
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
-
-# Project management routes
-@app.route('/projects')
-@login_required
-def projects():
-    """List all company projects"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute('SELECT * FROM projects WHERE company_id = %s ORDER BY start_date DESC', 
-                   (session['company_id'],))
-        projects = cur.fetchall()
-        return render_template('projects.html', projects=projects)
-    except Exception as e:
-        app.logger.error(f"Error listing projects: {str(e)}")
-        flash('Error loading projects', 'danger')
-        return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
-        conn.close()
-
-
-
-@app.route('/project/<int:project_id>')
-@login_required
-def project(project_id):
-    """Detailed project page"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Verify project belongs to company
-        cur.execute('SELECT * FROM projects WHERE id = %s AND company_id = %s', 
-                    (project_id, session['company_id']))
-        project = cur.fetchone()
-        
-        if not project:
-            flash('Project not found', 'danger')
-            return redirect(url_for('projects'))
-        
-        # Get income and expenses
-        cur.execute('SELECT * FROM income WHERE project_id = %s ORDER BY date DESC', (project_id,))
-        incomes = cur.fetchall()
-        
-        cur.execute('SELECT * FROM expenses WHERE project_id = %s ORDER BY date DESC', (project_id,))
-        expenses = cur.fetchall()
-        
-        # Get tasks
-        cur.execute('SELECT * FROM tasks WHERE project_id = %s ORDER BY due_date', (project_id,))
-        tasks = cur.fetchall()
-        
-        # Calculate totals
-        total_income = sum(convert_to_pln(i[4], i[5]) for i in incomes)  # amount and currency
-        total_expenses = sum(convert_to_pln(e[4], e[5]) for e in expenses)  # amount and currency
-        
-        return render_template('project.html',
-                             project=project,
-                             incomes=incomes,
-                             expenses=expenses,
-                             tasks=tasks,
-                             total_income=total_income,
-                             total_expenses=total_expenses,
-                             profit_loss=total_income - total_expenses)
-    except Exception as e:
-        app.logger.error(f"Error loading project: {str(e)}")
-        flash('Error loading project', 'danger')
-        return redirect(url_for('projects'))
-    finally:
-        cur.close()
-        conn.close()
-
-@app.route('/add_project', methods=['GET', 'POST'])
-@login_required
-def add_project():
-    """Add new project"""
-    if request.method == 'POST':
-        name = request.form['name'].strip()
-        description = request.form['description'].strip()
-        start_date = request.form['start_date']
-        end_date = request.form['end_date']
-        
-        if not name or not start_date or not end_date:
-            flash('Name and dates are required', 'danger')
-            return redirect(url_for('add_project'))
-        
-        # Check project limit
-        allowed, error_msg = check_company_limits(session['company_id'], 'project')
-        if not allowed:
-            flash(error_msg, 'danger')
-            return redirect(url_for('add_project'))
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
-        try:
-            cur.execute('''
-                INSERT INTO projects 
-                (name, description, start_date, end_date, company_id)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (name, description, start_date, end_date, session['company_id']))
-            conn.commit()
-            flash('Project added successfully!', 'success')
-            return redirect(url_for('projects'))
-        except Exception as e:
-            conn.rollback()
-            app.logger.error(f"Error adding project: {str(e)}")
-            flash('Error adding project', 'danger')
-            return redirect(url_for('add_project'))
-        finally:
-            cur.close()
-            conn.close()
-    
-    return render_template('add_project.html')
+            log.info("Database schema is up to date")
+    except Exception as e:
+        log.error(f"Error initializing database: {str(e)}", exc_info=True)
+
+# ===== APPLICATION FACTORY =====
+def create_app():
+    """Build the Flask app: configuration, request hooks and every blueprint
+
+    Opens no connections and starts no background workers, so a preloading
+    server can call it in the master; each worker then calls
+    ``init_worker()``.  The only thread it starts is the log listener (on
+    the first call), which log_config restarts in each forked child.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.getenv('SECRET_KEY')
+    # {% cache %} fragments and compiled templates shared on disk (see template_cache.py)
+    app.jinja_options = {**app.jinja_options, 'extensions': [FragmentCacheExtension], 'bytecode_cache': bytecode_cache()}
+
+    # Records are queued and written by a background listener (JSON lines,
+    # rotated by logrotate); hot-path messages are sampled via LOG_SAMPLE_RATE
+    configure_logging(app)
+
+    # Per-request wall/DB/FX/outbound timings -> route stats, and a Server-Timing
+    # header for ops clients (SERVER_TIMING=ops, see main_views.ops_access_allowed)
+    from main_views import ops_access_allowed
+    server_timing = os.getenv('SERVER_TIMING', 'ops').lower()
+    instrumentation.init_app(app, {'all': lambda: True, 'off': None}.get(server_timing, ops_access_allowed))
+    # Request budgets per endpoint; enforced whole under gevent workers (see timeouts.py)
+    timeouts.init_app(app, float(os.getenv('REQUEST_TIMEOUT_SECONDS', 30)))
+    # gzip / brotli for JSON and HTML responses (COMPRESS_MIN_BYTES=0 disables it)
+    if int(os.getenv('COMPRESS_MIN_BYTES', 1024)) > 0:
+        compression.init_app(app, int(os.getenv('COMPRESS_MIN_BYTES', 1024)), int(os.getenv('COMPRESS_LEVEL', 6)))
+    # Development/CI: flag repeated statements per request (NPLUSONE_DETECT=1)
+    nplusone.init_app(app)
+
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True') == 'True'
+    app.config['MAIL_USE_SSL'] = os.getenv('MAIL_USE_SSL', 'False') == 'True'  # Corrigido
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = (os.getenv('MAIL_SENDER_NAME', 'Ayist Group'),
+                                         os.getenv('MAIL_DEFAULT_SENDER'))
+    app.config['MAIL_DEBUG'] = os.getenv('FLASK_DEBUG', 'False') == 'True'
+    app.config['MAIL_SUPPRESS_SEND'] = os.getenv('MAIL_SUPPRESS_SEND', 'False') == 'True'
+
+    if app.config['MAIL_USE_TLS'] and app.config['MAIL_USE_SSL']:
+        app.config['MAIL_USE_SSL'] = False
+        log.warning("MAIL_USE_SSL desativado devido a conflito com MAIL_USE_TLS")
+    mail.init_app(app)
+
+    # Rendered {% cache %} fragments, scoped to the current tenant
+    app.jinja_env.fragment_cache = fragment_cache
+    app.jinja_env.fragment_cache_scope = lambda: session.get('company_id') if has_request_context() else None
+    app.add_template_global(asset_url)
+
+    from auth_views import bp as auth_bp
+    from project_views import bp as projects_bp
+    from finance_views import bp as finance_bp
+    from reporting_views import bp as reporting_bp
+    from billing_views import bp as billing_bp
+    from ai_views import bp as ai_bp
+    from main_views import bp as main_bp
+    for blueprint in (auth_bp, projects_bp, finance_bp, reporting_bp, billing_bp, ai_bp, main_bp):
+        app.register_blueprint(blueprint)
+
+    # Behind reverse proxies, request.remote_addr (rate limits, ops access) and
+    # the scheme come from the X-Forwarded-* headers the last N proxies set
+    proxy_hops = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+    if proxy_hops > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+    return app
+
+def init_worker():
+    """Per-process resources: background threads and pools do not survive a fork
+
+    Called by gunicorn's post_fork hook (gunicorn.conf.py) in every worker and
+    by the development server, the only place these threads are started.
+    Each call is a no-op when already done in this process.
+    """
+    kpi_refresher.ensure_started()
+    analytics_refresher.ensure_started()
+    change_feed.ensure_started()
+    log.info(f"Worker {os.getpid()} initialised")
+
+def run_development_server():
+    """`python app.py`: apply migrations and serve with Flask's development server"""
+    app = create_app()
+    init_db()
 
-@app.route('/projects/<int:project_id>/delete', methods=['POST'])
-@login_required
-def delete_project(project_id):
-    """Delete a project"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Verify project belongs to company
-        cur.execute('SELECT id FROM projects WHERE id = %s AND company_id = %s', 
-                   (project_id, session['company_id']))
-        if not cur.fetchone():
-            flash('Project not found or access denied', 'danger')
-            return redirect(url_for('projects'))
-        
-        cur.execute('DELETE FROM projects WHERE id = %s', (project_id,))
-        conn.commit()
-        flash('Project deleted successfully', 'success')
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Error deleting project: {str(e)}")
-        flash('Error deleting project', 'danger')
-    finally:
-        cur.close()
-        conn.close()
-    return redirect(url_for('projects'))
-
-# Income and expense routes
-@app.route('/project/<int:project_id>/add_income', methods=['GET', 'POST'])
-@login_required
-def add_income(project_id):
-    """Add income to a project"""
-    if request.method == 'POST':
-        type_ = request.form['type'].strip()
-        date = request.form['date']
-        amount = request.form['amount']
-        currency = request.form['currency']
-        invoice_link = request.form.get('invoice_link', '').strip()
-        description = request.form.get('description', '').strip()
-        
-        # Basic validations
-        if not type_ or not date or not amount or not currency:
-            flash('All required fields must be filled', 'danger')
-            return redirect(url_for('add_income', project_id=project_id))
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
-        try:
-            # Verify project belongs to company
-            cur.execute('SELECT id FROM projects WHERE id = %s AND company_id = %s', 
-                       (project_id, session['company_id']))
-            if not cur.fetchone():
-                flash('Project not found or access denied', 'danger')
-                return redirect(url_for('projects'))
-            
-            # Generate invoice ID
-            today = date.replace("-", "")
-            cur.execute(
-                'SELECT COUNT(*) FROM income WHERE date = %s AND project_id = %s',
-                (date, project_id)
-            )
-            invoice_count = cur.fetchone()[0] + 1
-            invoice_id = f"{today}_{project_id}_{invoice_count}"
-
-            # Insert income
-            cur.execute('''
-                INSERT INTO income 
-                (project_id, type, date, amount, currency, invoice_id, invoice_link, description)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (project_id, type_, date, amount, currency, invoice_id, invoice_link, description))
-            conn.commit()
-            
-            flash('Income added successfully!', 'success')
-            return redirect(url_for('project', project_id=project_id))
-        except Exception as e:
-            conn.rollback()
-            app.logger.error(f"Error adding income: {str(e)}")
-            flash('Error adding income', 'danger')
-            return redirect(url_for('add_income', project_id=project_id))
-        finally:
-            cur.close()
-            conn.close()
-    
-    return render_template('add_income.html', project_id=project_id)
-
-@app.route('/project/<int:project_id>/add_expense', methods=['GET', 'POST'])
-@login_required
-def add_expense(project_id):
-    """Add expense to a project"""
-    if request.method == 'POST':
-        type_ = request.form['type'].strip()
-        date = request.form['date']
-        amount = request.form['amount']
-        currency = request.form['currency']
-        invoice_link = request.form.get('invoice_link', '').strip()
-        description = request.form.get('description', '').strip()
-        
-        # Basic validations
-        if not type_ or not date or not amount or not currency:
-            flash('All required fields must be filled', 'danger')
-            return redirect(url_for('add_expense', project_id=project_id))
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
-        try:
-            # Verify project belongs to company
-            cur.execute('SELECT id FROM projects WHERE id = %s AND company_id = %s', 
-                       (project_id, session['company_id']))
-            if not cur.fetchone():
-                flash('Project not found or access denied', 'danger')
-                return redirect(url_for('projects'))
-            
-            # Generate invoice ID
-            today = date.replace("-", "")
-            cur.execute(
-                'SELECT COUNT(*) FROM expenses WHERE date = %s AND project_id = %s',
-                (date, project_id)
-            )
-            invoice_count = cur.fetchone()[0] + 1
-            invoice_id = f"{today}_{project_id}_{invoice_count}"
-
-            # Insert expense
-            cur.execute('''
-                INSERT INTO expenses 
-                (project_id, type, date, amount, currency, invoice_id, invoice_link, description)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (project_id, type_, date, amount, currency, invoice_id, invoice_link, description))
-            conn.commit()
-            
-            flash('Expense added successfully!', 'success')
-            return redirect(url_for('project', project_id=project_id))
-        except Exception as e:
-            conn.rollback()
-            app.logger.error(f"Error adding expense: {str(e)}")
-            flash('Error adding expense', 'danger')
-            return redirect(url_for('add_expense', project_id=project_id))
-        finally:
-            cur.close()
-            conn.close()
-    
-    return render_template('add_expense.html', project_id=project_id)
+    # Additional configurations
+    app.config['TEMPLATES_AUTO_RELOAD'] = True
+    app.config['SESSION_COOKIE_SECURE'] = os.getenv('FLASK_ENV') == 'production'
+    app.config['SESSION_COOKIE_guardar/14/06 email e testeHTTPONLY'] = True
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
-# General expenses routes
-@app.route('/general_expenses')
-@login_required
-def general_expenses():
-    """List expenses not linked to projects"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute('''
-            SELECT * FROM general_expenses 
-            WHERE company_id = %s
-            ORDER BY date DESC
-        ''', (session['company_id'],))
-        expenses = cur.fetchall()
-        
-        total_expenses = sum(convert_to_pln(expense[4], expense[5]) for expense in expenses)
-        
-        return render_template('general_expenses.html', 
-                             expenses=expenses,
-                             total_expenses=total_expenses)
-    except Exception as e:
-        app.logger.error(f"Error loading general expenses: {str(e)}")
-        flash('Error loading expenses', 'danger')
-        return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
-        conn.close()
+    init_worker()
+    app.run(
+        host=os.getenv('FLASK_HOST', '0.0.0.0'),
+        port=int(os.getenv('FLASK_PORT', 5000)),
+        debug=os.getenv('FLASK_DEBUG', 'False') == 'True'
+    )
 
-@app.route('/add_general_expense', methods=['GET', 'POST'])
-@login_required
-def add_general_expense():
-    """Add general expense"""
-    if request.method == 'POST':
-        type_ = request.form['type'].strip()
-        date = request.form['date']
-        amount = request.form['amount']
-        currency = request.form['currency']
-        description = request.form.get('description', '').strip()
-        
-        if not type_ or not date or not amount or not currency:
-            flash('All required fields must be filled', 'danger')
-            return redirect(url_for('add_general_expense'))
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
-        try:
-            cur.execute('''
-                INSERT INTO general_expenses 
-                (company_id, type, date, amount, currency, description)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            ''', (session['company_id'], type_, date, amount, currency, description))
-            conn.commit()
-            
-            flash('General expense added successfully!', 'success')
-            return redirect(url_for('general_expenses'))
-        except Exception as e:
-            conn.rollback()
-            app.logger.error(f"Error adding general expense: {str(e)}")
-            flash('Error adding expense', 'danger')
-            return redirect(url_for('add_general_expense'))
-        finally:
-            cur.close()
-            conn.close()
-    
-    return render_template('add_general_expense.html')
-
-# Task routes
-@app.route('/project/<int:project_id>/add_task', methods=['POST'])
-@login_required
-def add_task(project_id):
-    """Add task to a project"""
-    title = request.form['title'].strip()
-    description = request.form.get('description', '').strip()
-    due_date = request.form['due_date']
-    assigned_user = request.form.get('assigned_user', '').strip()
-    
-    if not title or not due_date:
-        flash('Title and due date are required', 'danger')
-        return redirect(url_for('project', project_id=project_id))
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Verify project belongs to company
-        cur.execute('SELECT id FROM projects WHERE id = %s AND company_id = %s', 
-                   (project_id, session['company_id']))
-        if not cur.fetchone():
-            flash('Project not found or access denied', 'danger')
-            return redirect(url_for('projects'))
-        
-        # Insert task
-        cur.execute('''
-            INSERT INTO tasks 
-            (project_id, title, description, due_date, assigned_user, status)
-            VALUES (%s, %s, %s, %s, %s, 'Pending')
-        ''', (project_id, title, description, due_date, assigned_user))
-        conn.commit()
-        
-        flash('Task added successfully!', 'success')
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Error adding task: {str(e)}")
-        flash('Error adding task', 'danger')
-    finally:
-        cur.close()
-        conn.close()
-    
-    return redirect(url_for('project', project_id=project_id))
-
-@app.route('/task/<int:task_id>/update_status', methods=['POST'])
-@login_required
-def update_task_status(task_id):
-    """Update task status"""
-    new_status = request.form['status']
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Verify task belongs to company
-        cur.execute('''
-            SELECT t.id FROM tasks t
-            JOIN projects p ON t.project_id = p.id
-            WHERE t.id = %s AND p.company_id = %s
-        ''', (task_id, session['company_id']))
-        if not cur.fetchone():
-            flash('Task not found or access denied', 'danger')
-            return redirect(url_for('dashboard'))
-        
-        # Update status
-        cur.execute('''
-            UPDATE tasks SET status = %s 
-            WHERE id = %s
-        ''', (new_status, task_id))
-        conn.commit()
-        
-        flash('Task status updated!', 'success')
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Error updating task: {str(e)}")
-        flash('Error updating task', 'danger')
-    finally:
-        cur.close()
-        conn.close()
-    
-    # Redirect back to project
-    cur = conn.cursor()
-    cur.execute('SELECT project_id FROM tasks WHERE id = %s', (task_id,))
-    project_id = cur.fetchone()[0]
-    cur.close()
-    return redirect(url_for('project', project_id=project_id))
-
-# Reporting routes
-@app.route('/reporting')
-@login_required
-def reporting():
-    """Reporting page"""
-    return render_template('reporting.html')
-
-@app.route('/api/report-data')
-@login_required
-def report_data():
-    """API for report data"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Income data
-        cur.execute('''
-            SELECT i.date, i.amount, i.currency, p.name as project_name
-            FROM income i
-            JOIN projects p ON i.project_id = p.id
-            WHERE p.company_id = %s
-            ORDER BY i.date
-        ''', (session['company_id'],))
-        incomes = cur.fetchall()
-        
-        # Project expenses data
-        cur.execute('''
-            SELECT e.date, e.amount, e.currency, p.name as project_name
-            FROM expenses e
-            JOIN projects p ON e.project_id = p.id
-            WHERE p.company_id = %s
-            ORDER BY e.date
-        ''', (session['company_id'],))
-        project_expenses = cur.fetchall()
-        
-        # General expenses data
-        cur.execute('''
-            SELECT id, 'General Expense' as project_name, type, date, 
-                   amount, currency, 'general_expense' as transaction_type,
-                   description, '' as invoice_link
-            FROM general_expenses
-            WHERE company_id = %s
-            ORDER BY date DESC
-        ''', (session['company_id'],))
-        general_expenses = cur.fetchall()
-        
-        # Process data for reports
-        monthly_data = {}
-        yearly_data = {}
-        project_data = {}
-        
-        # Process income
-        for income in incomes:
-            date = income[0]
-            amount = convert_to_pln(income[1], income[2])
-            project = income[3]
-            
-            # By month
-            month_key = date.strftime('%Y-%m')
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {'income': 0, 'expenses': 0, 'profit': 0}
-            monthly_data[month_key]['income'] += amount
-            monthly_data[month_key]['profit'] += amount
-            
-            # By year
-            year_key = date.strftime('%Y')
-            if year_key not in yearly_data:
-                yearly_data[year_key] = {'income': 0, 'expenses': 0, 'profit': 0}
-            yearly_data[year_key]['income'] += amount
-            yearly_data[year_key]['profit'] += amount
-            
-            # By project
-            if project not in project_data:
-                project_data[project] = {'income': 0, 'expenses': 0, 'profit': 0}
-            project_data[project]['income'] += amount
-            project_data[project]['profit'] += amount
-        
-        # Process project expenses
-        for expense in project_expenses:
-            date = expense[0]
-            amount = convert_to_pln(expense[1], expense[2])
-            project = expense[3]
-            
-            # By month
-            month_key = date.strftime('%Y-%m')
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {'income': 0, 'expenses': 0, 'profit': 0}
-            monthly_data[month_key]['expenses'] += amount
-            monthly_data[month_key]['profit'] -= amount
-            
-            # By year
-            year_key = date.strftime('%Y')
-            if year_key not in yearly_data:
-                yearly_data[year_key] = {'income': 0, 'expenses': 0, 'profit': 0}
-            yearly_data[year_key]['expenses'] += amount
-            yearly_data[year_key]['profit'] -= amount
-            
-            # By project
-            if project not in project_data:
-                project_data[project] = {'income': 0, 'expenses': 0, 'profit': 0}
-            project_data[project]['expenses'] += amount
-            project_data[project]['profit'] -= amount
-        
-        # Process general expenses
-        for expense in general_expenses:
-            date = expense[0]
-            amount = convert_to_pln(expense[4], expense[5])
-            
-            # By month
-            month_key = date.strftime('%Y-%m')
-            if month_key not in monthly_data:
-                monthly_data[month_key] = {'income': 0, 'expenses': 0, 'profit': 0}
-            monthly_data[month_key]['expenses'] += amount
-            monthly_data[month_key]['profit'] -= amount
-            
-            # By year
-            year_key = date.strftime('%Y')
-            if year_key not in yearly_data:
-                yearly_data[year_key] = {'income': 0, 'expenses': 0, 'profit': 0}
-            yearly_data[year_key]['expenses'] += amount
-            yearly_data[year_key]['profit'] -= amount
-        
-        # Format data for response
-        monthly_report = [{
-            'month': k,
-            'income': round(v['income'], 2),
-            'expenses': round(v['expenses'], 2),
-            'profit': round(v['profit'], 2)
-        } for k, v in sorted(monthly_data.items())]
-        
-        yearly_report = [{
-            'year': k,
-            'income': round(v['income'], 2),
-            'expenses': round(v['expenses'], 2),
-            'profit': round(v['profit'], 2)
-        } for k, v in sorted(yearly_data.items())]
-        
-        project_report = [{
-            'project': k,
-            'income': round(v['income'], 2),
-            'expenses': round(v['expenses'], 2),
-            'profit': round(v['profit'], 2)
-        } for k, v in project_data.items()]
-        
-        return jsonify({
-            'monthly': monthly_report,
-            'yearly': yearly_report,
-            'projects': project_report
-        })
-    except Exception as e:
-        app.logger.error(f"Error generating reports: {str(e)}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-# Unified view routes
-@app.route('/unified')
-@login_required
-def unified_view():
-    """Unified view of all transactions"""
-    return render_template('unified_view.html')
-
-@app.route('/api/unified-transactions')
-@login_required
-def unified_transactions():
-    """API for unified transactions"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        transactions = []
-        
-        # Income
-        cur.execute('''
-            SELECT i.id, p.name as project, i.type, i.date, 
-                   i.amount, i.currency, 'income' as transaction_type,
-                   i.description, i.invoice_link
-            FROM income i
-            JOIN projects p ON i.project_id = p.id
-            WHERE p.company_id = %s
-            ORDER BY i.date DESC
-        ''', (session['company_id'],))
-        for row in cur.fetchall():
-            transactions.append({
-                'id': row[0],
-                'project': row[1],
-                'type': row[2],
-                'date': row[3],
-                'amount': convert_to_pln(row[4], row[5]),
-                'original_amount': row[4],
-                'original_currency': row[5],
-                'transaction_type': row[6],
-                'description': row[7],
-                'invoice_link': row[8]
-            })
-        
-        # Project expenses
-        cur.execute('''
-            SELECT e.id, p.name as project, e.type, e.date, 
-                   e.amount, e.currency, 'expense' as transaction_type,
-                   e.description, e.invoice_link
-            FROM expenses e
-            JOIN projects p ON e.project_id = p.id
-            WHERE p.company_id = %s
-            ORDER BY e.date DESC
-        ''', (session['company_id'],))
-        for row in cur.fetchall():
-            transactions.append({
-                'id': row[0],
-                'project': row[1],
-                'type': row[2],
-                'date': row[3],
-                'amount': convert_to_pln(row[4], row[5]),
-                'original_amount': row[4],
-                'original_currency': row[5],
-                'transaction_type': row[6],
-                'description': row[7],
-                'invoice_link': row[8]
-            })
-        
-        # General expenses
-        cur.execute('''
-            SELECT id, 'General Expense' as project, type, date, 
-                   amount, currency, 'general_expense' as transaction_type,
-                   description, '' as invoice_link
-            FROM general_expenses
-            WHERE company_id = %s
-            ORDER BY date DESC
-        ''', (session['company_id'],))
-        for row in cur.fetchall():
-            transactions.append({
-                'id': row[0],
-                'project': row[1],
-                'type': row[2],
-                'date': row[3],
-                'amount': convert_to_pln(row[4], row[5]),
-                'original_amount': row[4],
-                'original_currency': row[5],
-                'transaction_type': row[6],
-                'description': row[7],
-                'invoice_link': row[8]
-            })
-        
-        # Sort by date (newest first)
-        transactions.sort(key=lambda x: x['date'], reverse=True)
-        
-        return jsonify(transactions)
-    except Exception as e:
-        app.logger.error(f"Error fetching unified transactions: {str(e)}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-# User management routes
-@app.route('/users')
-@admin_required
-def user_management():
-    """Company user management"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute('''
-            SELECT id, first_name, last_name, email, last_login, is_admin
-            FROM users
-            WHERE company_id = %s
-            ORDER BY first_name
-        ''', (session['company_id'],))
-        users = cur.fetchall()
-        
-        # Get user limit from plan
-        cur.execute('''
-            SELECT features->>'max_users' 
-            FROM companies c
-            JOIN plans p ON c.plan_id = p.id
-            WHERE c.id = %s
-        ''', (session['company_id'],))
-        max_users = cur.fetchone()[0]
-        
-        # Calculate user usage
-        current_users = len(users)
-        user_limit = int(max_users) if max_users != 'unlimited' else float('inf')
-        
-        return render_template('users.html', 
-                             users=users, 
-                             current_users=current_users,
-                             max_users=user_limit)
-    except Exception as e:
-        app.logger.error(f"Error listing users: {str(e)}")
-        flash('Error loading users', 'danger')
-        return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
-        conn.close()
-
-@app.route('/add-user', methods=['GET', 'POST'])
-@admin_required
-def add_user():
-    """Add new user to company"""
-    if request.method == 'POST':
-        first_name = request.form['first_name'].strip()
-        last_name = request.form['last_name'].strip()
-        email = request.form['email'].strip().lower()
-        password = request.form['password']
-        confirm_password = request.form['confirm_password']
-        is_admin = 'is_admin' in request.form
-        
-        # Basic validations
-        if not all([first_name, email, password, confirm_password]):
-            flash('All required fields must be filled', 'danger')
-            return redirect(url_for('add_user'))
-        
-        # Validate email
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-            flash('Invalid email', 'danger')
-            return redirect(url_for('add_user'))
-        
-        # Validate password
-        is_valid, error_msg = is_password_valid(password)
-        if not is_valid:
-            flash(error_msg, 'danger')
-            return redirect(url_for('add_user'))
-        
-        if password != confirm_password:
-            flash('Passwords do not match', 'danger')
-            return redirect(url_for('add_user'))
-        
-        # Check user limit
-        allowed, error_msg = check_company_limits(session['company_id'], 'user')
-        if not allowed:
-            flash(error_msg, 'danger')
-            return redirect(url_for('user_management'))
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
-        try:
-            # Check if email already in use
-            cur.execute("""
-                SELECT id FROM users 
-                WHERE email = %s AND company_id = %s
-            """, (email, session['company_id']))
-            if cur.fetchone():
-                flash('This email is already registered in this company', 'danger')
-                return redirect(url_for('add_user'))
-            
-            # Hash password
-            hashed_password = generate_password_hash(password)
-            
-            # Insert new user
-            cur.execute("""
-                INSERT INTO users (
-                    first_name, last_name, email, password, 
-                    company_id, is_admin, email_verified
-                ) VALUES (%s, %s, %s, %s, %s, %s, TRUE)
-            """, (
-                first_name,
-                last_name,
-                email,
-                hashed_password,
-                session['company_id'],
-                is_admin
-            ))
-            
-            conn.commit()
-            flash('User added successfully!', 'success')
-            return redirect(url_for('user_management'))
-            
-        except Exception as e:
-            conn.rollback()
-            app.logger.error(f"Error adding user: {str(e)}")
-            flash('Error adding user', 'danger')
-            return redirect(url_for('add_user'))
-        finally:
-            cur.close()
-            conn.close()
-    
-    return render_template('add_user.html')
-
-@app.route('/users/<int:user_id>/update_role', methods=['POST'])
-@admin_required
-def update_user_role(user_id):
-    """Update user role"""
-    new_role = request.form['role']
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Verify user belongs to company
-        cur.execute('''
-            UPDATE users SET role = %s 
-            WHERE id = %s AND company_id = %s
-        ''', (new_role, user_id, session['company_id']))
-        
-        if cur.rowcount == 0:
-            flash('User not found or access denied', 'danger')
-        else:
-            conn.commit()
-            flash('User role updated successfully', 'success')
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Error updating user role: {str(e)}")
-        flash('Error updating role', 'danger')
-    finally:
-        cur.close()
-        conn.close()
-    
-    return redirect(url_for('user_management'))
-
-@app.route('/users/<int:user_id>/delete', methods=['POST'])
-@admin_required
-def delete_user(user_id):
-    """Delete user from company"""
-    # Prevent admin from deleting themselves
-    if user_id == session['user_id']:
-        flash('You cannot delete yourself', 'danger')
-        return redirect(url_for('user_management'))
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Verify user belongs to company
-        cur.execute('''
-            DELETE FROM users 
-            WHERE id = %s AND company_id = %s
-        ''', (user_id, session['company_id']))
-        
-        if cur.rowcount == 0:
-            flash('User not found or access denied', 'danger')
-        else:
-            conn.commit()
-            flash('User deleted successfully', 'success')
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Error deleting user: {str(e)}")
-        flash('Error deleting user', 'danger')
-    finally:
-        cur.close()
-        conn.close()
-    
-    return redirect(url_for('user_management'))
-
-# Tender analysis routes
-@app.route('/tender-analysis')
-@login_required
-def tender_analysis():
-    """Tender analysis page"""
-    return render_template('tender_analysis.html')
-
-@app.route('/api/analyze-tender', methods=['POST'])
-@login_required
-def analyze_tender():
-    """API for tender analysis with Gemini"""
-    if request.method == 'POST':
-        tender_text = request.form.get('tender_text', '').strip()
-        if not tender_text:
-            return jsonify({"error": "Tender text is required"}), 400
-        
-        try:
-            prompt = f"""Analyze the following tender document and provide:
-1. Summary of main requirements
-2. Important deadlines
-3. Evaluation criteria
-4. Recommendations for proposal preparation
-
-Document:
-{tender_text}"""
-            
-            analysis = gemini_request(prompt)
-            return jsonify({'analysis': analysis})
-        except Exception as e:
-            app.logger.error(f"Tender analysis error: {str(e)}")
-            return jsonify({'error': 'Analysis error'}), 500
-    
-    return jsonify({'error': 'Invalid method'}), 405
-
-# Invoices routes
-@app.route('/invoices')
-@login_required
-def invoices():
-    """Invoice list"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Income invoices
-        cur.execute('''
-            SELECT i.id, i.invoice_id, i.date, i.amount, i.currency,
-                   i.invoice_link, p.name as project_name, 'income' as type
-            FROM income i
-            JOIN projects p ON i.project_id = p.id
-            WHERE p.company_id = %s
-            ORDER BY i.date DESC
-        ''', (session['company_id'],))
-        income_invoices = cur.fetchall()
-        
-        # Expense invoices
-        cur.execute('''
-            SELECT e.id, e.invoice_id, e.date, e.amount, e.currency,
-                   e.invoice_link, p.name as project_name, 'expense' as type
-            FROM expenses e
-            JOIN projects p ON e.project_id = p.id
-            WHERE p.company_id = %s
-            ORDER BY e.date DESC
-        ''', (session['company_id'],))
-        expense_invoices = cur.fetchall()
-        
-        # Combine and sort
-        all_invoices = []
-        for inv in income_invoices + expense_invoices:
-            all_invoices.append({
-                'id': inv[0],
-                'invoice_id': inv[1],
-                'date': inv[2],
-                'amount': convert_to_pln(inv[3], inv[4]),
-                'original_amount': inv[3],
-                'original_currency': inv[4],
-                'invoice_link': inv[5],
-                'project_name': inv[6],
-                'type': inv[7]
-            })
-        
-        all_invoices.sort(key=lambda x: x['date'], reverse=True)
-        
-        return render_template('invoices.html', invoices=all_invoices)
-    except Exception as e:
-        app.logger.error(f"Error loading invoices: {str(e)}")
-        flash('Error loading invoices', 'danger')
-        return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
-        conn.close()
-
-# ============== PLANS AND SUBSCRIPTIONS ==============
-
-@app.route('/plans')
-@login_required
-def plans():
-    """Plan selection page"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Verify if company already has active plan
-        cur.execute("SELECT is_active FROM companies WHERE id = %s", 
-                   (session['company_id'],))
-        company = cur.fetchone()
-        
-        if company and company[0]:
-            flash('Your company already has an active plan', 'info')
-            return redirect(url_for('dashboard'))
-        
-        # Fetch available plans
-        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
-        plans = cur.fetchall()
-        return render_template('plans.html', plans=plans, stripe_public_key=stripe_public_key)
-    except Exception as e:
-        app.logger.error(f"Error loading plans: {str(e)}")
-        flash('Error loading plans', 'danger')
-        return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
-        conn.close()
-
-
-
-
-
-
-@app.route('/create-checkout-session/<int:plan_id>', methods=['POST'])
-@login_required
-def create_checkout_session(plan_id):
-    """Create checkout session for subscription"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Fetch plan data
-        cur.execute("""
-            SELECT id, name, price, stripe_price_id 
-            FROM plans WHERE id = %s
-        """, (plan_id,))
-        plan = cur.fetchone()
-        
-        if not plan:
-            return jsonify({'error': 'Plan not found'}), 404
-        
-        # Fetch company stripe_customer_id (decrypt)
-        cur.execute("""
-            SELECT stripe_customer_id 
-            FROM companies 
-            WHERE id = %s
-        """, (session['company_id'],))
-        customer = cur.fetchone()
-        
-        customer_id = None
-        if customer and customer[0]:
-            customer_id = decrypt_data(customer[0])
-        
-        if not customer_id:
-            # Create Stripe customer if doesn't exist
-            cur.execute("""
-                SELECT name, email 
-                FROM companies 
-                WHERE id = %s
-            """, (session['company_id'],))
-            company = cur.fetchone()
-            
-            stripe_customer = stripe.Customer.create(
-                email=company[1],
-                name=company[0],
-                metadata={'company_id': session['company_id']}
-            )
-            # Encrypt and store customer ID
-            encrypted_customer_id = encrypt_data(stripe_customer.id)
-            cur.execute("""
-                UPDATE companies 
-                SET stripe_customer_id = %s 
-                WHERE id = %s
-            """, (encrypted_customer_id, session['company_id']))
-            conn.commit()
-            customer_id = stripe_customer.id
-        
-        # Create checkout session
-        checkout_session = stripe.checkout.Session.create(
-            customer=customer_id,
-            payment_method_types=['card'],
-            line_items=[{
-                'price': plan[3],  # stripe_price_id
-                'quantity': 1,
-            }],
-            mode='subscription',
-            success_url=url_for('subscription_success', _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
-            cancel_url=url_for('plans', _external=True),
-            metadata={
-                'company_id': session['company_id'],
-                'plan_id': plan[0]
-            }
-        )
-        
-        return jsonify({'id': checkout_session.id})
-        
-    except Exception as e:
-        app.logger.error(f"Error creating checkout session: {str(e)}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-@app.route('/activate_free_plan', methods=['POST'])
-@login_required
-def activate_free_plan():
-    """Activate free plan for company"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Find free plan
-        cur.execute("SELECT id FROM plans WHERE price = 0 AND is_active = TRUE LIMIT 1")
-        free_plan = cur.fetchone()
-        if not free_plan:
-            return jsonify({'error': 'Free plan not found'}), 404
-        
-        # Update company with free plan
-        cur.execute("""
-            UPDATE companies 
-            SET plan_id = %s, is_active = TRUE 
-            WHERE id = %s
-        """, (free_plan[0], session['company_id']))
-        
-        conn.commit()
-        return jsonify({'success': True})
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Error activating free plan: {str(e)}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-# Route for subscription management
-@app.route('/subscriptions')
-@admin_required
-def subscriptions():
-    """Subscription management dashboard"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Get current subscription
-        cur.execute("""
-            SELECT s.id, p.name, s.status, s.current_period_end, 
-                   s.stripe_subscription_id, p.price, s.cancel_at_period_end,
-                   s.renewal_date
-            FROM subscriptions s
-            JOIN plans p ON s.plan_id = p.id
-            WHERE s.company_id = %s
-        """, (session['company_id'],))
-        subscription = cur.fetchone()
-        
-        # Get payment history
-        cur.execute("""
-            SELECT id, amount, currency, payment_date, invoice_id
-            FROM payments
-            WHERE company_id = %s
-            ORDER BY payment_date DESC
-        """, (session['company_id'],))
-        payments = cur.fetchall()
-        
-        # Get plan changes history
-        cur.execute("""
-            SELECT pc.change_date, p_old.name, p_new.name, p_new.price
-            FROM plan_changes pc
-            JOIN plans p_new ON pc.new_plan_id = p_new.id
-            LEFT JOIN plans p_old ON pc.old_plan_id = p_old.id
-            WHERE pc.company_id = %s
-            ORDER BY pc.change_date DESC
-        """, (session['company_id'],))
-        changes = cur.fetchall()
-        
-        # Get available plans
-        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
-        plans = cur.fetchall()
-        
-        return render_template('subscriptions.html', 
-                             subscription=subscription,
-                             payments=payments,
-                             changes=changes,
-                             plans=plans)
-    except Exception as e:
-        app.logger.error(f"Error loading subscriptions: {str(e)}")
-        flash('Error loading subscription information', 'danger')
-        return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
-        conn.close()
-
-@app.route('/change-plan', methods=['POST'])
-@login_required
-def change_plan():
-    """Change company plan"""
-    new_plan_id = request.form.get('new_plan_id')
-    if not new_plan_id:
-        flash('Plan not selected', 'danger')
-        return redirect(url_for('subscription_management'))
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Get current plan
-        cur.execute("""
-            SELECT s.stripe_subscription_id 
-            FROM subscriptions s
-            WHERE s.company_id = %s AND s.status = 'active'
-        """, (session['company_id'],))
-        subscription = cur.fetchone()
-        
-        if not subscription:
-            flash('No active subscription found', 'danger')
-            return redirect(url_for('subscription_management'))
-        
-        # Get new plan
-        cur.execute("""
-            SELECT stripe_price_id 
-            FROM plans 
-            WHERE id = %s AND is_active = TRUE
-        """, (new_plan_id,))
-        new_plan = cur.fetchone()
-        
-        if not new_plan:
-            flash('Invalid plan', 'danger')
-            return redirect(url_for('subscription_management'))
-        
-        # Update subscription in Stripe
-        stripe.Subscription.modify(
-            subscription[0],
-            items=[{
-                'price': new_plan[0],
-            }]
-        )
-        
-        # Update database
-        cur.execute("""
-            UPDATE subscriptions 
-            SET plan_id = %s 
-            WHERE stripe_subscription_id = %s
-        """, (new_plan_id, subscription[0]))
-        
-        conn.commit()
-        flash('Plan changed successfully!', 'success')
-    except stripe.error.StripeError as e:
-        conn.rollback()
-        app.logger.error(f"Stripe error changing plan: {str(e)}")
-        flash('Error processing plan change with Stripe', 'danger')
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Error changing plan: {str(e)}")
-        flash('Error changing plan', 'danger')
-    finally:
-        cur.close()
-        conn.close()
-    
-    return redirect(url_for('subscription_management'))
-
-@app.route('/cancel-subscription', methods=['POST'])
-@login_required
-def cancel_subscription():
-    """Cancel subscription at period end"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Get current subscription
-        cur.execute("""
-            SELECT stripe_subscription_id 
-            FROM subscriptions 
-            WHERE company_id = %s AND status = 'active'
-        """, (session['company_id'],))
-        subscription = cur.fetchone()
-        
-        if not subscription:
-            flash('No active subscription found', 'danger')
-            return redirect(url_for('subscriptions'))
-        
-        # Cancel in Stripe (end of period)
-        stripe.Subscription.modify(
-            subscription[0],
-            cancel_at_period_end=True
-        )
-        
-        # Update database
-        cur.execute("""
-            UPDATE subscriptions 
-            SET cancel_at_period_end = TRUE 
-            WHERE stripe_subscription_id = %s
-        """, (subscription[0],))
-        
-        conn.commit()
-        flash('Subscription will be canceled at the end of the billing period', 'success')
-    except stripe.error.StripeError as e:
-        conn.rollback()
-        app.logger.error(f"Stripe error canceling subscription: {str(e)}")
-        flash('Error canceling subscription with Stripe', 'danger')
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f"Error canceling subscription: {str(e)}")
-        flash('Error canceling subscription', 'danger')
-    finally:
-        cur.close()
-        conn.close()
-    
-    # FLUXO CORRIGIDO: Volta para página de planos após cancelamento
-    return redirect(url_for('plans'))
-
-# ============== STRIPE WEBHOOKS ==============
-
-@app.route('/stripe/webhook', methods=['POST'])
-def stripe_webhook():
-    payload = request.data
-    sig_header = request.headers.get('Stripe-Signature')
-
-    try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, stripe_webhook_secret
-        )
-
-        # Processar evento de checkout completo
-        if event['type'] == 'checkout.session.completed':
-            session = event['data']['object']
-            handle_checkout_completed(session)
-
-    except ValueError as e:
-        return jsonify({'error': 'Payload inválido'}), 400
-    except stripe.error.SignatureVerificationError as e:
-        return jsonify({'error': 'Assinatura inválida'}), 400
-    except Exception as e:
-        app.logger.error(f"Erro crítico no webhook: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
-
-    return '', 200
-
-
-def handle_checkout_completed(session):
-    """Ativa a assinatura após pagamento bem-sucedido"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        # Obter company_id da sessão
-        company_id = session['metadata']['company_id']
-        
-        # Ativar empresa
-        cur.execute("""
-            UPDATE companies 
-            SET is_active = TRUE 
-            WHERE id = %s
-        """, (company_id,))
-        
-        # Registrar assinatura
-        subscription = stripe.Subscription.retrieve(session['subscription'])
-        cur.execute("""
-            INSERT INTO subscriptions (
-                company_id, stripe_subscription_id, status,
-                current_period_end
-            ) VALUES (%s, %s, %s, %s)
-        """, (
-            company_id,
-            subscription.id,
-            subscription.status,
-            datetime.fromtimestamp(subscription.current_period_end)
-        ))
-        
-        conn.commit()
-    except Exception as e:
-        app.logger.error(f"Erro ao processar webhook: {str(e)}")
-        conn.rollback()
-    finally:
-        conn.close()
-
-# ============== API ROUTES FOR SUBSCRIPTIONS ==============
-@app.route('/payment-failed')
-@login_required
-def payment_failed():
-    """Display payment failed page"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            DELETE FROM payment_events 
-            WHERE company_id = %s AND event_type = 'payment_failed'
-            RETURNING id
-        """, (session['company_id'],))
-        
-        if cur.fetchone():
-            return render_template('payment_failed.html')
-        else:
-            return redirect(url_for('dashboard'))
-    finally:
-        conn.close()
-
-@app.route('/api/subscriptions', methods=['POST'])
-@login_required
-def create_subscription():
-    """Create new Stripe subscription"""
-    data = request.get_json()
-    plan_id = data.get('plan_id')
-    
-    if not plan_id:
-        return jsonify({'error': 'Plan ID is required'}), 400
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Get plan
-        cur.execute("""
-            SELECT stripe_price_id 
-            FROM plans 
-            WHERE id = %s AND is_active = TRUE
-        """, (plan_id,))
-        plan = cur.fetchone()
-        
-        if not plan:
-            return jsonify({'error': 'Invalid plan'}), 404
-        
-        # Get Stripe customer
-        cur.execute("""
-            SELECT stripe_customer_id 
-            FROM companies 
-            WHERE id = %s
-        """, (session['company_id'],))
-        customer = cur.fetchone()
-        
-        if not customer or not customer[0]:
-            return jsonify({'error': 'Stripe customer not found'}), 400
-        
-        customer_id = decrypt_data(customer[0])
-        
-        # Create checkout session
-        session = stripe.checkout.Session.create(
-            customer=customer_id,
-            payment_method_types=['card'],
-            line_items=[{
-                'price': plan[0],
-                'quantity': 1,
-            }],
-            mode='subscription',
-            success_url=url_for('subscription_success', _external=True),
-            cancel_url=url_for('plans', _external=True),
-            metadata={
-                'company_id': session['company_id'],
-                'plan_id': plan_id
-            }
-        )
-        
-        return jsonify({'session_id': session.id})
-        
-    except stripe.error.StripeError as e:
-        app.logger.error(f"Stripe error: {str(e)}")
-        return jsonify({'error': str(e)}), 500
-    except Exception as e:
-        app.logger.error(f"Subscription error: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-@app.route('/api/subscriptions', methods=['GET'])
-@login_required
-def get_subscriptions():
-    """List all company subscriptions"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            SELECT s.id, p.name, s.status, s.current_period_end,
-                   s.stripe_subscription_id, s.renewal_date
-            FROM subscriptions s
-            JOIN plans p ON s.plan_id = p.id
-            WHERE s.company_id = %s
-        """, (session['company_id'],))
-        
-        subscriptions = []
-        for row in cur.fetchall():
-            subscriptions.append({
-                'id': row[0],
-                'plan_name': row[1],
-                'status': row[2],
-                'current_period_end': row[3].isoformat() if row[3] else None,
-                'stripe_subscription_id': row[4],
-                'renewal_date': row[5].isoformat() if row[5] else None
-            })
-        
-        return jsonify(subscriptions)
-    except Exception as e:
-        app.logger.error(f"Error fetching subscriptions: {str(e)}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-@app.route('/api/subscriptions/webhook', methods=['POST'])
-def stripe_webhook_handler():
-    """Stripe webhook handler for subscription events"""
-    payload = request.data
-    sig_header = request.headers.get('Stripe-Signature')
-    event = None
-
-    try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, stripe_webhook_secret
-        )
-    except ValueError as e:
-        return jsonify({'error': 'Invalid payload'}), 400
-    except stripe.error.SignatureVerificationError as e:
-        return jsonify({'error': 'Invalid signature'}), 400
-
-    # Process events
-    if event['type'] == 'checkout.session.completed':
-        handle_checkout_completed(event['data']['object'])
-    elif event['type'] == 'customer.subscription.created':
-        handle_subscription_created(event['data']['object'])
-    elif event['type'] == 'customer.subscription.updated':
-        handle_subscription_updated(event['data']['object'])
-    elif event['type'] == 'customer.subscription.deleted':
-        handle_subscription_deleted(event['data']['object'])
-    elif event['type'] == 'invoice.payment_succeeded':
-        handle_invoice_payment_succeeded(event['data']['object'])
-    elif event['type'] == 'invoice.payment_failed':
-        handle_invoice_payment_failed(event['data']['object'])
-    
-    return jsonify({'success': True}), 200
-
-def handle_checkout_completed(session):
-    """Handle completed checkout session"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        subscription_id = session['subscription']
-        company_id = session['metadata']['company_id']
-        plan_id = session['metadata']['plan_id']
-        
-        # Get subscription details from Stripe
-        subscription = stripe.Subscription.retrieve(subscription_id)
-        
-        # Calculate renewal date
-        renewal_date = datetime.fromtimestamp(subscription['current_period_end'])
-        
-        # Insert subscription into database
-        cur.execute("""
-            INSERT INTO subscriptions (
-                company_id, plan_id, stripe_subscription_id,
-                status, current_period_end, renewal_date
-            ) VALUES (%s, %s, %s, %s, %s, %s)
-        """, (
-            company_id,
-            plan_id,
-            subscription_id,
-            subscription['status'],
-            renewal_date,
-            renewal_date
-        ))
-        
-        # Activate company
-        cur.execute("""
-            UPDATE companies 
-            SET is_active = TRUE 
-            WHERE id = %s
-        """, (company_id,))
-        
-        conn.commit()
-        app.logger.info(f"Subscription activated for company {company_id}")
-    except Exception as e:
-        app.logger.error(f"Error handling checkout completed: {str(e)}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-
-def handle_subscription_created(subscription):
-    """Handle new subscription creation"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        customer_id = subscription['customer']
-        subscription_id = subscription['id']
-        status = subscription['status']
-        renewal_date = datetime.fromtimestamp(subscription['current_period_end'])
-        
-        # Find company by customer ID
-        cur.execute("""
-            SELECT id 
-            FROM companies 
-            WHERE stripe_customer_id = %s
-        """, (encrypt_data(customer_id),))
-        company = cur.fetchone()
-        
-        if company:
-            company_id = company[0]
-            # Plan ID is not available in this event, will update later
-            cur.execute("""
-                INSERT INTO subscriptions (
-                    company_id, stripe_subscription_id,
-                    status, current_period_end, renewal_date
-                ) VALUES (%s, %s, %s, %s, %s)
-            """, (
-                company_id,
-                subscription_id,
-                status,
-                renewal_date,
-                renewal_date
-            ))
-            conn.commit()
-            app.logger.info(f"Subscription created for company {company_id}")
-    except Exception as e:
-        app.logger.error(f"Error handling subscription created: {str(e)}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-
-def handle_subscription_updated(subscription):
-    """Handle subscription updates"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        subscription_id = subscription['id']
-        status = subscription['status']
-        renewal_date = datetime.fromtimestamp(subscription['current_period_end'])
-        cancel_at_period_end = subscription['cancel_at_period_end']
-        
-        # Update subscription in database
-        cur.execute("""
-            UPDATE subscriptions 
-            SET status = %s,
-                current_period_end = %s,
-                renewal_date = %s,
-                cancel_at_period_end = %s
-            WHERE stripe_subscription_id = %s
-        """, (
-            status,
-            renewal_date,
-            renewal_date,
-            cancel_at_period_end,
-            subscription_id
-        ))
-        conn.commit()
-        app.logger.info(f"Subscription updated: {subscription_id}")
-    except Exception as e:
-        app.logger.error(f"Error updating subscription: {str(e)}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-
-def handle_subscription_deleted(subscription):
-    """Handle subscription cancellation"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        subscription_id = subscription['id']
-        
-        # Mark subscription as canceled
-        cur.execute("""
-            UPDATE subscriptions 
-            SET status = 'canceled'
-            WHERE stripe_subscription_id = %s
-        """, (subscription_id,))
-        
-        # Deactivate company
-        cur.execute("""
-            UPDATE companies 
-            SET is_active = FALSE 
-            WHERE id = (
-                SELECT company_id 
-                FROM subscriptions 
-                WHERE stripe_subscription_id = %s
-            )
-        """, (subscription_id,))
-        
-        conn.commit()
-        app.logger.info(f"Subscription canceled: {subscription_id}")
-    except Exception as e:
-        app.logger.error(f"Error canceling subscription: {str(e)}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-
-def handle_invoice_payment_succeeded(invoice):
-    """Handle successful invoice payments"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        customer_id = invoice['customer']
-        amount = invoice['amount_paid'] / 100  # Convert from cents
-        currency = invoice['currency'].upper()
-        invoice_id = invoice['id']
-        invoice_url = invoice['hosted_invoice_url']
-        
-        # Find company by customer ID
-        cur.execute("""
-            SELECT id 
-            FROM companies 
-            WHERE stripe_customer_id = %s
-        """, (encrypt_data(customer_id),))
-        company = cur.fetchone()
-        
-        if company:
-            company_id = company[0]
-            # Record payment in database
-            cur.execute("""
-                INSERT INTO payments (
-                    company_id, amount, currency, invoice_id, invoice_url
-                ) VALUES (%s, %s, %s, %s, %s)
-            """, (company_id, amount, currency, invoice_id, invoice_url))
-            conn.commit()
-            app.logger.info(f"Payment recorded for company {company_id}")
-    except Exception as e:
-        app.logger.error(f"Error handling invoice payment: {str(e)}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-
-def handle_invoice_payment_failed(invoice):
-    """Handle failed invoice payments"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        customer_id = invoice['customer']
-        invoice_url = invoice['hosted_invoice_url']
-        
-        # Find company by customer ID
-        cur.execute("""
-            SELECT id 
-            FROM companies 
-            WHERE stripe_customer_id = %s
-        """, (encrypt_data(customer_id),))
-        company = cur.fetchone()
-        
-        if company:
-            company_id = company[0]
-            # Update subscription status to past_due
-            cur.execute("""
-                UPDATE subscriptions 
-                SET status = 'past_due'
-                WHERE company_id = %s
-            """, (company_id,))
-            
-            # Get admin email
-            cur.execute("""
-                SELECT email, first_name 
-                FROM users 
-                WHERE company_id = %s AND is_admin = TRUE
-                LIMIT 1
-            """, (company_id,))
-            admin = cur.fetchone()
-            
-            if admin:
-                send_payment_failed_email(admin[0], admin[1], invoice_url)
-            
-            conn.commit()
-            app.logger.info(f"Payment failed for company {company_id}")
-    except Exception as e:
-        app.logger.error(f"Error handling payment failure: {str(e)}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-
-# Helper routes
-@app.route('/subscription-success')
-def subscription_success():
-    """Success page after subscription"""
-    return render_template('subscription_success.html')
-
-# Route for company status
-@app.route('/company-status')
-@login_required
-def company_status():
-    """Display company status and resource usage"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        
-        # Get company data
-        cur.execute("""
-            SELECT id, name, email, country, industry, date_registered, is_active
-            FROM companies 
-            WHERE id = %s
-        """, (session['company_id'],))
-        company = cur.fetchone()
-        
-        # Get current subscription
-        cur.execute("""
-            SELECT s.id, p.name, s.status, s.current_period_end, p.features
-            FROM subscriptions s
-            JOIN plans p ON s.plan_id = p.id
-            WHERE s.company_id = %s
-        """, (session['company_id'],))
-        subscription = cur.fetchone()
-        
-        # Calculate resource usage
-        # Projects
-        cur.execute("SELECT COUNT(*) FROM projects WHERE company_id = %s", (session['company_id'],))
-        project_count = cur.fetchone()[0]
-        
-        # Users
-        cur.execute("SELECT COUNT(*) FROM users WHERE company_id = %s", (session['company_id'],))
-        user_count = cur.fetchone()[0]
-        
-        # Storage (example, not implemented)
-        storage_usage = 0
-        
-        # Get plan limits
-        features = {}
-        if subscription and subscription[4]:
-            features = json.loads(subscription[4])
-        
-        max_projects = int(features.get('max_projects', 0))
-        max_users = int(features.get('max_users', 0))
-        max_storage = features.get('max_storage', '0')
-        
-        # Calculate percentages
-        project_percentage = min(100, int((project_count / max_projects) * 100)) if max_projects > 0 else 0
-        user_percentage = min(100, int((user_count / max_users) * 100)) if max_users > 0 else 0
-        storage_percentage = 0  # not implemented
-        
-        usage = {
-            'projects': {'current': project_count, 'max': max_projects, 'percentage': project_percentage},
-            'users': {'current': user_count, 'max': max_users, 'percentage': user_percentage},
-            'storage': {'current': storage_usage, 'max': max_storage, 'percentage': storage_percentage}
-        }
-        
-        return render_template('company_status.html', 
-                             company=company,
-                             subscription=subscription,
-                             usage=usage)
-    except Exception as e:
-        app.logger.error(f"Error loading company status: {str(e)}")
-        flash('Error loading company information', 'danger')
-        return redirect(url_for('dashboard'))
-    finally:
-        conn.close()
-
-# ============== ADMIN PLAN MANAGEMENT VIEW ==============
-
-@app.route('/subscription-management')
-@admin_required
-def subscription_management():
-    """Admin view for managing company subscription"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Get current subscription details
-        cur.execute("""
-            SELECT 
-                s.id, 
-                p.name as plan_name, 
-                s.status, 
-                s.current_period_end,
-                s.renewal_date,
-                s.cancel_at_period_end,
-                s.stripe_subscription_id
-            FROM subscriptions s
-            JOIN plans p ON s.plan_id = p.id
-            WHERE s.company_id = %s
-        """, (session['company_id'],))
-        subscription = cur.fetchone()
-        
-        # Get all available plans
-        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
-        plans = cur.fetchall()
-        
-        # Get payment history
-        cur.execute("""
-            SELECT id, amount, currency, payment_date, invoice_id
-            FROM payments
-            WHERE company_id = %s
-            ORDER BY payment_date DESC
-        """, (session['company_id'],))
-        payments = cur.fetchall()
-        
-        return render_template('subscription_management.html',
-                             subscription=subscription,
-                             plans=plans,
-                             payments=payments)
-    except Exception as e:
-        app.logger.error(f"Error loading subscription management: {str(e)}")
-        flash('Error loading subscription details', 'danger')
-        return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
-        conn.close()
-
-# Database initialization
-def init_db():
-    """Initialize database with required tables"""
-    conn = None
-    try:
-        app.logger.info("Initializing database...")
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Check if companies table exists
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'companies'
-            );
-        """)
-        exists = cur.fetchone()[0]
-        
-        if not exists:
-            app.logger.info("Creating database tables...")
-            
-            # Create tables
-            cur.execute("""
-                CREATE TABLE companies (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    email VARCHAR(255) UNIQUE NOT NULL,
-                    country VARCHAR(100),
-                    industry VARCHAR(100),
-                    date_registered TIMESTAMP NOT NULL,
-                    is_active BOOLEAN DEFAULT FALSE,
-                    stripe_customer_id VARCHAR(255),
-                    plan_id INTEGER,
-                    cnpj VARCHAR(20)
-                );
-                
-                CREATE TABLE users (
-                    id SERIAL PRIMARY KEY,
-                    first_name VARCHAR(100) NOT NULL,
-                    last_name VARCHAR(100),
-                    email VARCHAR(255) NOT NULL,
-                    password VARCHAR(255) NOT NULL,
-                    company_id INTEGER REFERENCES companies(id),
-                    is_admin BOOLEAN DEFAULT FALSE,
-                    email_verified BOOLEAN DEFAULT FALSE,
-                    verification_token VARCHAR(255),
-                    verification_token_expiry TIMESTAMP,
-                    reset_token VARCHAR(255),
-                    reset_token_expiry TIMESTAMP,
-                    last_login TIMESTAMP,
-                    role VARCHAR(20) DEFAULT 'User'
-                );
-                
-                CREATE TABLE plans (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    description TEXT,
-                    features JSONB,
-                    price DECIMAL(10, 2) NOT NULL,
-                    stripe_price_id VARCHAR(255),
-                    is_active BOOLEAN DEFAULT TRUE
-                );
-                
-                CREATE TABLE subscriptions (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER REFERENCES companies(id),
-                    plan_id INTEGER REFERENCES plans(id),
-                    stripe_subscription_id VARCHAR(255) UNIQUE,
-                    status VARCHAR(50),
-                    current_period_start TIMESTAMP,
-                    current_period_end TIMESTAMP,
-                    cancel_at_period_end BOOLEAN DEFAULT FALSE,
-                    last_invoice_id VARCHAR(255),
-                    last_invoice_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP
-                );
-                
-                CREATE TABLE projects (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER NOT NULL REFERENCES companies(id),
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    start_date DATE,
-                    end_date DATE,
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE tasks (
-                    id SERIAL PRIMARY KEY,
-                    project_id INTEGER NOT NULL REFERENCES projects(id),
-                    title TEXT NOT NULL,
-                    description TEXT,
-                    due_date DATE,
-                    assigned_user INTEGER REFERENCES users(id),
-                    status TEXT NOT NULL DEFAULT 'Not Started',
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE income (
-                    id SERIAL PRIMARY KEY,
-                    project_id INTEGER NOT NULL REFERENCES projects(id),
-                    type TEXT NOT NULL,
-                    date DATE NOT NULL,
-                    amount DECIMAL(15, 2) NOT NULL,
-                    currency VARCHAR(3) NOT NULL,
-                    invoice_id TEXT,
-                    invoice_link TEXT,
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE expenses (
-                    id SERIAL PRIMARY KEY,
-                    project_id INTEGER NOT NULL REFERENCES projects(id),
-                    type TEXT NOT NULL,
-                    date DATE NOT NULL,
-                    amount DECIMAL(15, 2) NOT NULL,
-                    currency VARCHAR(3) NOT NULL,
-                    invoice_id TEXT,
-                    invoice_link TEXT,
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE general_expenses (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER REFERENCES companies(id),
-                    type VARCHAR(100) NOT NULL,
-                    date DATE NOT NULL,
-                    amount DECIMAL(15, 2) NOT NULL,
-                    currency VARCHAR(3) NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE payments (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER NOT NULL REFERENCES companies(id),
-                    amount DECIMAL(10,2) NOT NULL,
-                    currency VARCHAR(3) NOT NULL,
-                    invoice_id TEXT NOT NULL UNIQUE,
-                    invoice_url TEXT NOT NULL,
-                    payment_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE plan_changes (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER NOT NULL REFERENCES companies(id),
-                    old_plan_id INTEGER REFERENCES plans(id),
-                    new_plan_id INTEGER NOT NULL REFERENCES plans(id),
-                    change_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    stripe_event_id TEXT
-                );
-                
-                CREATE TABLE payment_events (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER NOT NULL REFERENCES companies(id),
-                    event_type VARCHAR(50) NOT NULL,
-                    event_data JSONB,
-                    status VARCHAR(20) NOT NULL DEFAULT 'pending',
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE audit_log (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER REFERENCES users(id),
-                    company_id INTEGER REFERENCES companies(id),
-                    action TEXT NOT NULL,
-                    entity_type TEXT,
-                    entity_id INTEGER,
-                    ip_address TEXT,
-                    user_agent TEXT,
-                    details JSONB,
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            
-            # Insert default plans (including free plan)
-            cur.execute("""
-                INSERT INTO plans (name, description, features, price, stripe_price_id) 
-                VALUES 
-                    ('Free', 'Initial free plan', 
-                    '{"max_projects": 3, "max_users": 1, "max_storage": "100MB"}', 
-                    0.00, 'price_1Rap7kGK1tkBcsruKBjT5y7c'),
-
-                    ('Basic', 'Basic plan for small teams', 
-                    '{"max_projects": 10, "max_users": 5, "max_storage": "1GB"}', 
-                    99.00, 'price_1Rap86GK1tkBcsruzIHX09Ek'),
-
-                    ('Professional', 'Complete plan for businesses', 
-                    '{"max_projects": "Unlimited", "max_users": 20, "max_storage": "10GB"}', 
-                    199.00, 'price_1RapH6GK1tkBcsruge7gNO4m'),
-
-                    ('Enterprise', 'Custom solution', 
-                    '{"max_projects": "Unlimited", "max_users": "Unlimited", "max_storage": "100GB"}', 
-                    499.00, 'price_1RapHbGK1tkBcsru3vvG2fbZ');
-            """)
-
-            conn.commit()
-            app.logger.info("Database initialized successfully!")
-        else:
-            app.logger.info("Database already exists")
-            
-    except Exception as e:
-        app.logger.error(f"Error initializing database: {str(e)}", exc_info=True)
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-
-# Application entry point
-if __name__ == '__main__':
-    # Initialize database
-    init_db()
-    
-    # Additional configurations
-    app.config['TEMPLATES_AUTO_RELOAD'] = True
-    app.config['SESSION_COOKIE_SECURE'] = os.getenv('FLASK_ENV') == 'production'
-    app.config['SESSION_COOKIE_guardar/14/06 email e testeHTTPONLY'] = True
-    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-    
-    # Run application
-    app.run(
-        host=os.getenv('FLASK_HOST', '0.0.0.0'),
-        port=int(os.getenv('FLASK_PORT', 5000)),
-        debug=os.getenv('FLASK_DEBUG', 'True') == 'True'
-    )
\ No newline at end of file
+# Startup-time report (/api/startup-stats); clients add their own time when first built
+lazy.record('app import', time.perf_counter() - _import_started)
+log.info(f"App module imported in {time.perf_counter() - _import_started:.3f}s")
@@ -0,0 +1,187 @@
+"""Fingerprinted, minified and precompressed static assets.
+
+``python app/assets.py build`` minifies every JS/CSS file under app/static
+(needs rjsmin / rcssmin, else copied as is), names the result after its
+content hash and writes ``.gz`` and ``.br`` (needs brotli) variants next to
+it, all under app/static/dist with a ``manifest.json``:
+
+    {"js/bundle.js": {"path": "js/bundle.3f9a0c2b71de.min.js", "encodings": ["br", "gzip"], ...}}
+
+The app links them through ``asset_url()`` and serves them from /assets with
+the best encoding the client accepts and immutable cache headers: a changed
+file gets a new name, so a cached one never needs revalidating.  A build keeps
+the previous build's files.  Before the first build ``asset_url()`` falls back
+to the plain static URL.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _minify(data, ext):
+    if ext == '.js' and rjsmin is not None:
+        return rjsmin.jsmin(data.decode('utf-8')).encode('utf-8'), True
+    if ext == '.css' and rcssmin is not None:
+        return rcssmin.cssmin(data.decode('utf-8')).encode('utf-8'), True
+    return data, False
+
+
+def _compress(data, encoding):
+    if encoding == 'gzip':
+        # mtime=0 keeps rebuilds byte-identical
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def build(static_dir=STATIC_DIR, out_dir=DIST_DIR):
+    """Build every JS/CSS asset into ``out_dir``; the new manifest"""
+    previous = _read_manifest(out_dir)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != out_dir)
+        for name in sorted(files):
+            stem, ext = os.path.splitext(name)
+            if ext not in ('.js', '.css'):
+                continue
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as fh:
+                raw = fh.read()
+            data, minified = _minify(raw, ext)
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            path = os.path.join(os.path.dirname(logical), f"{stem}.{digest}{'.min' if minified else ''}{ext}")
+            path = path.replace(os.sep, '/')
+            _write(os.path.join(out_dir, path), data)
+
+            entry = {'path': path, 'encodings': [], 'bytes': {'source': len(raw), 'identity': len(data)}}
+            for encoding, suffix in ENCODINGS:
+                compressed = _compress(data, encoding)
+                if compressed is not None and len(compressed) < len(data):
+                    _write(os.path.join(out_dir, path + suffix), compressed)
+                    entry['encodings'].append(encoding)
+                    entry['bytes'][encoding] = len(compressed)
+            manifest[logical] = entry
+
+    _write(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    _prune(out_dir, (manifest, previous))
+    return manifest
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _prune(out_dir, manifests):
+    """Drop outputs of older builds; the previous one stays for pages rendered before the deploy"""
+    keep = {MANIFEST_NAME}
+    for entry in (entry for manifest in manifests for entry in manifest.values()):
+        keep.add(entry['path'])
+        keep.update(entry['path'] + suffix for encoding, suffix in ENCODINGS if encoding in entry['encodings'])
+    for root, _, files in os.walk(out_dir):
+        for name in files:
+            path = os.path.relpath(os.path.join(root, name), out_dir).replace(os.sep, '/')
+            if path not in keep:
+                os.remove(os.path.join(root, name))
+
+
+class AssetManifest:
+    """The built manifest, reloaded when a new build replaces it"""
+
+    def __init__(self, directory=DIST_DIR):
+        self.directory = directory
+        self._mtime = None
+        self._by_source = {}
+        self._by_path = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            mtime = os.stat(os.path.join(self.directory, MANIFEST_NAME)).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            by_source = _read_manifest(self.directory)
+            self._by_source = by_source
+            self._by_path = {entry['path']: entry for entry in by_source.values()}
+            self._mtime = mtime
+
+    def path(self, filename):
+        """Fingerprinted path of static ``filename``, or None when it was not built"""
+        self._load()
+        entry = self._by_source.get(filename)
+        return entry['path'] if entry else None
+
+    def variant(self, path, accept_encoding):
+        """(file to send, Content-Encoding or None) for a fingerprinted ``path``; None if unknown
+
+        ``accept_encoding`` maps an encoding to the client's quality for it.
+        """
+        self._load()
+        entry = self._by_path.get(path)
+        if entry is None:
+            # Kept from the previous build
+            if path != MANIFEST_NAME and os.path.isfile(os.path.join(self.directory, path)):
+                return path, None
+            return None
+        for encoding, suffix in ENCODINGS:
+            if encoding in entry['encodings'] and accept_encoding(encoding) > 0:
+                return path + suffix, encoding
+        return path, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('build',))
+    parser.parse_args()
+
+    if rjsmin is None or rcssmin is None:
+        print("rjsmin/rcssmin not installed: assets are fingerprinted without minification")
+    if brotli is None:
+        print("brotli not installed: only gzip variants are written")
+    manifest = build()
+    for logical, entry in sorted(manifest.items()):
+        sizes = ', '.join(f"{kind} {size / 1024:.1f} KiB" for kind, size in entry['bytes'].items())
+        print(f"{logical} -> {entry['path']} ({sizes})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,678 @@
+"""Registration, e-mail verification, login, password reset and user management."""
+import re
+import secrets
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify
+
+from app import (admin_required, api_admin_email, check_company_limits, encrypt_data, get_db_connection,
+                 is_password_valid, password_hasher, pending_email, rate_limit, send_reset_email,
+                 send_verification_email, session_store, stripe, validate_cnpj)
+
+bp = Blueprint('auth', __name__)
+
+# Registration route
+
+@bp.route('/register', methods=['GET', 'POST'])
+@rate_limit('register', per_ip=(10, 3600), per_email=(3, 3600))
+def register():
+    if request.method == 'POST':
+        try:
+            # Coletar dados do formulário CORRETAMENTE
+            company_name = request.form.get('company_name', '').strip()
+            email = request.form.get('email', '').strip().lower()
+            password = request.form.get('password', '')
+            confirm_password = request.form.get('confirm_password', '')
+            country = request.form.get('country', '').strip()
+            industry = request.form.get('industry', '').strip()
+            full_name = request.form.get('full_name', '').strip()  # Nome completo
+            
+            # VALIDAÇÃO REVISTA
+            if not all([company_name, email, password, confirm_password, country, industry, full_name]):
+                flash('All fields are required', 'danger')
+                return render_template('register.html')
+            
+            if password != confirm_password:
+                flash('Passwords do not match', 'danger')
+                return render_template('register.html')
+            
+            # Validação de força de senha (adicionar esta função se não existir)
+            is_valid, error_msg = is_password_valid(password)
+            if not is_valid:
+                flash(error_msg, 'danger')
+                return render_template('register.html')
+            
+            conn = get_db_connection()
+            cur = conn.cursor()
+            
+            # Verificar email existente
+            cur.execute("SELECT id FROM companies WHERE email = %s", (email,))
+            if cur.fetchone():
+                flash('This email is already registered', 'danger')
+                return render_template('register.html')
+            
+            # Inserir empresa
+            cur.execute(
+                "INSERT INTO companies (name, email, country, industry, date_registered) "
+                "VALUES (%s, %s, %s, %s, %s) RETURNING id",
+                (company_name, email, country, industry, datetime.now())
+            )
+            company_id = cur.fetchone()[0]
+            
+            # Dividir nome completo (primeiro nome e sobrenome)
+            name_parts = full_name.split(' ', 1)
+            first_name = name_parts[0]
+            last_name = name_parts[1] if len(name_parts) > 1 else ''
+            
+            # Criar token de verificação
+            verification_token = secrets.token_urlsafe(32)
+            verification_token_expiry = datetime.now() + timedelta(hours=24)
+            hashed_password = password_hasher.hash(password)
+            
+            # Inserir usuário admin
+            cur.execute(
+                "INSERT INTO users (first_name, last_name, email, password, "
+                "company_id, is_admin, verification_token, verification_token_expiry) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                (first_name, last_name, email, hashed_password, company_id, True, verification_token, verification_token_expiry)
+            )
+            
+            # COMMIT ESSENCIAL
+            conn.commit()
+            
+            # Armazenar dados para possível reenvio
+            session['pending_email'] = email
+            session['pending_token'] = verification_token
+            session['pending_name'] = first_name
+            
+            # Enviar email de verificação
+            if send_verification_email(email, verification_token, first_name):
+                flash('Verification email sent! Please check your inbox.', 'success')
+            else:
+                flash('Failed to send verification email. Please contact support.', 'warning')
+            
+            return redirect(url_for('auth.verify_email_waiting'))
+            
+        except Exception as e:
+            conn.rollback()
+            current_app.logger.error(f"Registration error: {str(e)}")
+            flash(f'Registration error: {str(e)}', 'danger')
+            return render_template('register.html')
+        finally:
+            if 'cur' in locals(): cur.close()
+            if 'conn' in locals(): conn.close()
+    
+    # GET: Mostrar formulário
+    return render_template('register.html')
+
+@bp.route('/verify-email-waiting')
+def verify_email_waiting():
+    """Email verification waiting page"""
+    return render_template('verify_email_waiting.html')
+
+# Rota para reenviar verificação
+@bp.route('/resend-verification', methods=['POST'])
+@rate_limit('resend_verification', per_ip=(5, 600), per_email=(3, 3600),
+            email_getter=pending_email, redirect_endpoint='auth.verify_email_waiting')
+def resend_verification():
+    """Resend verification email"""
+    try:
+        # Tentar usar dados da sessão primeiro
+        email = session.get('pending_email')
+        token = session.get('pending_token')
+        name = session.get('pending_name')
+        
+        # Se não estiver na sessão, verificar no banco de dados
+        if not email or not token:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT email, verification_token, first_name
+                FROM users
+                WHERE email = %s AND email_verified = FALSE
+            """, (session.get('user_email'),))
+            user_data = cur.fetchone()
+            
+            if user_data:
+                email, token, name = user_data
+            else:
+                flash('No pending verification found', 'danger')
+                return redirect(url_for('auth.verify_email_waiting'))
+        
+        # Tentar reenviar
+        if send_verification_email(email, token, name):
+            flash('New verification email sent successfully!', 'success')
+        else:
+            flash('Failed to resend email. Please try again later.', 'danger')
+        
+        return redirect(url_for('auth.verify_email_waiting'))
+    
+    except Exception as e:
+        current_app.logger.error(f"Error resending verification: {str(e)}")
+        flash('Error resending verification email', 'danger')
+        return redirect(url_for('auth.verify_email_waiting'))
+
+# API endpoint for company registration
+@bp.route('/api/register-company', methods=['POST'])
+@rate_limit('api_register_company', per_ip=(10, 3600), per_email=(3, 3600), email_getter=api_admin_email)
+def api_register_company():
+    """Endpoint for company registration via API"""
+    try:
+        current_app.logger.info("Receiving company registration request via API")
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        company_data = data.get('company', {})
+        admin_data = data.get('admin', {})
+        
+        # Validate required data
+        required_company = ['name', 'email', 'country', 'industry', 'cnpj']
+        required_admin = ['name', 'email', 'password']
+        
+        if not all(key in company_data for key in required_company) or \
+           not all(key in admin_data for key in required_admin):
+            return jsonify({'error': 'Missing required fields'}), 400
+        
+        # Validate CNPJ for Brazilian companies
+        if company_data['country'].upper() == 'BR' and not validate_cnpj(company_data['cnpj']):
+            return jsonify({'error': 'Invalid CNPJ'}), 400
+        
+        # Split admin name
+        name_parts = admin_data['name'].split(' ', 1)
+        first_name = name_parts[0]
+        last_name = name_parts[1] if len(name_parts) > 1 else ''
+        
+        # Validate password
+        is_valid, error_msg = is_password_valid(admin_data['password'])
+        if not is_valid:
+            return jsonify({'error': error_msg}), 400
+        
+        # Connect to database
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        # Check if email exists
+        cur.execute("SELECT id FROM companies WHERE email = %s", (company_data['email'],))
+        if cur.fetchone():
+            return jsonify({'error': 'Email already registered'}), 409
+        
+        # Insert company
+        cur.execute(
+            "INSERT INTO companies (name, email, country, industry, date_registered, is_active, cnpj) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id",
+            (
+                company_data['name'], 
+                company_data['email'], 
+                company_data['country'], 
+                company_data['industry'],
+                datetime.now(),
+                False,
+                company_data.get('cnpj', '')
+            )
+        )
+        company_id = cur.fetchone()[0]
+        
+        # Create Stripe customer
+        try:
+            customer = stripe.Customer.create(
+                email=company_data['email'],
+                name=company_data['name'],
+                metadata={
+                    'company_id': company_id,
+                    'country': company_data['country'],
+                    'industry': company_data['industry']
+                }
+            )
+            # Encrypt and store customer ID
+            encrypted_customer_id = encrypt_data(customer.id)
+            cur.execute(
+                "UPDATE companies SET stripe_customer_id = %s WHERE id = %s",
+                (encrypted_customer_id, company_id)
+            )
+            current_app.logger.info(f"Stripe customer created and encrypted: {customer.id}")
+        except stripe.error.StripeError as e:
+            current_app.logger.error(f"Error creating Stripe customer: {str(e)}")
+            # Don't fail registration, just log error
+        
+        # Insert admin user
+        verification_token = secrets.token_urlsafe(32)
+        hashed_password = password_hasher.hash(admin_data['password'])
+        verification_token_expiry = datetime.now() + timedelta(hours=24)
+        
+        cur.execute(
+            "INSERT INTO users (first_name, last_name, email, password, "
+            "company_id, is_admin, email_verified, verification_token, verification_token_expiry) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
+            (
+                first_name, 
+                last_name, 
+                admin_data['email'], 
+                hashed_password, 
+                company_id, 
+                True,
+                False,
+                verification_token,
+                verification_token_expiry
+            )
+        )
+        admin_id = cur.fetchone()[0]
+        
+        conn.commit()
+        
+        # Send verification email
+        send_verification_email(admin_data['email'], verification_token, first_name)
+        
+        return jsonify({
+            'company_id': company_id,
+            'admin_id': admin_id,
+            'stripe_customer_id': customer.id,
+            'verification_token': verification_token
+        }), 201
+        
+    except Exception as e:
+        current_app.logger.error(f"API registration error: {str(e)}", exc_info=True)
+        if 'conn' in locals():
+            conn.rollback()
+        return jsonify({'error': 'Internal server error'}), 500
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            conn.close()
+        
+@bp.route('/verify-email/<token>')
+def verify_email(token):
+    """Route for email verification"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, email, company_id FROM users WHERE verification_token = %s "
+            "AND verification_token_expiry > %s",
+            (token, datetime.now())
+        )
+        user = cur.fetchone()
+        
+        if user:
+            # Update user as verified
+            cur.execute(
+                "UPDATE users SET email_verified = TRUE, "
+                "verification_token = NULL, verification_token_expiry = NULL "
+                "WHERE id = %s", (user[0],)
+            )
+            
+            # Don't activate company yet - wait for plan selection
+            conn.commit()
+            flash('Email verified successfully! You can now log in.', 'success')
+            # FLUXO CORRIGIDO: Redireciona para login após verificação
+            return redirect(url_for('auth.login'))
+        else:
+            flash('Invalid or expired token', 'danger')
+            # FLUXO CORRIGIDO: Redireciona para registro se token inválido
+            return redirect(url_for('auth.register'))
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Email verification error: {str(e)}")
+        flash('Verification error', 'danger')
+        return redirect(url_for('auth.register'))
+    finally:
+        conn.close()
+
+@bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('login', per_ip=(30, 60), per_email=(5, 60))
+def login():
+    """Login route"""
+    if request.method == 'POST':
+        email = request.form['email'].strip().lower()
+        password = request.form['password']
+        
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT u.id, u.password, u.company_id, u.email_verified, u.is_admin, 
+                       c.is_active, c.stripe_customer_id, u.first_name
+                FROM users u
+                JOIN companies c ON u.company_id = c.id
+                WHERE u.email = %s
+            """, (email,))
+            user = cur.fetchone()
+            
+            if user and password_hasher.verify(user[1], password):
+                # Transparently upgrade hashes made with older algorithm/cost settings
+                if password_hasher.needs_rehash(user[1]):
+                    cur.execute("UPDATE users SET password = %s WHERE id = %s",
+                                (password_hasher.hash(password), user[0]))
+                    conn.commit()
+                
+                if not user[3]:  # email_verified
+                    # FLUXO CORRIGIDO: Redireciona para tela de espera se não verificado
+                    return redirect(url_for('auth.verify_email_waiting'))
+                else:
+                    # Set session (context is cached server-side, cookie keeps the id)
+                    sid = session_store.create(user[0])
+                    if sid is None:
+                        # Context could not be resolved; never hand out a cookie without a session
+                        current_app.logger.error(f"Could not create a session for {email}")
+                        flash('Login error', 'danger')
+                        return render_template('login.html')
+                    session.clear()
+                    session['sid'] = sid
+                    session['user_id'] = user[0]
+                    session['company_id'] = user[2]
+                    session['is_admin'] = user[4]
+                    session['user_email'] = email
+                    session['user_name'] = user[7]
+                    
+                    # Verify if company has active plan
+                    if not user[5]:  # is_active
+                        return redirect(url_for('billing.plans'))  # Redirect to plan selection
+                    
+                    # Update last login
+                    cur.execute(
+                        "UPDATE users SET last_login = %s WHERE id = %s",
+                        (datetime.now(), user[0]))
+                    conn.commit()
+                    
+                    current_app.logger.info(f"User {email} logged in successfully")
+                    flash('Login successful!', 'success')
+                    return redirect(url_for('projects.dashboard'))
+            else:
+                current_app.logger.warning(f"Failed login attempt for {email}")
+                flash('Invalid email or password', 'danger')
+        except Exception as e:
+            current_app.logger.error(f"Login error: {str(e)}")
+            flash('Login error', 'danger')
+        finally:
+            conn.close()
+    
+    return render_template('login.html')
+
+@bp.route('/logout')
+def logout():
+    """Logout route"""
+    session_store.revoke(session.get('sid'))
+    session.clear()
+    flash('You have been logged out', 'info')
+    return redirect(url_for('main.home'))
+
+# Password recovery routes
+@bp.route('/forgot-password', methods=['GET', 'POST'])
+@rate_limit('forgot_password', per_ip=(10, 600), per_email=(3, 3600))
+def forgot_password():
+    """Route to request password reset"""
+    if request.method == 'POST':
+        email = request.form['email'].strip().lower()
+        
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT id, first_name FROM users WHERE email = %s AND email_verified = TRUE",
+                (email,)
+            )
+            user = cur.fetchone()
+            
+            if user:
+                reset_token = secrets.token_urlsafe(32)
+                reset_expiry = datetime.now() + timedelta(hours=1)
+                
+                cur.execute(
+                    "UPDATE users SET reset_token = %s, "
+                    "reset_token_expiry = %s WHERE id = %s",
+                    (reset_token, reset_expiry, user[0])
+                )
+                conn.commit()
+                
+                send_reset_email(email, reset_token, user[1])
+                flash('Reset link sent to your email', 'success')
+            else:
+                flash('Email not found or not verified', 'danger')
+        except Exception as e:
+            conn.rollback()
+            current_app.logger.error(f"Error processing password reset: {str(e)}")
+            flash('Error processing request', 'danger')
+        finally:
+            conn.close()
+    
+    return render_template('forgot_password.html')
+
+@bp.route('/reset-password/<token>', methods=['GET', 'POST'])
+def reset_password(token):
+    """Route to reset password"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id FROM users WHERE reset_token = %s "
+            "AND reset_token_expiry > %s",
+            (token, datetime.now())
+        )
+        user = cur.fetchone()
+        
+        if not user:
+            flash('Invalid or expired token', 'danger')
+            return redirect(url_for('auth.forgot_password'))
+        
+        if request.method == 'POST':
+            new_password = request.form['new_password']
+            confirm_password = request.form['confirm_password']
+            
+            # Password validation
+            is_valid, error_msg = is_password_valid(new_password)
+            if not is_valid:
+                flash(error_msg, 'danger')
+                return redirect(url_for('auth.reset_password', token=token))
+            
+            if new_password != confirm_password:
+                flash('Passwords do not match', 'danger')
+                return redirect(url_for('auth.reset_password', token=token))
+            else:
+                hashed_password = password_hasher.hash(new_password)
+                cur.execute(
+                    "UPDATE users SET password = %s, reset_token = NULL, "
+                    "reset_token_expiry = NULL WHERE id = %s",
+                    (hashed_password, user[0])
+                )
+                conn.commit()
+                flash('Password updated successfully', 'success')
+                return redirect(url_for('auth.login'))
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Error resetting password: {str(e)}")
+        flash('Error resetting password', 'danger')
+    finally:
+        conn.close()
+    
+    return render_template('reset_password.html', token=token)
+
+# User management routes
+@bp.route('/users')
+@admin_required
+def user_management():
+    """Company user management"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            SELECT id, first_name, last_name, email, last_login, is_admin
+            FROM users
+            WHERE company_id = %s
+            ORDER BY first_name
+        ''', (session['company_id'],))
+        users = cur.fetchall()
+        
+        # Get user limit from plan
+        cur.execute('''
+            SELECT features->>'max_users' 
+            FROM companies c
+            JOIN plans p ON c.plan_id = p.id
+            WHERE c.id = %s
+        ''', (session['company_id'],))
+        max_users = cur.fetchone()[0]
+        
+        # Calculate user usage
+        current_users = len(users)
+        user_limit = int(max_users) if max_users != 'unlimited' else float('inf')
+        
+        return render_template('users.html', 
+                             users=users, 
+                             current_users=current_users,
+                             max_users=user_limit)
+    except Exception as e:
+        current_app.logger.error(f"Error listing users: {str(e)}")
+        flash('Error loading users', 'danger')
+        return redirect(url_for('projects.dashboard'))
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/add-user', methods=['GET', 'POST'])
+@admin_required
+def add_user():
+    """Add new user to company"""
+    if request.method == 'POST':
+        first_name = request.form['first_name'].strip()
+        last_name = request.form['last_name'].strip()
+        email = request.form['email'].strip().lower()
+        password = request.form['password']
+        confirm_password = request.form['confirm_password']
+        is_admin = 'is_admin' in request.form
+        
+        # Basic validations
+        if not all([first_name, email, password, confirm_password]):
+            flash('All required fields must be filled', 'danger')
+            return redirect(url_for('auth.add_user'))
+        
+        # Validate email
+        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
+            flash('Invalid email', 'danger')
+            return redirect(url_for('auth.add_user'))
+        
+        # Validate password
+        is_valid, error_msg = is_password_valid(password)
+        if not is_valid:
+            flash(error_msg, 'danger')
+            return redirect(url_for('auth.add_user'))
+        
+        if password != confirm_password:
+            flash('Passwords do not match', 'danger')
+            return redirect(url_for('auth.add_user'))
+        
+        # Check user limit
+        allowed, error_msg = check_company_limits(session['company_id'], 'user')
+        if not allowed:
+            flash(error_msg, 'danger')
+            return redirect(url_for('auth.user_management'))
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            # Check if email already in use
+            cur.execute("""
+                SELECT id FROM users 
+                WHERE email = %s AND company_id = %s
+            """, (email, session['company_id']))
+            if cur.fetchone():
+                flash('This email is already registered in this company', 'danger')
+                return redirect(url_for('auth.add_user'))
+            
+            # Hash password
+            hashed_password = password_hasher.hash(password)
+            
+            # Insert new user
+            cur.execute("""
+                INSERT INTO users (
+                    first_name, last_name, email, password, 
+                    company_id, is_admin, email_verified
+                ) VALUES (%s, %s, %s, %s, %s, %s, TRUE)
+            """, (
+                first_name,
+                last_name,
+                email,
+                hashed_password,
+                session['company_id'],
+                is_admin
+            ))
+            
+            conn.commit()
+            flash('User added successfully!', 'success')
+            return redirect(url_for('auth.user_management'))
+            
+        except Exception as e:
+            conn.rollback()
+            current_app.logger.error(f"Error adding user: {str(e)}")
+            flash('Error adding user', 'danger')
+            return redirect(url_for('auth.add_user'))
+        finally:
+            cur.close()
+            conn.close()
+    
+    return render_template('add_user.html')
+
+@bp.route('/users/<int:user_id>/update_role', methods=['POST'])
+@admin_required
+def update_user_role(user_id):
+    """Update user role"""
+    new_role = request.form['role']
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Verify user belongs to company
+        cur.execute('''
+            UPDATE users SET role = %s 
+            WHERE id = %s AND company_id = %s
+        ''', (new_role, user_id, session['company_id']))
+        
+        if cur.rowcount == 0:
+            flash('User not found or access denied', 'danger')
+        else:
+            conn.commit()
+            session_store.revoke_user(user_id)
+            flash('User role updated successfully', 'success')
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Error updating user role: {str(e)}")
+        flash('Error updating role', 'danger')
+    finally:
+        cur.close()
+        conn.close()
+    
+    return redirect(url_for('auth.user_management'))
+
+@bp.route('/users/<int:user_id>/delete', methods=['POST'])
+@admin_required
+def delete_user(user_id):
+    """Delete user from company"""
+    # Prevent admin from deleting themselves
+    if user_id == session['user_id']:
+        flash('You cannot delete yourself', 'danger')
+        return redirect(url_for('auth.user_management'))
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Verify user belongs to company
+        cur.execute('''
+            DELETE FROM users 
+            WHERE id = %s AND company_id = %s
+        ''', (user_id, session['company_id']))
+        
+        if cur.rowcount == 0:
+            flash('User not found or access denied', 'danger')
+        else:
+            conn.commit()
+            session_store.revoke_user(user_id)
+            flash('User deleted successfully', 'success')
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Error deleting user: {str(e)}")
+        flash('Error deleting user', 'danger')
+    finally:
+        cur.close()
+        conn.close()
+    
+    return redirect(url_for('auth.user_management'))
@@ -0,0 +1,985 @@
+"""Plans, checkout, subscriptions and Stripe webhooks."""
+import time
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify, g
+
+import metrics
+import kpi_views
+from response_cache import bump_data_version
+from app import (admin_required, cached_page, decrypt_data, encrypt_data, get_db_connection,
+                 login_required, pln_rate, send_payment_failed_email, session_store, stripe,
+                 stripe_public_key, stripe_webhook_secret)
+
+bp = Blueprint('billing', __name__)
+
+# Public plans route
+@bp.route('/plans-public')
+@cached_page
+def public_plans():
+    """Public plans page for registration"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
+        plans = cur.fetchall()
+        
+        # Debug log
+        current_app.logger.info(f"Plans found: {len(plans)}")
+        
+        return render_template('plans_public.html', plans=plans)
+    except Exception as e:
+        current_app.logger.error(f"Error loading public plans: {str(e)}", exc_info=True)
+        flash('Error loading plans. Please try again later.', 'danger')
+        return redirect(url_for('main.home'))
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/checkout/<int:plan_id>')
+@login_required
+def checkout(plan_id):
+    """Redireciona para o Stripe Checkout com o plano selecionado"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Buscar plano e verificar existência
+        cur.execute("""
+            SELECT id, stripe_price_id 
+            FROM plans 
+            WHERE id = %s AND is_active = TRUE
+        """, (plan_id,))
+        plan = cur.fetchone()
+        
+        if not plan:
+            flash('Plano não encontrado ou inativo', 'danger')
+            return redirect(url_for('billing.public_plans'))
+        
+        stripe_price_id = result[0]
+
+        # Buscar stripe_customer_id da empresa
+        cur.execute("SELECT stripe_customer_id FROM companies WHERE id = %s", (session['company_id'],))
+        company_result = cur.fetchone()
+        if not company_result or not company_result[0]:
+            flash('Empresa sem cliente Stripe', 'danger')
+            return redirect(url_for('projects.dashboard'))
+        
+        # Decriptografar customer ID
+        stripe_customer_id = decrypt_data(company_result[0])
+
+        # Criar sessão do Stripe
+        session_stripe = stripe.checkout.Session.create(
+            customer=stripe_customer_id,
+            payment_method_types=['card'],
+            line_items=[{
+                'price': stripe_price_id,
+                'quantity': 1,
+            }],
+            mode='subscription',
+            success_url=url_for('billing.subscription_success', _external=True),
+            cancel_url=url_for('billing.public_plans', _external=True),
+        )
+
+        return redirect(session_stripe.url, code=303)
+
+    except Exception as e:
+        current_app.logger.error(f"Erro ao criar sessão de checkout: {str(e)}")
+        flash('Erro ao redirecionar para o pagamento.', 'danger')
+        return redirect(url_for('billing.public_plans'))
+    finally:
+        cur.close()
+        conn.close()
+
+# ============== PLANS AND SUBSCRIPTIONS ==============
+
+@bp.route('/plans')
+@login_required
+def plans():
+    """Plan selection page"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Verify if company already has active plan (session context, no query)
+        if g.current_user['company_active']:
+            flash('Your company already has an active plan', 'info')
+            return redirect(url_for('projects.dashboard'))
+        
+        # Fetch available plans
+        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
+        plans = cur.fetchall()
+        return render_template('plans.html', plans=plans, stripe_public_key=stripe_public_key)
+    except Exception as e:
+        current_app.logger.error(f"Error loading plans: {str(e)}")
+        flash('Error loading plans', 'danger')
+        return redirect(url_for('projects.dashboard'))
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/create-checkout-session/<int:plan_id>', methods=['POST'])
+@login_required
+def create_checkout_session(plan_id):
+    """Create checkout session for subscription"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Fetch plan data
+        cur.execute("""
+            SELECT id, name, price, stripe_price_id 
+            FROM plans WHERE id = %s
+        """, (plan_id,))
+        plan = cur.fetchone()
+        
+        if not plan:
+            return jsonify({'error': 'Plan not found'}), 404
+        
+        # Fetch company stripe_customer_id (decrypt)
+        cur.execute("""
+            SELECT stripe_customer_id 
+            FROM companies 
+            WHERE id = %s
+        """, (session['company_id'],))
+        customer = cur.fetchone()
+        
+        customer_id = None
+        if customer and customer[0]:
+            customer_id = decrypt_data(customer[0])
+        
+        if not customer_id:
+            # Create Stripe customer if doesn't exist
+            stripe_customer = stripe.Customer.create(
+                email=g.current_user['company_email'],
+                name=g.current_user['company_name'],
+                metadata={'company_id': session['company_id']}
+            )
+            # Encrypt and store customer ID
+            encrypted_customer_id = encrypt_data(stripe_customer.id)
+            cur.execute("""
+                UPDATE companies 
+                SET stripe_customer_id = %s 
+                WHERE id = %s
+            """, (encrypted_customer_id, session['company_id']))
+            conn.commit()
+            customer_id = stripe_customer.id
+        
+        # Create checkout session
+        checkout_session = stripe.checkout.Session.create(
+            customer=customer_id,
+            payment_method_types=['card'],
+            line_items=[{
+                'price': plan[3],  # stripe_price_id
+                'quantity': 1,
+            }],
+            mode='subscription',
+            success_url=url_for('billing.subscription_success', _external=True) + '?session_id={CHECKOUT_SESSION_ID}',
+            cancel_url=url_for('billing.plans', _external=True),
+            metadata={
+                'company_id': session['company_id'],
+                'plan_id': plan[0]
+            }
+        )
+        
+        return jsonify({'id': checkout_session.id})
+        
+    except Exception as e:
+        current_app.logger.error(f"Error creating checkout session: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/activate_free_plan', methods=['POST'])
+@login_required
+def activate_free_plan():
+    """Activate free plan for company"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Find free plan
+        cur.execute("SELECT id FROM plans WHERE price = 0 AND is_active = TRUE LIMIT 1")
+        free_plan = cur.fetchone()
+        if not free_plan:
+            return jsonify({'error': 'Free plan not found'}), 404
+        
+        # Update company with free plan
+        cur.execute("""
+            UPDATE companies 
+            SET plan_id = %s, is_active = TRUE 
+            WHERE id = %s
+        """, (free_plan[0], session['company_id']))
+        
+        bump_data_version(cur, session['company_id'], 'subscription')
+        conn.commit()
+        session_store.invalidate_company(session['company_id'])
+        return jsonify({'success': True})
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Error activating free plan: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# Route for subscription management
+@bp.route('/subscriptions')
+@admin_required
+def subscriptions():
+    """Subscription management dashboard"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Get current subscription
+        cur.execute("""
+            SELECT s.id, p.name, s.status, s.current_period_end, 
+                   s.stripe_subscription_id, p.price, s.cancel_at_period_end,
+                   s.renewal_date
+            FROM subscriptions s
+            JOIN plans p ON s.plan_id = p.id
+            WHERE s.company_id = %s
+        """, (session['company_id'],))
+        subscription = cur.fetchone()
+        
+        # Get payment history
+        cur.execute("""
+            SELECT id, amount, currency, payment_date, invoice_id
+            FROM payments
+            WHERE company_id = %s
+            ORDER BY payment_date DESC
+        """, (session['company_id'],))
+        payments = cur.fetchall()
+        
+        # Get plan changes history
+        cur.execute("""
+            SELECT pc.change_date, p_old.name, p_new.name, p_new.price
+            FROM plan_changes pc
+            JOIN plans p_new ON pc.new_plan_id = p_new.id
+            LEFT JOIN plans p_old ON pc.old_plan_id = p_old.id
+            WHERE pc.company_id = %s
+            ORDER BY pc.change_date DESC
+        """, (session['company_id'],))
+        changes = cur.fetchall()
+        
+        # Get available plans
+        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
+        plans = cur.fetchall()
+        
+        return render_template('subscriptions.html', 
+                             subscription=subscription,
+                             payments=payments,
+                             changes=changes,
+                             plans=plans)
+    except Exception as e:
+        current_app.logger.error(f"Error loading subscriptions: {str(e)}")
+        flash('Error loading subscription information', 'danger')
+        return redirect(url_for('projects.dashboard'))
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/change-plan', methods=['POST'])
+@login_required
+def change_plan():
+    """Change company plan"""
+    new_plan_id = request.form.get('new_plan_id')
+    if not new_plan_id:
+        flash('Plan not selected', 'danger')
+        return redirect(url_for('billing.subscription_management'))
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Get current plan
+        cur.execute("""
+            SELECT s.stripe_subscription_id 
+            FROM subscriptions s
+            WHERE s.company_id = %s AND s.status = 'active'
+        """, (session['company_id'],))
+        subscription = cur.fetchone()
+        
+        if not subscription:
+            flash('No active subscription found', 'danger')
+            return redirect(url_for('billing.subscription_management'))
+        
+        # Get new plan
+        cur.execute("""
+            SELECT stripe_price_id 
+            FROM plans 
+            WHERE id = %s AND is_active = TRUE
+        """, (new_plan_id,))
+        new_plan = cur.fetchone()
+        
+        if not new_plan:
+            flash('Invalid plan', 'danger')
+            return redirect(url_for('billing.subscription_management'))
+        
+        # Update subscription in Stripe
+        stripe.Subscription.modify(
+            subscription[0],
+            items=[{
+                'price': new_plan[0],
+            }]
+        )
+        
+        # Update database
+        cur.execute("""
+            UPDATE subscriptions 
+            SET plan_id = %s 
+            WHERE stripe_subscription_id = %s
+        """, (new_plan_id, subscription[0]))
+        
+        bump_data_version(cur, session['company_id'], 'subscription')
+        conn.commit()
+        session_store.invalidate_company(session['company_id'])
+        flash('Plan changed successfully!', 'success')
+    except stripe.error.StripeError as e:
+        conn.rollback()
+        current_app.logger.error(f"Stripe error changing plan: {str(e)}")
+        flash('Error processing plan change with Stripe', 'danger')
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Error changing plan: {str(e)}")
+        flash('Error changing plan', 'danger')
+    finally:
+        cur.close()
+        conn.close()
+    
+    return redirect(url_for('billing.subscription_management'))
+
+@bp.route('/cancel-subscription', methods=['POST'])
+@login_required
+def cancel_subscription():
+    """Cancel subscription at period end"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Get current subscription
+        cur.execute("""
+            SELECT stripe_subscription_id 
+            FROM subscriptions 
+            WHERE company_id = %s AND status = 'active'
+        """, (session['company_id'],))
+        subscription = cur.fetchone()
+        
+        if not subscription:
+            flash('No active subscription found', 'danger')
+            return redirect(url_for('billing.subscriptions'))
+        
+        # Cancel in Stripe (end of period)
+        stripe.Subscription.modify(
+            subscription[0],
+            cancel_at_period_end=True
+        )
+        
+        # Update database
+        cur.execute("""
+            UPDATE subscriptions 
+            SET cancel_at_period_end = TRUE 
+            WHERE stripe_subscription_id = %s
+        """, (subscription[0],))
+        
+        bump_data_version(cur, session['company_id'], 'subscription')
+        conn.commit()
+        session_store.invalidate_company(session['company_id'])
+        flash('Subscription will be canceled at the end of the billing period', 'success')
+    except stripe.error.StripeError as e:
+        conn.rollback()
+        current_app.logger.error(f"Stripe error canceling subscription: {str(e)}")
+        flash('Error canceling subscription with Stripe', 'danger')
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Error canceling subscription: {str(e)}")
+        flash('Error canceling subscription', 'danger')
+    finally:
+        cur.close()
+        conn.close()
+    
+    # FLUXO CORRIGIDO: Volta para página de planos após cancelamento
+    return redirect(url_for('billing.plans'))
+
+# ============== STRIPE WEBHOOKS ==============
+
+def record_webhook_metrics(event_type, started, result):
+    """Count the event by type and result (ok, error or ignored) and time its handling"""
+    metrics.inc('webhook_events_total', {'type': event_type, 'result': result})
+    metrics.observe('webhook_processing_seconds', time.perf_counter() - started, {'type': event_type})
+
+@bp.route('/stripe/webhook', methods=['POST'])
+def stripe_webhook():
+    payload = request.data
+    sig_header = request.headers.get('Stripe-Signature')
+
+    try:
+        event = stripe.Webhook.construct_event(
+            payload, sig_header, stripe_webhook_secret
+        )
+
+        # Processar evento de checkout completo
+        started = time.perf_counter()
+        if event['type'] == 'checkout.session.completed':
+            session = event['data']['object']
+            result = 'ok' if handle_checkout_completed(session) else 'error'
+        else:
+            result = 'ignored'
+        record_webhook_metrics(event['type'], started, result)
+
+    except ValueError as e:
+        return jsonify({'error': 'Payload inválido'}), 400
+    except stripe.error.SignatureVerificationError as e:
+        return jsonify({'error': 'Assinatura inválida'}), 400
+    except Exception as e:
+        current_app.logger.error(f"Erro crítico no webhook: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+    return '', 200
+
+# ============== API ROUTES FOR SUBSCRIPTIONS ==============
+@bp.route('/payment-failed')
+@login_required
+def payment_failed():
+    """Display payment failed page"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            DELETE FROM payment_events 
+            WHERE company_id = %s AND event_type = 'payment_failed'
+            RETURNING id
+        """, (session['company_id'],))
+        
+        if cur.fetchone():
+            return render_template('payment_failed.html')
+        else:
+            return redirect(url_for('projects.dashboard'))
+    finally:
+        conn.close()
+
+@bp.route('/api/subscriptions', methods=['POST'])
+@login_required
+def create_subscription():
+    """Create new Stripe subscription"""
+    data = request.get_json()
+    plan_id = data.get('plan_id')
+    
+    if not plan_id:
+        return jsonify({'error': 'Plan ID is required'}), 400
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Get plan
+        cur.execute("""
+            SELECT stripe_price_id 
+            FROM plans 
+            WHERE id = %s AND is_active = TRUE
+        """, (plan_id,))
+        plan = cur.fetchone()
+        
+        if not plan:
+            return jsonify({'error': 'Invalid plan'}), 404
+        
+        # Get Stripe customer
+        cur.execute("""
+            SELECT stripe_customer_id 
+            FROM companies 
+            WHERE id = %s
+        """, (session['company_id'],))
+        customer = cur.fetchone()
+        
+        if not customer or not customer[0]:
+            return jsonify({'error': 'Stripe customer not found'}), 400
+        
+        customer_id = decrypt_data(customer[0])
+        
+        # Create checkout session
+        session = stripe.checkout.Session.create(
+            customer=customer_id,
+            payment_method_types=['card'],
+            line_items=[{
+                'price': plan[0],
+                'quantity': 1,
+            }],
+            mode='subscription',
+            success_url=url_for('billing.subscription_success', _external=True),
+            cancel_url=url_for('billing.plans', _external=True),
+            metadata={
+                'company_id': session['company_id'],
+                'plan_id': plan_id
+            }
+        )
+        
+        return jsonify({'session_id': session.id})
+        
+    except stripe.error.StripeError as e:
+        current_app.logger.error(f"Stripe error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    except Exception as e:
+        current_app.logger.error(f"Subscription error: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/api/subscriptions', methods=['GET'])
+@login_required
+def get_subscriptions():
+    """List all company subscriptions"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT s.id, p.name, s.status, s.current_period_end,
+                   s.stripe_subscription_id, s.renewal_date
+            FROM subscriptions s
+            JOIN plans p ON s.plan_id = p.id
+            WHERE s.company_id = %s
+        """, (session['company_id'],))
+        
+        subscriptions = []
+        for row in cur.fetchall():
+            subscriptions.append({
+                'id': row[0],
+                'plan_name': row[1],
+                'status': row[2],
+                'current_period_end': row[3].isoformat() if row[3] else None,
+                'stripe_subscription_id': row[4],
+                'renewal_date': row[5].isoformat() if row[5] else None
+            })
+        
+        return jsonify(subscriptions)
+    except Exception as e:
+        current_app.logger.error(f"Error fetching subscriptions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/api/subscriptions/webhook', methods=['POST'])
+def stripe_webhook_handler():
+    """Stripe webhook handler for subscription events"""
+    payload = request.data
+    sig_header = request.headers.get('Stripe-Signature')
+    event = None
+
+    try:
+        event = stripe.Webhook.construct_event(
+            payload, sig_header, stripe_webhook_secret
+        )
+    except ValueError as e:
+        return jsonify({'error': 'Invalid payload'}), 400
+    except stripe.error.SignatureVerificationError as e:
+        return jsonify({'error': 'Invalid signature'}), 400
+
+    # Process events
+    started = time.perf_counter()
+    handler = WEBHOOK_HANDLERS.get(event['type'])
+    if handler is None:
+        result = 'ignored'
+    else:
+        result = 'ok' if handler(event['data']['object']) else 'error'
+    record_webhook_metrics(event['type'], started, result)
+    
+    return jsonify({'success': True}), 200
+
+def handle_checkout_completed(session):
+    """Handle completed checkout session"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        subscription_id = session['subscription']
+        company_id = session['metadata']['company_id']
+        plan_id = session['metadata']['plan_id']
+        
+        # Get subscription details from Stripe
+        subscription = stripe.Subscription.retrieve(subscription_id)
+        
+        # Calculate renewal date
+        renewal_date = datetime.fromtimestamp(subscription['current_period_end'])
+        
+        # Insert subscription into database
+        cur.execute("""
+            INSERT INTO subscriptions (
+                company_id, plan_id, stripe_subscription_id,
+                status, current_period_end, renewal_date
+            ) VALUES (%s, %s, %s, %s, %s, %s)
+        """, (
+            company_id,
+            plan_id,
+            subscription_id,
+            subscription['status'],
+            renewal_date,
+            renewal_date
+        ))
+        
+        # Activate company
+        cur.execute("""
+            UPDATE companies 
+            SET is_active = TRUE 
+            WHERE id = %s
+        """, (company_id,))
+        
+        bump_data_version(cur, company_id, 'subscription')
+        conn.commit()
+        session_store.invalidate_company(company_id)
+        current_app.logger.info(f"Subscription activated for company {company_id}")
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error handling checkout completed: {str(e)}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def handle_subscription_created(subscription):
+    """Handle new subscription creation"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        customer_id = subscription['customer']
+        subscription_id = subscription['id']
+        status = subscription['status']
+        renewal_date = datetime.fromtimestamp(subscription['current_period_end'])
+        
+        # Find company by customer ID
+        cur.execute("""
+            SELECT id 
+            FROM companies 
+            WHERE stripe_customer_id = %s
+        """, (encrypt_data(customer_id),))
+        company = cur.fetchone()
+        
+        if company:
+            company_id = company[0]
+            # Plan ID is not available in this event, will update later
+            cur.execute("""
+                INSERT INTO subscriptions (
+                    company_id, stripe_subscription_id,
+                    status, current_period_end, renewal_date
+                ) VALUES (%s, %s, %s, %s, %s)
+            """, (
+                company_id,
+                subscription_id,
+                status,
+                renewal_date,
+                renewal_date
+            ))
+            bump_data_version(cur, company_id, 'subscription')
+            conn.commit()
+            session_store.invalidate_company(company_id)
+            current_app.logger.info(f"Subscription created for company {company_id}")
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error handling subscription created: {str(e)}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def handle_subscription_updated(subscription):
+    """Handle subscription updates"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        subscription_id = subscription['id']
+        status = subscription['status']
+        renewal_date = datetime.fromtimestamp(subscription['current_period_end'])
+        cancel_at_period_end = subscription['cancel_at_period_end']
+        
+        # Update subscription in database
+        cur.execute("""
+            UPDATE subscriptions 
+            SET status = %s,
+                current_period_end = %s,
+                renewal_date = %s,
+                cancel_at_period_end = %s
+            WHERE stripe_subscription_id = %s
+            RETURNING company_id
+        """, (
+            status,
+            renewal_date,
+            renewal_date,
+            cancel_at_period_end,
+            subscription_id
+        ))
+        updated = cur.fetchone()
+        if updated:
+            bump_data_version(cur, updated[0], 'subscription')
+        conn.commit()
+        if updated:
+            session_store.invalidate_company(updated[0])
+        current_app.logger.info(f"Subscription updated: {subscription_id}")
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error updating subscription: {str(e)}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def handle_subscription_deleted(subscription):
+    """Handle subscription cancellation"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        subscription_id = subscription['id']
+        
+        # Mark subscription as canceled
+        cur.execute("""
+            UPDATE subscriptions 
+            SET status = 'canceled'
+            WHERE stripe_subscription_id = %s
+            RETURNING company_id
+        """, (subscription_id,))
+        canceled = cur.fetchone()
+        
+        # Deactivate company
+        cur.execute("""
+            UPDATE companies 
+            SET is_active = FALSE 
+            WHERE id = (
+                SELECT company_id 
+                FROM subscriptions 
+                WHERE stripe_subscription_id = %s
+            )
+        """, (subscription_id,))
+        
+        if canceled:
+            bump_data_version(cur, canceled[0], 'subscription')
+        conn.commit()
+        if canceled:
+            session_store.invalidate_company(canceled[0])
+        current_app.logger.info(f"Subscription canceled: {subscription_id}")
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error canceling subscription: {str(e)}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def handle_invoice_payment_succeeded(invoice):
+    """Handle successful invoice payments"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        customer_id = invoice['customer']
+        amount = invoice['amount_paid'] / 100  # Convert from cents
+        currency = invoice['currency'].upper()
+        invoice_id = invoice['id']
+        invoice_url = invoice['hosted_invoice_url']
+        
+        # Find company by customer ID
+        cur.execute("""
+            SELECT id 
+            FROM companies 
+            WHERE stripe_customer_id = %s
+        """, (encrypt_data(customer_id),))
+        company = cur.fetchone()
+        
+        if company:
+            company_id = company[0]
+            # Record payment in database
+            cur.execute("""
+                INSERT INTO payments (
+                    company_id, amount, currency, invoice_id, invoice_url
+                ) VALUES (%s, %s, %s, %s, %s)
+            """, (company_id, amount, currency, invoice_id, invoice_url))
+            conn.commit()
+            current_app.logger.info(f"Payment recorded for company {company_id}")
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error handling invoice payment: {str(e)}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def handle_invoice_payment_failed(invoice):
+    """Handle failed invoice payments"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        customer_id = invoice['customer']
+        invoice_url = invoice['hosted_invoice_url']
+        
+        # Find company by customer ID
+        cur.execute("""
+            SELECT id 
+            FROM companies 
+            WHERE stripe_customer_id = %s
+        """, (encrypt_data(customer_id),))
+        company = cur.fetchone()
+        
+        if company:
+            company_id = company[0]
+            # Update subscription status to past_due
+            cur.execute("""
+                UPDATE subscriptions 
+                SET status = 'past_due'
+                WHERE company_id = %s
+            """, (company_id,))
+            
+            # Get admin email
+            cur.execute("""
+                SELECT email, first_name 
+                FROM users 
+                WHERE company_id = %s AND is_admin = TRUE
+                LIMIT 1
+            """, (company_id,))
+            admin = cur.fetchone()
+            
+            if admin:
+                send_payment_failed_email(admin[0], admin[1], invoice_url)
+            
+            bump_data_version(cur, company_id, 'subscription')
+            conn.commit()
+            session_store.invalidate_company(company_id)
+            current_app.logger.info(f"Payment failed for company {company_id}")
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error handling payment failure: {str(e)}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+# Stripe event type -> handler; each returns True once the event is applied
+WEBHOOK_HANDLERS = {
+    'checkout.session.completed': handle_checkout_completed,
+    'customer.subscription.created': handle_subscription_created,
+    'customer.subscription.updated': handle_subscription_updated,
+    'customer.subscription.deleted': handle_subscription_deleted,
+    'invoice.payment_succeeded': handle_invoice_payment_succeeded,
+    'invoice.payment_failed': handle_invoice_payment_failed,
+}
+
+# Helper routes
+@bp.route('/subscription-success')
+def subscription_success():
+    """Success page after subscription"""
+    return render_template('subscription_success.html')
+
+# Route for company status
+@bp.route('/company-status')
+@login_required
+def company_status():
+    """Display company status and resource usage"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        
+        # Get company data
+        cur.execute("""
+            SELECT id, name, email, country, industry, date_registered, is_active
+            FROM companies 
+            WHERE id = %s
+        """, (session['company_id'],))
+        row = cur.fetchone()
+        # The template reads fields by name
+        company = dict(zip(('id', 'name', 'email', 'country', 'industry', 'date_registered', 'is_active'),
+                           row)) if row else None
+        
+        # Current subscription and plan from the session context
+        ctx = g.current_user
+        subscription = None
+        if ctx['subscription_status']:
+            subscription = {'plan_name': ctx['plan_name'], 'status': ctx['subscription_status'],
+                            'current_period_end': ctx['current_period_end']}
+        
+        # Calculate resource usage (materialized KPIs, live view when stale)
+        kpis = kpi_views.fetch_company_kpis(cur, session['company_id'], pln_rate) or {}
+        project_count = kpis.get('project_count', 0)
+        user_count = kpis.get('user_count', 0)
+        
+        # Storage (example, not implemented)
+        storage_usage = 0
+        
+        # Get plan limits
+        features = ctx['plan_features'] if subscription else {}
+        
+        max_projects = int(features.get('max_projects', 0))
+        max_users = int(features.get('max_users', 0))
+        max_storage = features.get('max_storage', '0')
+        
+        # Calculate percentages
+        project_percentage = min(100, int((project_count / max_projects) * 100)) if max_projects > 0 else 0
+        user_percentage = min(100, int((user_count / max_users) * 100)) if max_users > 0 else 0
+        storage_percentage = 0  # not implemented
+        
+        usage = {
+            'projects': {'current': project_count, 'max': max_projects, 'percentage': project_percentage},
+            'users': {'current': user_count, 'max': max_users, 'percentage': user_percentage},
+            'storage': {'current': storage_usage, 'max': max_storage, 'percentage': storage_percentage}
+        }
+        
+        return render_template('company_status.html', 
+                             company=company,
+                             subscription=subscription,
+                             usage=usage)
+    except Exception as e:
+        current_app.logger.error(f"Error loading company status: {str(e)}")
+        flash('Error loading company information', 'danger')
+        return redirect(url_for('projects.dashboard'))
+    finally:
+        conn.close()
+
+# ============== ADMIN PLAN MANAGEMENT VIEW ==============
+
+@bp.route('/subscription-management')
+@admin_required
+def subscription_management():
+    """Admin view for managing company subscription"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Get current subscription details
+        cur.execute("""
+            SELECT 
+                s.id, 
+                p.name as plan_name, 
+                s.status, 
+                s.current_period_end,
+                s.renewal_date,
+                s.cancel_at_period_end,
+                s.stripe_subscription_id
+            FROM subscriptions s
+            JOIN plans p ON s.plan_id = p.id
+            WHERE s.company_id = %s
+        """, (session['company_id'],))
+        subscription = cur.fetchone()
+        
+        # Get all available plans
+        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
+        plans = cur.fetchall()
+        
+        # Get payment history
+        cur.execute("""
+            SELECT id, amount, currency, payment_date, invoice_id
+            FROM payments
+            WHERE company_id = %s
+            ORDER BY payment_date DESC
+        """, (session['company_id'],))
+        payments = cur.fetchall()
+        
+        return render_template('subscription_management.html',
+                             subscription=subscription,
+                             plans=plans,
+                             payments=payments)
+    except Exception as e:
+        current_app.logger.error(f"Error loading subscription management: {str(e)}")
+        flash('Error loading subscription details', 'danger')
+        return redirect(url_for('projects.dashboard'))
+    finally:
+        cur.close()
+        conn.close()
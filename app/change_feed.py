@@ -0,0 +1,203 @@
+"""Per-tenant change notifications for open dashboards (Server-Sent Events).
+
+Writers publish with ``response_cache.bump_data_version``, which NOTIFYs
+``CHANGES_CHANNEL`` when their transaction commits; ``kpi_views.refresh``
+publishes a ``kpis`` message once the materialized views include them.  One
+thread per process LISTENs on a dedicated connection and fans messages out to
+the process's subscribers, so an idle dashboard costs a blocked thread and
+nothing on the database.
+
+Subscribers get three kinds of event:
+
+* ``change`` - the tenant's data changed (``topic``: projects, ledger, tasks,
+  subscription, import; ``project_id`` when known).  KPI figures are read from
+  the materialized views, which do not have it yet.
+* ``kpis`` - a refresh now includes every change announced so far, refetch.
+* ``resync`` - notifications may have been missed (listener reconnected,
+  subscriber fell behind), refetch.
+
+A change is paired with its refresh by transaction id: the refresh reports
+the ``xmax`` of the snapshot it waited for, and includes every transaction
+below it.
+"""
+import json
+import os
+import select
+import threading
+import time
+from collections import deque
+
+from psycopg2 import sql
+
+import metrics
+from response_cache import CHANGES_CHANNEL
+
+# Events buffered per subscriber before it is told to resync instead
+SUBSCRIBER_BUFFER = 64
+RECONNECT_MAX_DELAY = 30
+
+
+def format_event(event, data, event_id=None):
+    """One ``text/event-stream`` message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscriber:
+    """Events for one open stream, filled by the listener thread"""
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self._events = deque()
+        self._overflowed = False
+        self._ready = threading.Condition()
+
+    def put(self, event, data, event_id=None):
+        with self._ready:
+            if len(self._events) >= SUBSCRIBER_BUFFER:
+                self._overflowed = True
+            else:
+                self._events.append((event, data, event_id))
+            self._ready.notify()
+
+    def get(self, timeout):
+        """Pending (event, data, id) tuples, or [] after ``timeout`` seconds without any"""
+        with self._ready:
+            if not self._events and not self._overflowed:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            if self._overflowed:
+                self._overflowed = False
+                events = [('resync', {'reason': 'overflow'}, None)]
+            return events
+
+
+class ChangeFeed:
+    """Single LISTEN connection per process, fanned out to per-company subscribers"""
+
+    def __init__(self, connection_factory, max_clients=100, channel=CHANGES_CHANNEL, log=None):
+        self.connection_factory = connection_factory
+        self.max_clients = max_clients
+        self.channel = channel
+        self.log = log
+        self.pid = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        # company_id -> (highest txid announced but not yet in a KPI refresh, version)
+        self._pending = {}
+
+    def ensure_started(self):
+        # Once per process, from app.init_worker(): threads do not survive a fork
+        if self.pid == os.getpid():
+            return
+        with self._start_lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                with self._lock:
+                    self._subscribers = {}
+                    self._pending = {}
+                threading.Thread(target=self._run, name='change-feed', daemon=True).start()
+
+    def subscribe(self, company_id):
+        """New Subscriber for ``company_id``, or None when the process is at max_clients"""
+        with self._lock:
+            if sum(len(s) for s in self._subscribers.values()) >= self.max_clients:
+                return None
+            subscriber = Subscriber(company_id)
+            self._subscribers.setdefault(company_id, set()).add(subscriber)
+        metrics.gauge_add('sse_clients', value=1)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.company_id)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.company_id]
+        metrics.gauge_add('sse_clients', value=-1)
+
+    def _publish(self, company_id, event, data, event_id=None):
+        with self._lock:
+            subscribers = list(self._subscribers.get(company_id, ()))
+        for subscriber in subscribers:
+            subscriber.put(event, data, event_id)
+        if subscribers:
+            metrics.inc('sse_events_total', {'event': event}, len(subscribers))
+
+    def dispatch(self, payload):
+        """Handle one NOTIFY payload"""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            if self.log:
+                self.log.warning(f"Ignoring malformed {self.channel} payload: {payload[:200]}")
+            return
+
+        if message.get('topic') == 'kpis':
+            xmax = message.get('xmax') or 0
+            with self._lock:
+                covered = [(company_id, version) for company_id, (txid, version) in self._pending.items()
+                           if txid < xmax]
+                for company_id, _ in covered:
+                    del self._pending[company_id]
+            for company_id, version in covered:
+                self._publish(company_id, 'kpis', {}, version)
+            return
+
+        company_id, version = message.get('company_id'), message.get('version')
+        if company_id is None:
+            return
+        with self._lock:
+            txid, _ = self._pending.get(company_id, (0, None))
+            self._pending[company_id] = (max(txid, message.get('txid') or 0), version)
+        self._publish(company_id, 'change',
+                      {'topic': message.get('topic'), 'project_id': message.get('project_id')}, version)
+
+    def _resync_all(self, reason):
+        with self._lock:
+            self._pending = {}
+            companies = list(self._subscribers)
+        for company_id in companies:
+            self._publish(company_id, 'resync', {'reason': reason})
+
+    def _run(self):
+        delay = 1
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = self.connection_factory()
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                cur.close()
+                if connected_before:
+                    # Anything published while we were away is lost
+                    self._resync_all('reconnected')
+                connected_before = True
+                delay = 1
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.dispatch(conn.notifies.pop(0).payload)
+            except Exception as e:
+                if self.log:
+                    self.log.error(f"Change feed listener failed, reconnecting in {delay}s: {str(e)}")
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
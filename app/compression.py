@@ -0,0 +1,104 @@
+"""Negotiated gzip / brotli compression of dynamic responses.
+
+``init_app`` registers an ``after_request`` hook that compresses 200
+responses whose mimetype is in COMPRESSIBLE_TYPES, using the best encoding
+the client accepts (brotli needs the brotli package).  Buffered bodies are
+compressed only from ``min_size`` bytes and only when that makes them
+smaller.  Streamed bodies are compressed as they are produced and never
+buffered whole.  Event streams (which must not wait for a compressor block),
+responses that are already encoded (built assets) and responses marked
+``no-transform`` are left alone.
+
+The ETag becomes weak: it names the content, not the bytes on the wire, and
+``If-None-Match`` uses weak comparison anyway.
+"""
+import gzip
+import zlib
+
+from flask import request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset((
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml',
+))
+
+
+def _encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _compress(data, encoding, level):
+    if encoding == 'br':
+        # Qualities above 5 cost far more CPU than they save per request (assets.py uses 11 at build time)
+        return brotli.compress(data, quality=min(level, 5))
+    return gzip.compress(data, compresslevel=level)
+
+
+def _compress_stream(chunks, encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=min(level, 5))
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress, finish = compressor.compress, compressor.flush
+    size_in = size_out = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            # The compressor emits a block whenever its window fills; memory stays bounded
+            data = compress(chunk)
+            size_in, size_out = size_in + len(chunk), size_out + len(data)
+            if data:
+                yield data
+        data = finish()
+        yield data
+        if size_in > size_out + len(data):
+            metrics.inc('http_compression_bytes_saved_total', {'encoding': encoding}, size_in - size_out - len(data))
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def init_app(app, min_size=1024, level=6):
+    """Register the compression hook on ``app``"""
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or response.mimetype not in COMPRESSIBLE_TYPES
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(_encodings())
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            compressed = _compress(data, encoding, level)
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+            metrics.inc('http_compression_bytes_saved_total', {'encoding': encoding}, len(data) - len(compressed))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        metrics.inc('http_compressed_responses_total', {'encoding': encoding})
+        return response
@@ -0,0 +1,346 @@
+"""Income, expenses, general expenses and the unified transaction views."""
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify
+
+from response_cache import bump_data_version
+from app import cached_json, convert_to_pln, get_db_connection, login_required
+
+bp = Blueprint('finance', __name__)
+
+# Income and expense routes
+@bp.route('/project/<int:project_id>/add_income', methods=['GET', 'POST'])
+@login_required
+def add_income(project_id):
+    """Add income to a project"""
+    if request.method == 'POST':
+        type_ = request.form['type'].strip()
+        date = request.form['date']
+        amount = request.form['amount']
+        currency = request.form['currency']
+        invoice_link = request.form.get('invoice_link', '').strip()
+        description = request.form.get('description', '').strip()
+        
+        # Basic validations
+        if not type_ or not date or not amount or not currency:
+            flash('All required fields must be filled', 'danger')
+            return redirect(url_for('finance.add_income', project_id=project_id))
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            # Verify project belongs to company
+            cur.execute('SELECT id FROM projects WHERE id = %s AND company_id = %s', 
+                       (project_id, session['company_id']))
+            if not cur.fetchone():
+                flash('Project not found or access denied', 'danger')
+                return redirect(url_for('projects.projects'))
+            
+            # Generate invoice ID
+            today = date.replace("-", "")
+            cur.execute(
+                'SELECT COUNT(*) FROM income WHERE date = %s AND project_id = %s',
+                (date, project_id)
+            )
+            invoice_count = cur.fetchone()[0] + 1
+            invoice_id = f"{today}_{project_id}_{invoice_count}"
+
+            # Insert income
+            cur.execute('''
+                INSERT INTO income 
+                (project_id, type, date, amount, currency, invoice_id, invoice_link, description)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ''', (project_id, type_, date, amount, currency, invoice_id, invoice_link, description))
+            bump_data_version(cur, session['company_id'], 'ledger', project_id)
+            conn.commit()
+            
+            flash('Income added successfully!', 'success')
+            return redirect(url_for('projects.project', project_id=project_id))
+        except Exception as e:
+            conn.rollback()
+            current_app.logger.error(f"Error adding income: {str(e)}")
+            flash('Error adding income', 'danger')
+            return redirect(url_for('finance.add_income', project_id=project_id))
+        finally:
+            cur.close()
+            conn.close()
+    
+    return render_template('add_income.html', project_id=project_id)
+
+@bp.route('/project/<int:project_id>/add_expense', methods=['GET', 'POST'])
+@login_required
+def add_expense(project_id):
+    """Add expense to a project"""
+    if request.method == 'POST':
+        type_ = request.form['type'].strip()
+        date = request.form['date']
+        amount = request.form['amount']
+        currency = request.form['currency']
+        invoice_link = request.form.get('invoice_link', '').strip()
+        description = request.form.get('description', '').strip()
+        
+        # Basic validations
+        if not type_ or not date or not amount or not currency:
+            flash('All required fields must be filled', 'danger')
+            return redirect(url_for('finance.add_expense', project_id=project_id))
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            # Verify project belongs to company
+            cur.execute('SELECT id FROM projects WHERE id = %s AND company_id = %s', 
+                       (project_id, session['company_id']))
+            if not cur.fetchone():
+                flash('Project not found or access denied', 'danger')
+                return redirect(url_for('projects.projects'))
+            
+            # Generate invoice ID
+            today = date.replace("-", "")
+            cur.execute(
+                'SELECT COUNT(*) FROM expenses WHERE date = %s AND project_id = %s',
+                (date, project_id)
+            )
+            invoice_count = cur.fetchone()[0] + 1
+            invoice_id = f"{today}_{project_id}_{invoice_count}"
+
+            # Insert expense
+            cur.execute('''
+                INSERT INTO expenses 
+                (project_id, type, date, amount, currency, invoice_id, invoice_link, description)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ''', (project_id, type_, date, amount, currency, invoice_id, invoice_link, description))
+            bump_data_version(cur, session['company_id'], 'ledger', project_id)
+            conn.commit()
+            
+            flash('Expense added successfully!', 'success')
+            return redirect(url_for('projects.project', project_id=project_id))
+        except Exception as e:
+            conn.rollback()
+            current_app.logger.error(f"Error adding expense: {str(e)}")
+            flash('Error adding expense', 'danger')
+            return redirect(url_for('finance.add_expense', project_id=project_id))
+        finally:
+            cur.close()
+            conn.close()
+    
+    return render_template('add_expense.html', project_id=project_id)
+
+# General expenses routes
+@bp.route('/general_expenses')
+@login_required
+def general_expenses():
+    """List expenses not linked to projects"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            SELECT * FROM general_expenses 
+            WHERE company_id = %s
+            ORDER BY date DESC
+        ''', (session['company_id'],))
+        expenses = cur.fetchall()
+        
+        total_expenses = sum(convert_to_pln(expense[4], expense[5]) for expense in expenses)
+        
+        return render_template('general_expenses.html', 
+                             expenses=expenses,
+                             total_expenses=total_expenses)
+    except Exception as e:
+        current_app.logger.error(f"Error loading general expenses: {str(e)}")
+        flash('Error loading expenses', 'danger')
+        return redirect(url_for('projects.dashboard'))
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/add_general_expense', methods=['GET', 'POST'])
+@login_required
+def add_general_expense():
+    """Add general expense"""
+    if request.method == 'POST':
+        type_ = request.form['type'].strip()
+        date = request.form['date']
+        amount = request.form['amount']
+        currency = request.form['currency']
+        description = request.form.get('description', '').strip()
+        
+        if not type_ or not date or not amount or not currency:
+            flash('All required fields must be filled', 'danger')
+            return redirect(url_for('finance.add_general_expense'))
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                INSERT INTO general_expenses 
+                (company_id, type, date, amount, currency, description)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            ''', (session['company_id'], type_, date, amount, currency, description))
+            bump_data_version(cur, session['company_id'], 'ledger')
+            conn.commit()
+            
+            flash('General expense added successfully!', 'success')
+            return redirect(url_for('finance.general_expenses'))
+        except Exception as e:
+            conn.rollback()
+            current_app.logger.error(f"Error adding general expense: {str(e)}")
+            flash('Error adding expense', 'danger')
+            return redirect(url_for('finance.add_general_expense'))
+        finally:
+            cur.close()
+            conn.close()
+    
+    return render_template('add_general_expense.html')
+
+# Unified view routes
+@bp.route('/unified')
+@login_required
+def unified_view():
+    """Unified view of all transactions"""
+    return render_template('unified_view.html')
+
+@bp.route('/api/unified-transactions')
+@login_required
+@cached_json
+def unified_transactions():
+    """API for unified transactions"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        transactions = []
+        
+        # Income
+        cur.execute('''
+            SELECT i.id, p.name as project, i.type, i.date, 
+                   i.amount, i.currency, 'income' as transaction_type,
+                   i.description, i.invoice_link
+            FROM income i
+            JOIN projects p ON i.project_id = p.id
+            WHERE p.company_id = %s
+            ORDER BY i.date DESC
+        ''', (session['company_id'],))
+        for row in cur.fetchall():
+            transactions.append({
+                'id': row[0],
+                'project': row[1],
+                'type': row[2],
+                'date': row[3],
+                'amount': convert_to_pln(row[4], row[5]),
+                'original_amount': row[4],
+                'original_currency': row[5],
+                'transaction_type': row[6],
+                'description': row[7],
+                'invoice_link': row[8]
+            })
+        
+        # Project expenses
+        cur.execute('''
+            SELECT e.id, p.name as project, e.type, e.date, 
+                   e.amount, e.currency, 'expense' as transaction_type,
+                   e.description, e.invoice_link
+            FROM expenses e
+            JOIN projects p ON e.project_id = p.id
+            WHERE p.company_id = %s
+            ORDER BY e.date DESC
+        ''', (session['company_id'],))
+        for row in cur.fetchall():
+            transactions.append({
+                'id': row[0],
+                'project': row[1],
+                'type': row[2],
+                'date': row[3],
+                'amount': convert_to_pln(row[4], row[5]),
+                'original_amount': row[4],
+                'original_currency': row[5],
+                'transaction_type': row[6],
+                'description': row[7],
+                'invoice_link': row[8]
+            })
+        
+        # General expenses
+        cur.execute('''
+            SELECT id, 'General Expense' as project, type, date, 
+                   amount, currency, 'general_expense' as transaction_type,
+                   description, '' as invoice_link
+            FROM general_expenses
+            WHERE company_id = %s
+            ORDER BY date DESC
+        ''', (session['company_id'],))
+        for row in cur.fetchall():
+            transactions.append({
+                'id': row[0],
+                'project': row[1],
+                'type': row[2],
+                'date': row[3],
+                'amount': convert_to_pln(row[4], row[5]),
+                'original_amount': row[4],
+                'original_currency': row[5],
+                'transaction_type': row[6],
+                'description': row[7],
+                'invoice_link': row[8]
+            })
+        
+        # Sort by date (newest first)
+        transactions.sort(key=lambda x: x['date'], reverse=True)
+        
+        return jsonify(transactions)
+    except Exception as e:
+        current_app.logger.error(f"Error fetching unified transactions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# Invoices routes
+@bp.route('/invoices')
+@login_required
+def invoices():
+    """Invoice list"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Income invoices
+        cur.execute('''
+            SELECT i.id, i.invoice_id, i.date, i.amount, i.currency,
+                   i.invoice_link, p.name as project_name, 'income' as type
+            FROM income i
+            JOIN projects p ON i.project_id = p.id
+            WHERE p.company_id = %s
+            ORDER BY i.date DESC
+        ''', (session['company_id'],))
+        income_invoices = cur.fetchall()
+        
+        # Expense invoices
+        cur.execute('''
+            SELECT e.id, e.invoice_id, e.date, e.amount, e.currency,
+                   e.invoice_link, p.name as project_name, 'expense' as type
+            FROM expenses e
+            JOIN projects p ON e.project_id = p.id
+            WHERE p.company_id = %s
+            ORDER BY e.date DESC
+        ''', (session['company_id'],))
+        expense_invoices = cur.fetchall()
+        
+        # Combine and sort
+        all_invoices = []
+        for inv in income_invoices + expense_invoices:
+            all_invoices.append({
+                'id': inv[0],
+                'invoice_id': inv[1],
+                'date': inv[2],
+                'amount': convert_to_pln(inv[3], inv[4]),
+                'original_amount': inv[3],
+                'original_currency': inv[4],
+                'invoice_link': inv[5],
+                'project_name': inv[6],
+                'type': inv[7]
+            })
+        
+        all_invoices.sort(key=lambda x: x['date'], reverse=True)
+        
+        return render_template('invoices.html', invoices=all_invoices)
+    except Exception as e:
+        current_app.logger.error(f"Error loading invoices: {str(e)}")
+        flash('Error loading invoices', 'danger')
+        return redirect(url_for('projects.dashboard'))
+    finally:
+        cur.close()
+        conn.close()
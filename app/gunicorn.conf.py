@@ -0,0 +1,86 @@
+"""Production gunicorn profile, read automatically when started from app/: ``gunicorn wsgi:app``
+
+Workers are cooperative (gevent) by default: a request waiting on Stripe,
+Gemini, SMTP, the FX API or PostgreSQL (made cooperative by psycogreen)
+yields to the others instead of holding a whole process, and open
+/api/events streams cost a greenlet each.  GUNICORN_WORKER_CLASS=sync
+switches to one request per process; event streams then need as many
+workers as open dashboards, and a request running past ``timeout`` is
+killed with its worker.
+
+The app is imported once in the master and shared copy-on-write by the
+workers.  Everything that does not survive a fork (threads, listening
+connections) is set up per worker by ``post_fork``.  Workers are recycled
+after a jittered number of requests so slow leaks and fragmentation stay
+bounded.  Per-route request deadlines are set in the app (timeouts.py).
+"""
+import os
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+cooperative = worker_class in ('gevent', 'gunicorn.workers.ggevent.GeventWorker')
+
+if cooperative:
+    # Before the app is preloaded, so every module it imports sees cooperative
+    # sockets, locks and sleeps; the worker re-applies the same patches after fork
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+    try:
+        # The Gemini SDK talks gRPC, which blocks the hub unless told about gevent
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    except ImportError:
+        pass
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', (os.cpu_count() or 1) if cooperative else 2 * (os.cpu_count() or 1) + 1))
+# Concurrent requests per gevent worker; each may hold a database connection
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+preload_app = True
+
+# gevent workers heartbeat independently of requests, so this only catches a
+# hub blocked by CPU work; a sync worker must outlive the slowest route deadline
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30 if cooperative else 150))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Behind a reverse proxy that reuses upstream connections; set TRUSTED_PROXY_HOPS
+# so the app sees client addresses rather than the proxy's
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def on_starting(server):
+    # Worker files of a previous run would be counted again (see metrics.py)
+    import metrics
+    metrics.clear_metrics_dir()
+
+
+def when_ready(server):
+    if cooperative:
+        # Let the greenlets the preloaded app started (log listeners) run once
+        # before workers are forked; a half-started one breaks the child's hub
+        import gevent
+        gevent.sleep(0)
+
+
+def post_fork(server, worker):
+    from app import init_worker
+    init_worker()
+
+
+def worker_exit(server, worker):
+    # Final counts, so nothing since the last periodic flush is lost
+    import metrics
+    metrics.flush()
+
+
+def child_exit(server, worker):
+    # Recycled workers would otherwise leave one file each behind, and a reused
+    # pid would overwrite an old one and send its counters backwards
+    import metrics
+    metrics.retire(worker.pid)
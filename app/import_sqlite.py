@@ -0,0 +1,264 @@
+"""Bulk import of a legacy SQLite projects.db into a PostgreSQL tenant.
+
+The single-tenant SQLite schema (see init_db.py) is streamed table by table
+in primary-key order and loaded with ``COPY ... FROM STDIN`` in batches.
+Every row is assigned to the target company: projects get fresh ids (taken
+from the sequence up front, so children can be remapped inside the same
+batch stream), and income, expenses and tasks follow their project through
+the id map.  General expenses carry the company directly.
+
+Each batch commits together with its checkpoint row in
+``legacy_import_checkpoints``, so an interrupted import resumes after the
+last committed batch without duplicating rows; the project id map lives in
+``legacy_import_ids`` for the same reason.
+
+Legacy ``users`` rows have no e-mail or password and cannot become logins,
+and ``invoices``/``exchange_rates`` are derived data; they are not imported.
+
+    python app/import_sqlite.py projects.db --company-id 42 [--batch-size 5000]
+"""
+import argparse
+import io
+import os
+import sqlite3
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from migrate import connect_from_env
+from response_cache import bump_data_version
+
+# Legacy task statuses -> the ones the app counts
+TASK_STATUS = {'To Do': 'Not Started', 'Done': 'Completed'}
+
+
+def _amount(value):
+    try:
+        return str(Decimal(str(value)).quantize(Decimal('0.01')))
+    except (InvalidOperation, TypeError):
+        return None
+
+
+def _date(value):
+    value = (value or '').strip()
+    return value[:10] or None
+
+
+def _text(value):
+    return value or None
+
+
+def _project_row(row, company_id, ids):
+    return (ids[row['id']], company_id, row['name'], _text(row['description']),
+            _date(row['start_date']), _date(row['end_date']))
+
+
+def _ledger_row(row, company_id, ids):
+    project_id = ids.get(row['project_id'])
+    amount = _amount(row['amount'])
+    if project_id is None or amount is None or not _date(row['date']):
+        return None
+    return (project_id, row['type'] or 'Other', _date(row['date']), amount, (row['currency'] or 'PLN').upper()[:3],
+            _text(row['invoice_id']), _text(row['invoice_link']))
+
+
+def _general_expense_row(row, company_id, ids):
+    amount = _amount(row['amount'])
+    if amount is None or not _date(row['date']):
+        return None
+    return (company_id, (row['type'] or 'Other')[:100], _date(row['date']), amount,
+            (row['currency'] or 'PLN').upper()[:3])
+
+
+def _task_row(row, company_id, ids):
+    project_id = ids.get(row['project_id'])
+    if project_id is None:
+        return None
+    status = row['status'] or 'Not Started'
+    return (project_id, row['title'], _text(row['description']), _date(row['due_date']),
+            _text(row['assigned_user']), TASK_STATUS.get(status, status))
+
+
+# (source table, target table, target columns, row converter) in dependency order
+TABLES = [
+    ('projects', 'projects', ('id', 'company_id', 'name', 'description', 'start_date', 'end_date'), _project_row),
+    ('income', 'income', ('project_id', 'type', 'date', 'amount', 'currency', 'invoice_id', 'invoice_link'),
+     _ledger_row),
+    ('expenses', 'expenses', ('project_id', 'type', 'date', 'amount', 'currency', 'invoice_id', 'invoice_link'),
+     _ledger_row),
+    ('general_expenses', 'general_expenses', ('company_id', 'type', 'date', 'amount', 'currency'),
+     _general_expense_row),
+    ('tasks', 'tasks', ('project_id', 'title', 'description', 'due_date', 'assigned_user', 'status'), _task_row),
+]
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(cur, table, columns, rows):
+    """Load ``rows`` into ``table`` with one COPY in text format"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _ensure_tables(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS legacy_import_checkpoints (
+                source TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                last_id BIGINT NOT NULL,
+                copied BIGINT NOT NULL DEFAULT 0,
+                skipped BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (source, table_name)
+            );
+            CREATE TABLE IF NOT EXISTS legacy_import_ids (
+                source TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                old_id BIGINT NOT NULL,
+                new_id BIGINT NOT NULL,
+                PRIMARY KEY (source, table_name, old_id)
+            );
+        """)
+    conn.commit()
+
+
+def _checkpoint(cur, source, table):
+    cur.execute(
+        "SELECT last_id, copied, skipped FROM legacy_import_checkpoints WHERE source = %s AND table_name = %s",
+        (source, table)
+    )
+    return cur.fetchone() or (0, 0, 0)
+
+
+def _save_checkpoint(cur, source, table, last_id, copied, skipped):
+    cur.execute("""
+        INSERT INTO legacy_import_checkpoints (source, table_name, last_id, copied, skipped)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (source, table_name) DO UPDATE SET
+            last_id = EXCLUDED.last_id, copied = EXCLUDED.copied,
+            skipped = EXCLUDED.skipped, updated_at = CURRENT_TIMESTAMP
+    """, (source, table, last_id, copied, skipped))
+
+
+def _project_ids(cur, source):
+    cur.execute("SELECT old_id, new_id FROM legacy_import_ids WHERE source = %s AND table_name = 'projects'",
+                (source,))
+    return dict(cur.fetchall())
+
+
+def _allocate_project_ids(cur, source, batch, ids):
+    old_ids = [row['id'] for row in batch]
+    cur.execute("SELECT nextval(pg_get_serial_sequence('projects', 'id')) FROM generate_series(1, %s)",
+                (len(old_ids),))
+    new_ids = [row[0] for row in cur.fetchall()]
+    copy_rows(cur, 'legacy_import_ids', ('source', 'table_name', 'old_id', 'new_id'),
+              [(source, 'projects', old, new) for old, new in zip(old_ids, new_ids)])
+    ids.update(zip(old_ids, new_ids))
+
+
+def import_table(sqlite_conn, conn, source, company_id, spec, ids, batch_size, out=sys.stdout):
+    """Stream one table; returns (copied, skipped, seconds) for this run"""
+    source_table, target_table, columns, convert = spec
+    exists = sqlite_conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (source_table,)
+    ).fetchone()
+    if not exists:
+        return 0, 0, 0.0
+
+    with conn.cursor() as cur:
+        last_id, copied_total, skipped_total = _checkpoint(cur, source, target_table)
+    copied = skipped = 0
+    start = time.perf_counter()
+    while True:
+        batch = sqlite_conn.execute(
+            f"SELECT * FROM {source_table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+        ).fetchall()
+        if not batch:
+            break
+        try:
+            with conn.cursor() as cur:
+                if target_table == 'projects':
+                    _allocate_project_ids(cur, source, batch, ids)
+                rows = [converted for converted in (convert(row, company_id, ids) for row in batch)
+                        if converted is not None]
+                copy_rows(cur, target_table, columns, rows)
+                last_id = batch[-1]['id']
+                copied += len(rows)
+                skipped += len(batch) - len(rows)
+                _save_checkpoint(cur, source, target_table, last_id,
+                                 copied_total + copied, skipped_total + skipped)
+                bump_data_version(cur, company_id, 'import')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            if target_table == 'projects':
+                for row in batch:
+                    ids.pop(row['id'], None)
+            raise
+        elapsed = time.perf_counter() - start
+        print(f"  {target_table}: {copied_total + copied} rows (through id {last_id}), "
+              f"{copied / elapsed if elapsed else 0:,.0f} rows/s", file=out)
+    return copied, skipped, time.perf_counter() - start
+
+
+def import_database(sqlite_path, conn, company_id, batch_size=5000, source=None, out=sys.stdout):
+    """Import every supported table of ``sqlite_path``; returns {table: (copied, skipped, seconds)}"""
+    source = source or os.path.realpath(sqlite_path)
+    _ensure_tables(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM companies WHERE id = %s", (company_id,))
+        if not cur.fetchone():
+            raise ValueError(f"Company {company_id} does not exist")
+        ids = _project_ids(cur, source)
+    conn.commit()
+
+    sqlite_conn = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True)
+    sqlite_conn.row_factory = sqlite3.Row
+    try:
+        results = {}
+        for spec in TABLES:
+            results[spec[1]] = import_table(sqlite_conn, conn, source, company_id, spec, ids, batch_size, out)
+        return results
+    finally:
+        sqlite_conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import a legacy SQLite projects.db into a PostgreSQL tenant')
+    parser.add_argument('sqlite_path')
+    parser.add_argument('--company-id', type=int, required=True, help='tenant that receives the data')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per COPY and checkpoint')
+    parser.add_argument('--source', help='checkpoint key (default: the resolved file path)')
+    args = parser.parse_args(argv)
+
+    conn = connect_from_env()
+    try:
+        start = time.perf_counter()
+        results = import_database(args.sqlite_path, conn, args.company_id, args.batch_size, args.source)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    total = sum(copied for copied, _, _ in results.values())
+    print(f"\n{'table':<18} {'copied':>8} {'skipped':>8} {'rows/s':>10}")
+    for table, (copied, skipped, seconds) in results.items():
+        print(f"{table:<18} {copied:>8} {skipped:>8} {copied / seconds if seconds else 0:>10,.0f}")
+    print(f"{'total':<18} {total:>8} {'':>8} {total / elapsed if elapsed else 0:>10,.0f}  ({elapsed:.2f}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
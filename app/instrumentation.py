@@ -0,0 +1,233 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+from psycopg2.extensions import connection as _pg_connection, cursor as _pg_cursor
+
+# Latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_current = ContextVar('request_stats', default=None)
+
+# Callables run after every statement: observer(cursor, query, params, duration, rows);
+# ``query`` may be a psycopg2.sql.Composable (render it with query.as_string(cursor))
+query_observers = []
+
+
+class RequestStats:
+    """Counters for one request; created by the middleware, filled by the hooks below"""
+
+    __slots__ = ('started', 'db_time', 'db_queries', 'db_rows', 'db_connections',
+                 'fx_lookups', 'outbound')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.db_rows = 0
+        self.db_connections = 0
+        self.fx_lookups = 0
+        self.outbound = {}
+
+    def add_outbound(self, service, duration):
+        count, total = self.outbound.get(service, (0, 0.0))
+        self.outbound[service] = (count + 1, total + duration)
+
+
+def current_stats():
+    """Stats of the request being served, or None outside a request"""
+    return _current.get()
+
+
+class InstrumentedCursor(_pg_cursor):
+    """psycopg2 cursor that times every statement and feeds the request stats"""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._observe(query, vars, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._observe(query, None, time.perf_counter() - start)
+
+    def _observe(self, query, params, duration):
+        rows = self.rowcount if self.description is not None and self.rowcount > 0 else 0
+        stats = _current.get()
+        if stats is not None:
+            stats.db_time += duration
+            stats.db_queries += 1
+            stats.db_rows += rows
+        for observer in query_observers:
+            observer(self, query, params, duration, rows)
+
+
+# Callables run when an instrumented connection is closed
+connection_close_hooks = []
+
+
+class InstrumentedConnection(_pg_connection):
+    """psycopg2 connection that reports when it is closed (open-connection gauges)"""
+
+    def close(self):
+        if not self.closed:
+            for hook in connection_close_hooks:
+                hook(self)
+        return super().close()
+
+
+def record_db_connect(duration):
+    stats = _current.get()
+    if stats is not None:
+        stats.db_time += duration
+        stats.db_connections += 1
+
+
+def record_fx_lookup():
+    stats = _current.get()
+    if stats is not None:
+        stats.fx_lookups += 1
+
+
+@contextmanager
+def track_outbound(service):
+    """Time an outbound call (stripe, gemini, smtp, fx) for the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.add_outbound(service, time.perf_counter() - start)
+
+
+def instrument_stripe(stripe_module):
+    """Route the Stripe SDK through an HTTP client that reports to track_outbound"""
+    base = stripe_module.http_client.RequestsClient
+
+    class TimedStripeClient(base):
+        def request(self, method, url, headers, post_data=None):
+            with track_outbound('stripe'):
+                return super().request(method, url, headers, post_data)
+
+    stripe_module.default_http_client = TimedStripeClient()
+
+
+class RouteStats:
+    """Aggregated per-route latency histogram and resource totals"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, status, stats, wall):
+        wall_ms = wall * 1000
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {
+                    'count': 0, 'errors': 0, 'wall_ms_sum': 0.0, 'wall_ms_max': 0.0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                    'db_ms_sum': 0.0, 'db_queries': 0, 'db_rows': 0,
+                    'fx_lookups': 0, 'outbound': {},
+                }
+            entry['count'] += 1
+            if status >= 500:
+                entry['errors'] += 1
+            entry['wall_ms_sum'] += wall_ms
+            entry['wall_ms_max'] = max(entry['wall_ms_max'], wall_ms)
+            entry['buckets'][bisect_left(LATENCY_BUCKETS_MS, wall_ms)] += 1
+            entry['db_ms_sum'] += stats.db_time * 1000
+            entry['db_queries'] += stats.db_queries
+            entry['db_rows'] += stats.db_rows
+            entry['fx_lookups'] += stats.fx_lookups
+            for service, (count, total) in stats.outbound.items():
+                calls, ms = entry['outbound'].get(service, (0, 0.0))
+                entry['outbound'][service] = (calls + count, ms + total * 1000)
+
+    def snapshot(self):
+        """JSON-friendly copy with averages and cumulative histogram buckets"""
+        with self._lock:
+            routes = {route: dict(entry, buckets=list(entry['buckets']), outbound=dict(entry['outbound']))
+                      for route, entry in self._routes.items()}
+        result = {}
+        for route, entry in sorted(routes.items()):
+            count = entry['count'] or 1
+            cumulative, histogram = 0, {}
+            for bound, value in zip(LATENCY_BUCKETS_MS + ('+Inf',), entry['buckets']):
+                cumulative += value
+                histogram[str(bound)] = cumulative
+            result[route] = {
+                'count': entry['count'],
+                'errors': entry['errors'],
+                'avg_ms': round(entry['wall_ms_sum'] / count, 2),
+                'max_ms': round(entry['wall_ms_max'], 2),
+                'histogram_ms': histogram,
+                'avg_db_ms': round(entry['db_ms_sum'] / count, 2),
+                'avg_queries': round(entry['db_queries'] / count, 2),
+                'avg_rows': round(entry['db_rows'] / count, 2),
+                'avg_fx_lookups': round(entry['fx_lookups'] / count, 2),
+                'outbound': {service: {'calls': calls, 'avg_ms': round(ms / calls, 2) if calls else 0}
+                             for service, (calls, ms) in entry['outbound'].items()},
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_stats = RouteStats()
+
+# Callables run once per finished request: listener(route, status, stats, wall_seconds)
+request_listeners = []
+
+
+def _server_timing(stats, wall):
+    parts = [f'total;dur={wall * 1000:.1f}',
+             f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_queries} queries, {stats.db_rows} rows"']
+    if stats.fx_lookups:
+        parts.append(f'fx;desc="{stats.fx_lookups} lookups"')
+    for service, (count, total) in stats.outbound.items():
+        parts.append(f'{service};dur={total * 1000:.1f};desc="{count} calls"')
+    return ', '.join(parts)
+
+
+def init_app(app, expose_timing=None):
+    """Register the per-request instrumentation hooks on ``app``
+
+    The Server-Timing header is added only when ``expose_timing()`` is true
+    for the request: it reveals query counts and upstream latencies.
+    """
+
+    @app.before_request
+    def _start_request_stats():
+        g._request_stats_token = _current.set(RequestStats())
+
+    @app.after_request
+    def _finish_request_stats(response):
+        stats = _current.get()
+        if stats is None:
+            return response
+        wall = time.perf_counter() - stats.started
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        route_stats.record(route, response.status_code, stats, wall)
+        for listener in request_listeners:
+            listener(route, response.status_code, stats, wall)
+        if expose_timing is not None and expose_timing():
+            response.headers['Server-Timing'] = _server_timing(stats, wall)
+        return response
+
+    @app.teardown_request
+    def _clear_request_stats(exc=None):
+        token = g.pop('_request_stats_token', None)
+        if token is not None:
+            _current.reset(token)
@@ -0,0 +1,254 @@
+"""Materialized per-project / per-company KPIs and their staleness-aware readers.
+
+``project_kpis``, ``company_kpis`` and ``ledger_monthly`` (migrations/0003)
+are snapshots of the ``*_live`` views of the same shape.  Statement triggers
+on the source tables set ``kpi_refresh_state.dirty_since`` on the first write
+after a refresh; ``refresh()`` waits until writes have settled for
+KPI_REFRESH_DEBOUNCE_SECONDS and then refreshes every view CONCURRENTLY, so
+readers are never blocked.  Readers use the materialized view unless writes
+have been pending for more than KPI_MAX_STALENESS_SECONDS (refresher down or
+behind), in which case they read the live view instead.  Each refresh is
+announced on the change feed (see change_feed.py).
+
+Amounts are stored per currency and converted with ``rate(currency)`` (PLN
+per unit) when read.
+
+    python app/kpi_views.py refresh [--force]
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+
+from psycopg2 import sql
+
+from project_summary import summary_row_to_dict
+from response_cache import CHANGES_CHANNEL
+
+VIEWS = ('project_kpis', 'ledger_monthly', 'company_kpis')
+
+# Arbitrary, fixed key for pg_try_advisory_lock (one refresher at a time)
+ADVISORY_LOCK_ID = 4_512_042
+
+MAX_STALENESS = float(os.getenv('KPI_MAX_STALENESS_SECONDS', 120))
+REFRESH_DEBOUNCE = float(os.getenv('KPI_REFRESH_DEBOUNCE_SECONDS', 5))
+# Longest wait for transactions that may have written before the refresh started
+SETTLE_TIMEOUT = 30
+
+
+def _pln(by_currency, rate):
+    return sum(float(amount) * rate(currency) for currency, amount in (by_currency or {}).items())
+
+
+def source(cur, view):
+    """Relation to read ``view`` from: the snapshot, or ``<view>_live`` when it is too stale"""
+    cur.execute("""
+        SELECT refreshed_at IS NOT NULL
+               AND (dirty_since IS NULL OR dirty_since > NOW() - make_interval(secs => %s))
+        FROM kpi_refresh_state WHERE id = 1
+    """, (MAX_STALENESS,))
+    row = cur.fetchone()
+    fresh = bool(row and row[0])
+    return sql.Identifier(view if fresh else f"{view}_live")
+
+
+def fetch_project_kpis(cur, company_id, rate):
+    """Per-project summary dicts in PLN (project_summary.summary_row_to_dict shape)"""
+    cur.execute(sql.SQL("""
+        SELECT project_id, name, description, start_date, end_date,
+               income_by_currency, expenses_by_currency, total_tasks, completed_tasks
+        FROM {} WHERE company_id = %s
+        ORDER BY project_id
+    """).format(source(cur, 'project_kpis')), (company_id,))
+    current_date = datetime.now().date()
+    projects = []
+    for row in cur.fetchall():
+        income, expenses = _pln(row[5], rate), _pln(row[6], rate)
+        projects.append(summary_row_to_dict(row[:5] + (income, expenses, income - expenses) + row[7:],
+                                            current_date))
+    return projects
+
+
+def fetch_company_kpis(cur, company_id, rate):
+    """Company totals in PLN; ``expenses`` covers project and general expenses"""
+    cur.execute(sql.SQL("""
+        SELECT project_count, user_count, total_tasks, completed_tasks,
+               income_by_currency, expenses_by_currency, general_by_currency
+        FROM {} WHERE company_id = %s
+    """).format(source(cur, 'company_kpis')), (company_id,))
+    row = cur.fetchone()
+    if row is None:
+        # Registered after the last refresh
+        cur.execute("""
+            SELECT project_count, user_count, total_tasks, completed_tasks,
+                   income_by_currency, expenses_by_currency, general_by_currency
+            FROM company_kpis_live WHERE company_id = %s
+        """, (company_id,))
+        row = cur.fetchone()
+    if row is None:
+        return None
+    income = _pln(row[4], rate)
+    project_expenses, general_expenses = _pln(row[5], rate), _pln(row[6], rate)
+    return {
+        'project_count': row[0],
+        'user_count': row[1],
+        'total_tasks': row[2],
+        'completed_tasks': row[3],
+        'completion': int(row[3] / row[2] * 100) if row[2] else 0,
+        'income': round(income, 2),
+        'project_expenses': round(project_expenses, 2),
+        'general_expenses': round(general_expenses, 2),
+        'expenses': round(project_expenses + general_expenses, 2),
+        'profit': round(income - project_expenses - general_expenses, 2)
+    }
+
+
+def fetch_monthly_ledger(cur, company_id):
+    """(incomes, project_expenses, general_expenses) month rows for reports.aggregate_report"""
+    relation = source(cur, 'ledger_monthly')
+    ledgers = []
+    for kind in ('income', 'expense'):
+        cur.execute(sql.SQL("""
+            SELECT l.month, l.amount, l.currency, p.name
+            FROM {} l
+            JOIN projects p ON p.id = l.project_id
+            WHERE l.company_id = %s AND l.kind = %s
+            ORDER BY l.month, l.project_id, l.currency
+        """).format(relation), (company_id, kind))
+        ledgers.append(cur.fetchall())
+    cur.execute(sql.SQL("""
+        SELECT month, amount, currency
+        FROM {} WHERE company_id = %s AND kind = 'general'
+        ORDER BY month, currency
+    """).format(relation), (company_id,))
+    ledgers.append(cur.fetchall())
+    return tuple(ledgers)
+
+
+def refresh(conn, force=False, log=None):
+    """Refresh every view CONCURRENTLY if writes have settled (or ``force``); True if refreshed"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return False
+        try:
+            cur.execute("""
+                UPDATE kpi_refresh_state SET dirty_since = NULL
+                WHERE id = 1 AND (%s OR dirty_since < NOW() - make_interval(secs => %s))
+                RETURNING txid_snapshot_xmax(txid_current_snapshot())
+            """, (force, REFRESH_DEBOUNCE))
+            row = cur.fetchone()
+            conn.commit()
+            if row is None:
+                return False
+
+            # Writers that saw dirty_since already set before it was cleared may
+            # still be open; let them commit so the refresh includes their rows
+            deadline = time.monotonic() + SETTLE_TIMEOUT
+            while time.monotonic() < deadline:
+                cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) >= %s", (row[0],))
+                settled = cur.fetchone()[0]
+                conn.commit()
+                if settled:
+                    break
+                time.sleep(0.2)
+
+            started = time.monotonic()
+            for view in VIEWS:
+                cur.execute(sql.SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY {}").format(sql.Identifier(view)))
+                conn.commit()
+            cur.execute("UPDATE kpi_refresh_state SET refreshed_at = NOW() WHERE id = 1")
+            # Tells change_feed listeners that transactions below xmax are now visible
+            cur.execute("SELECT pg_notify(%s, json_build_object('topic', 'kpis', 'xmax', %s)::text)",
+                        (CHANGES_CHANNEL, row[0]))
+            conn.commit()
+            if log:
+                log.info(f"Refreshed KPI views in {time.monotonic() - started:.2f}s")
+            return True
+        finally:
+            conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
+            conn.commit()
+    finally:
+        cur.close()
+
+
+class Refresher:
+    """Background thread calling ``refresh()`` every ``interval`` seconds
+
+    Housekeeping added with ``every()`` (expired sessions, idle rate-limit
+    buckets) runs on the same thread at its own, longer period.
+    """
+
+    def __init__(self, connection_factory, interval, log=None):
+        self.connection_factory = connection_factory
+        self.interval = interval
+        self.log = log
+        self.pid = None
+        self._start_lock = threading.Lock()
+        self._jobs = []
+
+    def every(self, seconds, job):
+        """Also call ``job()`` about every ``seconds`` (0 disables it)"""
+        if seconds > 0:
+            # First run one period after start, so a fleet of fresh workers does not stampede
+            self._jobs.append([seconds, job, time.monotonic() + seconds])
+
+    def ensure_started(self):
+        # Once per process, from app.init_worker(): threads do not survive a fork
+        if self.interval <= 0 or self.pid == os.getpid():
+            return
+        with self._start_lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, name='kpi-refresher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                conn = self.connection_factory()
+                try:
+                    refresh(conn, log=self.log)
+                finally:
+                    conn.close()
+            except Exception as e:
+                if self.log:
+                    self.log.error(f"KPI view refresh failed: {str(e)}")
+            now = time.monotonic()
+            for scheduled in self._jobs:
+                seconds, job, due = scheduled
+                if now < due:
+                    continue
+                scheduled[2] = now + seconds
+                try:
+                    job()
+                except Exception as e:
+                    if self.log:
+                        self.log.error(f"Housekeeping job {getattr(job, '__qualname__', job)} failed: {str(e)}")
+
+
+def main():
+    from migrate import connect_from_env
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('refresh',))
+    parser.add_argument('--force', action='store_true', help='refresh even without pending writes')
+    args = parser.parse_args()
+
+    conn = connect_from_env()
+    try:
+        started = time.perf_counter()
+        if refresh(conn, force=args.force):
+            print(f"Refreshed {', '.join(VIEWS)} in {time.perf_counter() - started:.2f}s")
+        else:
+            print("Nothing to refresh (no settled writes, or another refresh is running)")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Deferred imports and service clients built on first use.
+
+``lazy_import('stripe', configure)`` and ``Lazy('gemini', factory)`` return
+proxies that import / build the real object the first time one of its
+attributes is read, once per process, and forward every attribute after
+that.  ``optional_import`` is the lazy form of the ``try: import x except
+ImportError: x = None`` idiom: it checks that the package is installed
+without importing it.
+
+Time spent importing and building is recorded, together with the app's own
+import time (``record``), and exposed by ``report()`` for /api/startup-stats.
+"""
+import importlib
+import importlib.util
+import threading
+import time
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def record(name, seconds):
+    with _timings_lock:
+        _timings[name] = _timings.get(name, 0.0) + seconds
+
+
+def report():
+    """{name: seconds} for everything initialised so far in this process, slowest first"""
+    with _timings_lock:
+        return dict(sorted(((name, round(seconds, 4)) for name, seconds in _timings.items()),
+                           key=lambda item: -item[1]))
+
+
+class Lazy:
+    """Proxy for the object ``factory()`` returns, built on first attribute access"""
+
+    def __init__(self, name, factory):
+        self.__dict__.update(_name=name, _factory=factory, _target=None, _lock=threading.Lock())
+
+    def _resolve(self):
+        target = self.__dict__['_target']
+        if target is None:
+            with self.__dict__['_lock']:
+                target = self.__dict__['_target']
+                if target is None:
+                    started = time.perf_counter()
+                    target = self.__dict__['_factory']()
+                    record(self.__dict__['_name'], time.perf_counter() - started)
+                    self.__dict__['_target'] = target
+        return target
+
+    def __getattr__(self, attribute):
+        return getattr(self._resolve(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._resolve(), attribute, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_target'] is not None else 'not loaded'
+        return f"<lazy {self.__dict__['_name']} ({state})>"
+
+
+def lazy_import(module, configure=None):
+    """Module proxy; ``configure(module)`` runs once, right after the import"""
+    def load():
+        loaded = importlib.import_module(module)
+        if configure is not None:
+            configure(loaded)
+        return loaded
+    return Lazy(module, load)
+
+
+def optional_import(module):
+    """``lazy_import(module)``, or None when its package is not installed"""
+    # find_spec of a dotted name would import the parent package
+    if importlib.util.find_spec(module.partition('.')[0]) is None:
+        return None
+    return lazy_import(module)
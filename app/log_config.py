@@ -0,0 +1,180 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus any ``extra`` fields"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Pass 1 in ``rate`` records tagged with ``extra={'sample': key}``.
+
+    Hot-path messages (one per DB connection, one per FX lookup) are counted
+    per key and only every Nth is queued; the emitted record carries
+    ``sampled=N`` so the real volume can be reconstructed.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, rate)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or self.rate == 1:
+            return True
+        with self._lock:
+            count = self._counters.get(key, 0)
+            self._counters[key] = count + 1
+        if count % self.rate:
+            return False
+        record.sampled = self.rate
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Enqueue the record with only the message rendered; formatting happens in the listener"""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# (queue handler, handler builder, running listener) for every queued sink
+_sinks = []
+
+
+def _formatter():
+    if os.getenv('LOG_FORMAT', 'json') == 'json':
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def _file_handler(filename):
+    log_dir = os.getenv('LOG_DIR', 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, filename)
+    max_bytes = int(os.getenv('LOG_MAX_BYTES', 0))
+    if max_bytes > 0:
+        # In-process rotation renames the file under any other writer: one process only
+        handler = RotatingFileHandler(path, maxBytes=max_bytes,
+                                      backupCount=int(os.getenv('LOG_BACKUP_COUNT', 5)), encoding='utf-8')
+    else:
+        # Every gunicorn worker appends to the same file and reopens it once
+        # logrotate has moved it away
+        handler = WatchedFileHandler(path, encoding='utf-8')
+    handler.setFormatter(_formatter())
+    return handler
+
+
+def _build_handlers():
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(_formatter())
+    return _file_handler('app.log'), console_handler
+
+
+def _start_sink(index):
+    queue_handler, build, _ = _sinks[index]
+    listener = QueueListener(queue_handler.queue, *build(), respect_handler_level=True)
+    listener.start()
+    _sinks[index] = (queue_handler, build, listener)
+
+
+def _add_sink(build, filters=()):
+    queue_handler = _DeferredQueueHandler(queue.SimpleQueue())
+    for log_filter in filters:
+        queue_handler.addFilter(log_filter)
+    _sinks.append((queue_handler, build, None))
+    _start_sink(len(_sinks) - 1)
+    return queue_handler
+
+
+def _restart_after_fork():
+    # Listener threads do not survive fork(); give each worker its own
+    for index, (queue_handler, build, _) in enumerate(_sinks):
+        queue_handler.queue = queue.SimpleQueue()
+        _start_sink(index)
+
+
+def stop_logging():
+    """Flush and stop the background listeners"""
+    for index, (queue_handler, build, listener) in enumerate(_sinks):
+        if listener is not None:
+            listener.stop()
+            _sinks[index] = (queue_handler, build, None)
+
+
+def log_level():
+    return getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+
+
+_configured = False
+
+
+def configure_logging(app=None):
+    """Route all logging through a queue drained by a background file/console writer
+
+    Starts the listener thread on the first call only; later calls (another
+    app in the same process) just attach ``app``'s logger.
+    """
+    global _configured
+    level = log_level()
+    if not _configured:
+        _configured = True
+        queue_handler = _add_sink(_build_handlers, [SamplingFilter(int(os.getenv('LOG_SAMPLE_RATE', 100)))])
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        atexit.register(stop_logging)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_after_fork)
+
+    if app is not None:
+        # Flask's own logger propagates to root; drop its default stderr handler
+        app.logger.handlers.clear()
+        app.logger.setLevel(level)
+
+
+def dedicated_logger(name, filename):
+    """Logger writing only to LOG_DIR/``filename`` through its own queued sink"""
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(_add_sink(lambda: (_file_handler(filename),)))
+    return logger
@@ -0,0 +1,97 @@
+"""Landing page, built assets and operational endpoints (metrics, perf and startup stats)."""
+import os
+import secrets
+
+from flask import Blueprint, current_app, render_template, request, jsonify, send_from_directory, abort
+
+from instrumentation import route_stats
+import metrics
+import assets
+import lazy
+from app import ASSET_MAX_AGE, asset_manifest, cached_page, get_db_connection
+
+bp = Blueprint('main', __name__)
+
+# Built assets, in the best encoding the client accepts
+@bp.route('/assets/<path:filename>')
+def asset(filename):
+    """Serve a fingerprinted asset with immutable cache headers"""
+    variant = asset_manifest.variant(filename, lambda encoding: request.accept_encodings[encoding])
+    if variant is None:
+        abort(404)
+    path, encoding = variant
+    mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+    response = send_from_directory(assets.DIST_DIR, path, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # The name changes with the content, so browsers never need to revalidate
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+# Main routes
+@bp.route('/')
+@cached_page
+def home():
+    """Home page"""
+    return render_template('home.html')
+
+# ============== OPERATIONS ENDPOINTS ==============
+
+def ops_access_allowed():
+    """Ops endpoints need METRICS_TOKEN as bearer token; without one, only a local client in debug mode
+
+    A reverse proxy on the same host makes every client look like loopback,
+    so outside debug an unset token closes the endpoints.
+    """
+    token = os.getenv('METRICS_TOKEN')
+    if token:
+        return secrets.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    return current_app.debug and request.remote_addr in ('127.0.0.1', '::1')
+
+@bp.route('/api/perf-stats')
+def perf_stats():
+    """Aggregated per-route latency histograms and query/outbound counts for this worker"""
+    if not ops_access_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.args.get('reset') == '1':
+        route_stats.reset()
+    return jsonify(route_stats.snapshot())
+
+def scrape_time_gauges(counters):
+    """Gauges computed when /metrics is scraped (DB-backed queue state, ratios)"""
+    gauges = {}
+    hits = metrics.counter_total(counters, 'fx_cache_requests_total', result='hit')
+    lookups = metrics.counter_total(counters, 'fx_cache_requests_total')
+    gauges['fx_cache_hit_ratio'] = [({}, round(hits / lookups, 4) if lookups else 0)]
+    try:
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT COUNT(*), COALESCE(EXTRACT(EPOCH FROM (NOW() - MIN(created_at))), 0)
+                FROM payment_events
+                WHERE status = 'pending'
+            """)
+            depth, lag = cur.fetchone()
+            gauges['webhook_queue_depth'] = [({}, depth)]
+            gauges['webhook_queue_lag_seconds'] = [({}, float(lag))]
+        finally:
+            conn.close()
+    except Exception as e:
+        current_app.logger.error(f"Error collecting queue metrics: {str(e)}")
+    return gauges
+
+@bp.route('/api/startup-stats')
+def startup_stats():
+    """Seconds spent importing the app and building each lazily created client in this worker"""
+    if not ops_access_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({'pid': os.getpid(), 'timings': lazy.report()})
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint aggregated over all worker processes"""
+    if not ops_access_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    return metrics.render(scrape_time_gauges), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
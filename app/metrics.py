@@ -0,0 +1,300 @@
+"""Prometheus-format metrics that aggregate correctly across gunicorn workers.
+
+Each process keeps plain in-memory counters (one uncontended lock per update)
+and a background thread dumps them to ``METRICS_DIR/metrics-<pid>.json`` every
+few seconds.  ``render()`` merges every worker's file, so whichever worker
+answers ``/metrics`` reports the totals for the whole server.  Counters and
+histograms of dead workers are kept (they must stay monotonic); their gauges
+are dropped.  Under gunicorn the master folds each exited worker's file into
+``archive.json`` (``retire``), so recycled workers do not pile up files.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_definitions = {}
+
+
+def describe(name, kind, help_text, buckets=None):
+    """Register a metric family: kind is counter, gauge or histogram"""
+    _definitions[name] = {'kind': kind, 'help': help_text, 'buckets': tuple(buckets or DEFAULT_BUCKETS)}
+
+
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.pid = os.getpid()
+        self.flusher = None
+
+
+_registry = _Registry()
+
+
+def _local():
+    # After a fork the child starts from empty counters and its own flusher
+    global _registry
+    if _registry.pid != os.getpid():
+        _registry = _Registry()
+    if _registry.flusher is None:
+        _start_flusher(_registry)
+    return _registry
+
+
+# (name, sorted label items) -> serialized key; label values come from small
+# fixed sets (routes, statuses, event types), so this stays small
+_keys = {}
+
+
+def _key(name, labels):
+    items = tuple(sorted(labels.items())) if labels else ()
+    key = _keys.get((name, items))
+    if key is None:
+        key = _keys[(name, items)] = name + '|' + json.dumps(dict(items), sort_keys=True)
+    return key
+
+
+def inc(name, labels=None, value=1):
+    reg = _local()
+    key = _key(name, labels)
+    with reg.lock:
+        reg.counters[key] = reg.counters.get(key, 0) + value
+
+
+def gauge_add(name, labels=None, value=1):
+    reg = _local()
+    key = _key(name, labels)
+    with reg.lock:
+        reg.gauges[key] = reg.gauges.get(key, 0) + value
+
+
+def gauge_set(name, labels=None, value=0):
+    reg = _local()
+    with reg.lock:
+        reg.gauges[_key(name, labels)] = value
+
+
+def observe(name, value, labels=None):
+    reg = _local()
+    buckets = _definitions[name]['buckets']
+    key = _key(name, labels)
+    index = bisect_left(buckets, value)
+    with reg.lock:
+        entry = reg.histograms.get(key)
+        if entry is None:
+            entry = reg.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        entry[index] += 1
+        entry[-1] += value
+
+
+# ----- cross-process persistence -----
+
+def metrics_dir():
+    path = os.getenv('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'ayist-metrics')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def flush():
+    """Write this process's metrics file (atomic rename)"""
+    reg = _local()
+    with reg.lock:
+        data = {'pid': reg.pid, 'counters': dict(reg.counters), 'gauges': dict(reg.gauges),
+                'histograms': {k: list(v) for k, v in reg.histograms.items()}}
+    directory = metrics_dir()
+    target = os.path.join(directory, f'metrics-{reg.pid}.json')
+    tmp = target + '.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(data, fh)
+    os.replace(tmp, target)
+
+
+def _start_flusher(reg):
+    interval = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except OSError:
+                pass
+
+    reg.flusher = threading.Thread(target=run, name='metrics-flusher', daemon=True)
+    reg.flusher.start()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+ARCHIVE_NAME = 'archive.json'
+
+
+def _read(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge_into(counters, histograms, data):
+    for key, value in data['counters'].items():
+        counters[key] = counters.get(key, 0) + value
+    for key, values in data['histograms'].items():
+        merged = histograms.get(key)
+        histograms[key] = values if merged is None else [a + b for a, b in zip(merged, values)]
+
+
+def collect():
+    """Merge every worker's metrics file into one counters/gauges/histograms view"""
+    flush()
+    counters, gauges, histograms = {}, {}, {}
+    directory = metrics_dir()
+    archive = _read(os.path.join(directory, ARCHIVE_NAME))
+    if archive is not None:
+        _merge_into(counters, histograms, archive)
+    for filename in os.listdir(directory):
+        if not (filename.startswith('metrics-') and filename.endswith('.json')):
+            continue
+        data = _read(os.path.join(directory, filename))
+        if data is None:
+            continue
+        _merge_into(counters, histograms, data)
+        if _pid_alive(data['pid']):
+            for key, value in data['gauges'].items():
+                gauges[key] = gauges.get(key, 0) + value
+    return counters, gauges, histograms
+
+
+def retire(pid):
+    """Fold exited worker ``pid``'s counters and histograms into the archive and drop its file
+
+    Called by the gunicorn master (child_exit), the only writer of the archive.
+    """
+    directory = metrics_dir()
+    path = os.path.join(directory, f'metrics-{pid}.json')
+    data = _read(path)
+    if data is not None:
+        counters, histograms = {}, {}
+        archive = _read(os.path.join(directory, ARCHIVE_NAME))
+        if archive is not None:
+            _merge_into(counters, histograms, archive)
+        _merge_into(counters, histograms, data)
+        target = os.path.join(directory, ARCHIVE_NAME)
+        with open(target + '.tmp', 'w') as fh:
+            json.dump({'counters': counters, 'histograms': histograms}, fh)
+        os.replace(target + '.tmp', target)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def clear_metrics_dir():
+    """Remove every worker file and the archive; call once when the server (not a worker) starts"""
+    directory = metrics_dir()
+    for filename in os.listdir(directory):
+        if filename.startswith('metrics-') or filename == ARCHIVE_NAME:
+            os.remove(os.path.join(directory, filename))
+
+
+# ----- text exposition -----
+
+def _split(key):
+    name, labels = key.split('|', 1)
+    return name, json.loads(labels)
+
+
+def _fmt_labels(labels):
+    if not labels:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                    for k, v in sorted(labels.items()))
+    return '{' + body + '}'
+
+
+def counter_total(counters, name, **labels):
+    """Sum the merged ``counters`` of ``name`` whose labels include ``labels``"""
+    total = 0
+    for key, value in counters.items():
+        metric, metric_labels = _split(key)
+        if metric == name and all(metric_labels.get(k) == v for k, v in labels.items()):
+            total += value
+    return total
+
+
+def render(extra_gauges=None):
+    """Prometheus text format (version 0.0.4) for all workers plus scrape-time gauges
+
+    ``extra_gauges(counters)`` returns {metric name: [(labels, value), ...]}; it
+    receives the merged counters so it can derive ratios.
+    """
+    counters, gauges, histograms = collect()
+    families = {}
+    for key, value in counters.items():
+        name, labels = _split(key)
+        families.setdefault(name, []).append((name, labels, value))
+    for key, value in gauges.items():
+        name, labels = _split(key)
+        families.setdefault(name, []).append((name, labels, value))
+    for name, samples in (extra_gauges(counters) if extra_gauges else {}).items():
+        for labels, value in samples:
+            families.setdefault(name, []).append((name, labels, value))
+    for key, values in histograms.items():
+        name, labels = _split(key)
+        buckets = _definitions.get(name, {}).get('buckets', DEFAULT_BUCKETS)
+        cumulative = 0
+        for bound, count in zip(buckets + (float('inf'),), values):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            families.setdefault(name, []).append((f'{name}_bucket', dict(labels, le=le), cumulative))
+        families[name].append((f'{name}_sum', labels, values[-1]))
+        families[name].append((f'{name}_count', labels, cumulative))
+
+    lines = []
+    for name in sorted(families):
+        definition = _definitions.get(name, {'kind': 'gauge', 'help': name})
+        lines.append(f"# HELP {name} {definition['help']}")
+        lines.append(f"# TYPE {name} {definition['kind']}")
+        for sample, labels, value in families[name]:
+            lines.append(f'{sample}{_fmt_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+describe('http_requests_total', 'counter', 'HTTP requests by route and status')
+describe('http_request_duration_seconds', 'histogram', 'HTTP request latency by route')
+describe('db_connections_opened_total', 'counter', 'PostgreSQL connections opened')
+describe('db_connections_in_use', 'gauge', 'PostgreSQL connections currently open')
+describe('db_queries_total', 'counter', 'SQL statements executed')
+describe('fx_cache_requests_total', 'counter', 'Exchange rate lookups by cache result')
+describe('response_cache_requests_total', 'counter', 'Cached JSON API requests by result (hit, miss, not_modified)')
+describe('sse_clients', 'gauge', 'Open Server-Sent Events streams')
+describe('sse_events_total', 'counter', 'Events pushed to SSE streams by event')
+describe('template_cache_requests_total', 'counter', 'Cached template fragments and pages by kind and result')
+describe('http_request_timeouts_total', 'counter', 'Requests cut off at their route deadline (gevent workers)')
+describe('http_compressed_responses_total', 'counter', 'Responses compressed on the fly by encoding')
+describe('http_compression_bytes_saved_total', 'counter', 'Bytes saved by on-the-fly compression by encoding')
+describe('fx_cache_hit_ratio', 'gauge', 'Share of exchange rate lookups served from cache')
+describe('webhook_events_total', 'counter', 'Stripe webhook events handled by type and result (ok, error, ignored)')
+describe('webhook_processing_seconds', 'histogram', 'Stripe webhook handling time by type')
+describe('webhook_queue_depth', 'gauge', 'Pending rows in payment_events')
+describe('webhook_queue_lag_seconds', 'gauge', 'Age of the oldest pending payment_events row')
+describe('email_sent_total', 'counter', 'Outbound e-mails by kind and result')
+describe('email_outbox_backlog', 'gauge', 'E-mails currently being sent')
+describe('gemini_request_duration_seconds', 'histogram', 'Gemini API call latency')
+describe('gemini_errors_total', 'counter', 'Gemini API calls that failed')
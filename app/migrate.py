@@ -0,0 +1,273 @@
+"""Versioned schema migrations.
+
+Migrations are the ``NNNN_name.sql`` files in MIGRATIONS_DIR (``migrations/``
+at the repository root), applied in version order and recorded in
+``schema_migrations``.  Each file runs in a single transaction together with
+its bookkeeping row, so it is either fully applied or not at all.
+
+A file whose first line is ``-- migrate: no-transaction`` is run statement by
+statement in autocommit mode instead; that is required for
+``CREATE INDEX CONCURRENTLY``, which builds the index without blocking writes.
+Such statements must be idempotent (``IF NOT EXISTS``/``IF EXISTS``): a failed
+concurrent build leaves an INVALID index behind, which is dropped before the
+migration is retried.
+
+A session advisory lock serialises runners, so several workers starting at
+once apply each migration exactly once.
+
+    python app/migrate.py status
+    python app/migrate.py up [--target VERSION]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+from collections import namedtuple
+
+MIGRATIONS_DIR = os.getenv('MIGRATIONS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations'))
+
+# Arbitrary, fixed key for pg_advisory_lock
+ADVISORY_LOCK_ID = 4_512_036
+
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+_NO_TRANSACTION = '-- migrate: no-transaction'
+_CONCURRENT_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.I)
+
+Migration = namedtuple('Migration', 'version name path sql checksum transactional')
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationError(Exception):
+    pass
+
+
+def load_migrations(directory=None):
+    """Migrations found in ``directory``, ordered by version"""
+    directory = directory or MIGRATIONS_DIR
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}: {filename}")
+        path = os.path.join(directory, filename)
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+        migrations[version] = Migration(
+            version=version,
+            name=match.group(2),
+            path=path,
+            sql=sql,
+            checksum=hashlib.sha256(sql.encode('utf-8')).hexdigest(),
+            transactional=not sql.lstrip().startswith(_NO_TRANSACTION),
+        )
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(sql):
+    """Split a script on top-level semicolons (quotes, dollar quotes and comments respected)"""
+    statements, current = [], []
+    i, length = 0, len(sql)
+    while i < length:
+        char = sql[i]
+        if sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = length if end == -1 else end + 1
+            continue
+        if sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            continue
+        if char == "'":
+            end = i + 1
+            while end < length:
+                if sql[end] == "'" and sql[end + 1:end + 2] == "'":
+                    end += 2
+                elif sql[end] == "'":
+                    break
+                else:
+                    end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+        if char == '$':
+            tag = re.match(r'\$\w*\$', sql[i:])
+            if tag:
+                end = sql.find(tag.group(0), i + len(tag.group(0)))
+                end = length if end == -1 else end + len(tag.group(0))
+                current.append(sql[i:end])
+                i = end
+                continue
+        if char == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def _ensure_table(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    conn.commit()
+
+
+def applied_migrations(conn):
+    """{version: checksum} of the migrations recorded in the database"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        return dict(cur.fetchall())
+
+
+def _record(cur, migration):
+    cur.execute(
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+        (migration.version, migration.name, migration.checksum)
+    )
+
+
+def _drop_invalid_indexes(conn, migration):
+    """Remove INVALID leftovers of an interrupted CREATE INDEX CONCURRENTLY"""
+    names = _CONCURRENT_INDEX.findall(migration.sql)
+    if not names:
+        return
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE NOT i.indisvalid AND n.nspname = current_schema() AND c.relname = ANY(%s)
+        """, (names,))
+        for (name,) in cur.fetchall():
+            logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+            cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def _apply(conn, migration):
+    if migration.transactional:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(migration.sql)
+                _record(cur, migration)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return
+
+    conn.autocommit = True
+    try:
+        _drop_invalid_indexes(conn, migration)
+        with conn.cursor() as cur:
+            for statement in split_statements(migration.sql):
+                cur.execute(statement)
+            _record(cur, migration)
+    finally:
+        conn.autocommit = False
+
+
+def migrate(connection_factory, target=None, log=None):
+    """Apply pending migrations up to ``target`` (default: all); returns the applied versions"""
+    log = log or logger
+    migrations = load_migrations()
+    conn = connection_factory()
+    try:
+        _ensure_table(conn)
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+        conn.commit()
+        try:
+            applied = applied_migrations(conn)
+            conn.commit()
+            done = []
+            for migration in migrations:
+                if target is not None and migration.version > target:
+                    break
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        log.warning(f"Migration {migration.version}_{migration.name} was edited after being applied")
+                    continue
+                log.info(f"Applying migration {migration.version}_{migration.name}")
+                try:
+                    _apply(conn, migration)
+                except Exception as e:
+                    raise MigrationError(f"Migration {migration.version}_{migration.name} failed: {str(e)}") from e
+                done.append(migration.version)
+            return done
+        finally:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def status(connection_factory):
+    """[(version, name, applied)] for every migration on disk"""
+    conn = connection_factory()
+    try:
+        _ensure_table(conn)
+        applied = applied_migrations(conn)
+    finally:
+        conn.close()
+    return [(m.version, m.name, m.version in applied) for m in load_migrations()]
+
+
+def connect_from_env():
+    """psycopg2 connection from the DB_* settings (CLI use; the app has get_db_connection)"""
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        port=os.getenv('DB_PORT', 5432),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply or inspect schema migrations')
+    sub = parser.add_subparsers(dest='command', required=True)
+    up = sub.add_parser('up', help='apply pending migrations')
+    up.add_argument('--target', type=int, help='stop after this version')
+    sub.add_parser('status', help='list migrations and whether they are applied')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.command == 'status':
+        for version, name, applied in status(connect_from_env):
+            print(f"{version:04d}_{name:<40} {'applied' if applied else 'pending'}")
+        return 0
+    try:
+        applied = migrate(connect_from_env, target=args.target)
+    except MigrationError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Development/CI helpers for spotting per-row query loops (N+1 patterns).
+
+``init_app`` installs a detector that fingerprints every statement of a
+request and reports statements repeated at least ``NPLUSONE_THRESHOLD`` times
+with differing parameters, together with the route and the call sites.
+``assert_max_queries`` lets a test pin the number of queries an endpoint may run.
+"""
+import os
+import threading
+import traceback
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+import instrumentation
+from slow_query_log import normalize_sql
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.join(_APP_DIR, name) for name in ('instrumentation.py', 'nplusone.py', 'slow_query_log.py')}
+
+
+def _call_site():
+    """First application frame (file:line in function) that issued the statement"""
+    for frame in reversed(traceback.extract_stack(limit=30)):
+        if frame.filename.startswith(_APP_DIR) and frame.filename not in _SKIP_FILES:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+    return '<unknown>'
+
+
+def _statement_text(cursor, query):
+    return query if isinstance(query, str) else query.as_string(cursor)
+
+
+class NPlusOneDetector:
+    def __init__(self, logger, threshold=None):
+        self.logger = logger
+        self.threshold = threshold or int(os.getenv('NPLUSONE_THRESHOLD', 5))
+
+    def observe(self, cursor, query, params, duration, rows):
+        if not has_request_context():
+            return
+        seen = g.setdefault('_nplusone', {})
+        fingerprint = normalize_sql(_statement_text(cursor, query))
+        entry = seen.get(fingerprint)
+        if entry is None:
+            entry = seen[fingerprint] = {'count': 0, 'params': set(), 'sites': set()}
+        entry['count'] += 1
+        entry['params'].add(repr(params))
+        entry['sites'].add(_call_site())
+
+    def report(self, response):
+        seen = g.pop('_nplusone', None) or {}
+        for fingerprint, entry in seen.items():
+            if entry['count'] >= self.threshold and len(entry['params']) > 1:
+                message = (f"N+1 query on {request.method} {request.path} "
+                           f"({request.endpoint}): {entry['count']} executions, "
+                           f"{len(entry['params'])} distinct parameter sets\n"
+                           f"    SQL: {fingerprint[:300]}\n"
+                           f"    from: {', '.join(sorted(entry['sites']))}")
+                self.logger.warning(message)
+        return response
+
+
+def init_app(app, logger=None):
+    """Enable the detector when NPLUSONE_DETECT=1 (or the app runs in debug mode)"""
+    if os.getenv('NPLUSONE_DETECT', '1' if app.debug else '0') != '1':
+        return None
+    detector = NPlusOneDetector(logger or app.logger)
+    instrumentation.query_observers.append(detector.observe)
+    app.after_request(detector.report)
+    return detector
+
+
+# ----- test helper -----
+
+_capture = threading.local()
+
+
+def _capture_observer(cursor, query, params, duration, rows):
+    statements = getattr(_capture, 'statements', None)
+    if statements is not None:
+        statements.append((_statement_text(cursor, query), params))
+
+
+@contextmanager
+def capture_queries():
+    """Collect (sql, params) of every statement run on this thread inside the block"""
+    statements = []
+    previous = getattr(_capture, 'statements', None)
+    _capture.statements = statements
+    instrumentation.query_observers.append(_capture_observer)
+    try:
+        yield statements
+    finally:
+        instrumentation.query_observers.remove(_capture_observer)
+        _capture.statements = previous
+
+
+def assert_max_queries(client, url, max_queries, method='GET', **kwargs):
+    """Request ``url`` with a Flask test client and fail if it runs more than ``max_queries``"""
+    with capture_queries() as statements:
+        response = client.open(url, method=method, **kwargs)
+    if len(statements) > max_queries:
+        listing = '\n'.join(f"  {normalize_sql(sql)[:160]}" for sql, _ in statements)
+        raise AssertionError(f"{method} {url} ran {len(statements)} queries (max {max_queries}):\n{listing}")
+    return response
@@ -0,0 +1,71 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasher:
+    """Password hashing service with configurable cost, executed off the request thread.
+
+    Hashing runs in a bounded process pool so a login storm saturates the pool
+    instead of the web workers.  ``method`` is any Werkzeug method string, e.g.
+    ``scrypt`` or ``pbkdf2:sha256:600000``.  With ``workers=0`` everything runs
+    inline (useful for tests and single-core boxes).
+    """
+
+    def __init__(self, method=None, salt_length=None, workers=None, max_pending=None, timeout=None):
+        self.method = method or os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+        self.salt_length = salt_length or int(os.getenv('PASSWORD_HASH_SALT_LENGTH', 16))
+        self.workers = workers if workers is not None else int(
+            os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+        self.timeout = timeout or float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+        self._slots = threading.BoundedSemaphore(
+            max_pending or int(os.getenv('PASSWORD_HASH_MAX_PENDING', max(self.workers, 1) * 8)))
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._method_prefix = None
+
+    def _executor(self):
+        # Created lazily and per process, so a pool built before a gunicorn fork is never reused
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def _run(self, func, *args):
+        if self.workers <= 0:
+            return func(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("Password hashing queue is full")
+        try:
+            return self._executor().submit(func, *args).result(timeout=self.timeout)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Hash ``password`` with the configured algorithm and cost"""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        """Check ``password`` against a stored hash"""
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when ``pwhash`` was produced with different algorithm/cost parameters"""
+        if self._method_prefix is None:
+            # Werkzeug normalizes the method string (e.g. 'scrypt' -> 'scrypt:32768:8:1')
+            self._method_prefix = generate_password_hash('', self.method, 1).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
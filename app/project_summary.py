@@ -0,0 +1,38 @@
+"""Per-project summary dicts (dashboard / company status JSON shape).
+
+The totals come from the ``project_kpis`` views (migrations/0003, read by
+kpi_views.fetch_project_kpis), which aggregate income, expenses and tasks
+separately per project; this module only turns such a row into the JSON
+shape and derives the project status.
+"""
+
+
+def project_status(start_date, end_date, current_date):
+    """Status derived from the project dates"""
+    if end_date:
+        if current_date > end_date:
+            return "Completed"
+        if start_date and current_date >= start_date:
+            return "In Progress"
+    elif start_date and current_date >= start_date:
+        return "In Progress"
+    return "Not Started"
+
+
+def summary_row_to_dict(row, current_date):
+    total_tasks = row[8] or 0
+    completed_tasks = row[9] or 0
+    completion = int((completed_tasks / total_tasks) * 100) if total_tasks > 0 else 0
+    return {
+        'project_id': row[0],
+        'name': row[1],
+        'description': row[2],
+        'start_date': row[3].strftime('%Y-%m-%d') if row[3] else None,
+        'end_date': row[4].strftime('%Y-%m-%d') if row[4] else None,
+        'income': float(row[5]),
+        'expenses': float(row[6]),
+        'profit': float(row[7]),
+        'status': project_status(row[3], row[4], current_date),
+        'completion': completion
+    }
+
@@ -0,0 +1,349 @@
+"""Projects, tasks, the dashboard and its live data feeds."""
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify, g
+
+import kpi_views
+from response_cache import bump_data_version, tenant_version
+from change_feed import format_event
+from app import (SSE_KEEPALIVE_SECONDS, cached_json, change_feed, check_company_limits, convert_to_pln,
+                 get_db_connection, login_required, pln_rate)
+
+bp = Blueprint('projects', __name__)
+
+# Endpoint for dashboard data
+@bp.route('/api/project-dashboard-data')
+@login_required
+@cached_json
+def project_dashboard_data():
+    """Endpoint for dashboard data"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # One row per project from the materialized KPIs (live view when stale)
+        projects = kpi_views.fetch_project_kpis(cur, session['company_id'], pln_rate)
+        return jsonify(projects)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error fetching dashboard data: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# Server-Sent Events stream of the tenant's change notifications
+@bp.route('/api/events')
+@login_required
+def tenant_events():
+    """Push change / kpis / resync events for the current company (text/event-stream)"""
+    company_id = session['company_id']
+    subscriber = change_feed.subscribe(company_id)
+    if subscriber is None:
+        # The client falls back to polling
+        return jsonify({'error': 'Too many open event streams'}), 503
+
+    try:
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            version = tenant_version(cur, company_id)
+            cur.close()
+        finally:
+            conn.close()
+    except Exception as e:
+        change_feed.unsubscribe(subscriber)
+        current_app.logger.error(f"Error opening event stream: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+    last_event_id = request.headers.get('Last-Event-ID')
+
+    def stream():
+        try:
+            yield f"retry: {int(SSE_KEEPALIVE_SECONDS * 1000)}\n\n"
+            yield format_event('hello', {'version': version}, version)
+            if last_event_id is not None and last_event_id != str(version):
+                # Reconnected after missing some changes
+                yield format_event('resync', {'reason': 'missed'}, version)
+            while True:
+                events = subscriber.get(SSE_KEEPALIVE_SECONDS)
+                if not events:
+                    yield ": keepalive\n\n"
+                for event, data, event_id in events:
+                    yield format_event(event, data, event_id)
+        finally:
+            # Runs when the client disconnects (the next write fails) or the worker stops
+            change_feed.unsubscribe(subscriber)
+
+    response = current_app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/dashboard')
+@login_required
+def dashboard():
+    """Main dashboard after login"""
+    conn = get_db_connection()
+    cur = None
+    try:
+        current_app.logger.info(f"Loading dashboard for user {session['user_id']}")
+        cur = conn.cursor()
+        
+        # User and company data (resolved once per session by the session store)
+        ctx = g.current_user
+        user_data = (ctx['first_name'], ctx['last_name'], ctx['email'], ctx['is_admin'],
+                     ctx['company_name'], ctx['company_email'],
+                     ctx['country'], ctx['industry'], ctx['company_active'],
+                     ctx['subscription_status'], ctx['current_period_end'],
+                     ctx['plan_name'], ctx['plan_features'])
+        
+        # Available plans
+        cur.execute("SELECT id, name, description, price, features FROM plans WHERE is_active = TRUE")
+        plans = cur.fetchall()
+        
+        # Project cards and totals from the materialized KPIs
+        dashboard_data = kpi_views.fetch_project_kpis(cur, session['company_id'], pln_rate)
+        total_income = sum(project['income'] for project in dashboard_data)
+        total_expenses = sum(project['expenses'] for project in dashboard_data)
+
+        current_app.logger.info(f"Dashboard loaded with {len(dashboard_data)} projects")
+        return render_template('dashboard.html', 
+                             user=user_data, 
+                             plans=plans,
+                             projects=dashboard_data,
+                             total_income=round(total_income, 2),
+                             total_expenses=round(total_expenses, 2),
+                             profit_loss=round(total_income - total_expenses, 2))
+        
+    except Exception as e:
+        current_app.logger.error(f"Dashboard error: {str(e)}", exc_info=True)
+        flash(f'Error loading dashboard: {str(e)}', 'danger')
+        return redirect(url_for('main.home'))
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            conn.close()
+
+# Project management routes
+@bp.route('/projects')
+@login_required
+def projects():
+    """List all company projects"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT * FROM projects WHERE company_id = %s ORDER BY start_date DESC', 
+                   (session['company_id'],))
+        projects = cur.fetchall()
+        return render_template('projects.html', projects=projects)
+    except Exception as e:
+        current_app.logger.error(f"Error listing projects: {str(e)}")
+        flash('Error loading projects', 'danger')
+        return redirect(url_for('projects.dashboard'))
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/project/<int:project_id>')
+@login_required
+def project(project_id):
+    """Detailed project page"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Verify project belongs to company
+        cur.execute('SELECT * FROM projects WHERE id = %s AND company_id = %s', 
+                    (project_id, session['company_id']))
+        project = cur.fetchone()
+        
+        if not project:
+            flash('Project not found', 'danger')
+            return redirect(url_for('projects.projects'))
+        
+        # Get income and expenses
+        cur.execute('SELECT * FROM income WHERE project_id = %s ORDER BY date DESC', (project_id,))
+        incomes = cur.fetchall()
+        
+        cur.execute('SELECT * FROM expenses WHERE project_id = %s ORDER BY date DESC', (project_id,))
+        expenses = cur.fetchall()
+        
+        # Get tasks
+        cur.execute('SELECT * FROM tasks WHERE project_id = %s ORDER BY due_date', (project_id,))
+        tasks = cur.fetchall()
+        
+        # Calculate totals
+        total_income = sum(convert_to_pln(i[4], i[5]) for i in incomes)  # amount and currency
+        total_expenses = sum(convert_to_pln(e[4], e[5]) for e in expenses)  # amount and currency
+        
+        return render_template('project.html',
+                             project=project,
+                             incomes=incomes,
+                             expenses=expenses,
+                             tasks=tasks,
+                             total_income=total_income,
+                             total_expenses=total_expenses,
+                             profit_loss=total_income - total_expenses)
+    except Exception as e:
+        current_app.logger.error(f"Error loading project: {str(e)}")
+        flash('Error loading project', 'danger')
+        return redirect(url_for('projects.projects'))
+    finally:
+        cur.close()
+        conn.close()
+
+@bp.route('/add_project', methods=['GET', 'POST'])
+@login_required
+def add_project():
+    """Add new project"""
+    if request.method == 'POST':
+        name = request.form['name'].strip()
+        description = request.form['description'].strip()
+        start_date = request.form['start_date']
+        end_date = request.form['end_date']
+        
+        if not name or not start_date or not end_date:
+            flash('Name and dates are required', 'danger')
+            return redirect(url_for('projects.add_project'))
+        
+        # Check project limit
+        allowed, error_msg = check_company_limits(session['company_id'], 'project')
+        if not allowed:
+            flash(error_msg, 'danger')
+            return redirect(url_for('projects.add_project'))
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                INSERT INTO projects 
+                (name, description, start_date, end_date, company_id)
+                VALUES (%s, %s, %s, %s, %s)
+            ''', (name, description, start_date, end_date, session['company_id']))
+            bump_data_version(cur, session['company_id'], 'projects')
+            conn.commit()
+            flash('Project added successfully!', 'success')
+            return redirect(url_for('projects.projects'))
+        except Exception as e:
+            conn.rollback()
+            current_app.logger.error(f"Error adding project: {str(e)}")
+            flash('Error adding project', 'danger')
+            return redirect(url_for('projects.add_project'))
+        finally:
+            cur.close()
+            conn.close()
+    
+    return render_template('add_project.html')
+
+@bp.route('/projects/<int:project_id>/delete', methods=['POST'])
+@login_required
+def delete_project(project_id):
+    """Delete a project"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Verify project belongs to company
+        cur.execute('SELECT id FROM projects WHERE id = %s AND company_id = %s', 
+                   (project_id, session['company_id']))
+        if not cur.fetchone():
+            flash('Project not found or access denied', 'danger')
+            return redirect(url_for('projects.projects'))
+        
+        cur.execute('DELETE FROM projects WHERE id = %s', (project_id,))
+        bump_data_version(cur, session['company_id'], 'projects', project_id)
+        conn.commit()
+        flash('Project deleted successfully', 'success')
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Error deleting project: {str(e)}")
+        flash('Error deleting project', 'danger')
+    finally:
+        cur.close()
+        conn.close()
+    return redirect(url_for('projects.projects'))
+
+# Task routes
+@bp.route('/project/<int:project_id>/add_task', methods=['POST'])
+@login_required
+def add_task(project_id):
+    """Add task to a project"""
+    title = request.form['title'].strip()
+    description = request.form.get('description', '').strip()
+    due_date = request.form['due_date']
+    assigned_user = request.form.get('assigned_user', '').strip()
+    
+    if not title or not due_date:
+        flash('Title and due date are required', 'danger')
+        return redirect(url_for('projects.project', project_id=project_id))
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Verify project belongs to company
+        cur.execute('SELECT id FROM projects WHERE id = %s AND company_id = %s', 
+                   (project_id, session['company_id']))
+        if not cur.fetchone():
+            flash('Project not found or access denied', 'danger')
+            return redirect(url_for('projects.projects'))
+        
+        # Insert task
+        cur.execute('''
+            INSERT INTO tasks 
+            (project_id, title, description, due_date, assigned_user, status)
+            VALUES (%s, %s, %s, %s, %s, 'Pending')
+        ''', (project_id, title, description, due_date, assigned_user))
+        bump_data_version(cur, session['company_id'], 'tasks', project_id)
+        conn.commit()
+        
+        flash('Task added successfully!', 'success')
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Error adding task: {str(e)}")
+        flash('Error adding task', 'danger')
+    finally:
+        cur.close()
+        conn.close()
+    
+    return redirect(url_for('projects.project', project_id=project_id))
+
+@bp.route('/task/<int:task_id>/update_status', methods=['POST'])
+@login_required
+def update_task_status(task_id):
+    """Update task status"""
+    new_status = request.form['status']
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Verify task belongs to company
+        cur.execute('''
+            SELECT t.id FROM tasks t
+            JOIN projects p ON t.project_id = p.id
+            WHERE t.id = %s AND p.company_id = %s
+        ''', (task_id, session['company_id']))
+        if not cur.fetchone():
+            flash('Task not found or access denied', 'danger')
+            return redirect(url_for('projects.dashboard'))
+        
+        # Update status
+        cur.execute('''
+            UPDATE tasks SET status = %s 
+            WHERE id = %s
+        ''', (new_status, task_id))
+        bump_data_version(cur, session['company_id'], 'tasks')
+        conn.commit()
+        
+        flash('Task status updated!', 'success')
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Error updating task: {str(e)}")
+        flash('Error updating task', 'danger')
+    finally:
+        cur.close()
+        conn.close()
+    
+    # Redirect back to project
+    cur = conn.cursor()
+    cur.execute('SELECT project_id FROM tasks WHERE id = %s', (task_id,))
+    project_id = cur.fetchone()[0]
+    cur.close()
+    return redirect(url_for('projects.project', project_id=project_id))
@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """In-process token buckets; enough for a single worker or as a dev stand-in
+
+    Buckets are kept in least-recently-used order, so idle ones are dropped from
+    the front and, past ``max_keys``, the oldest is evicted in O(1).  A bucket
+    idle for ``idle_expiry`` seconds (at least the longest limit window) has
+    refilled completely and is equivalent to a missing one.
+    """
+
+    def __init__(self, max_keys=100000, idle_expiry=3600):
+        self.max_keys = max_keys
+        self.idle_expiry = idle_expiry
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, burst, now):
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            self._prune(now)
+            return allowed, tokens
+
+    def _prune(self, now):
+        buckets = self._buckets
+        while buckets and (len(buckets) > self.max_keys
+                           or now - next(iter(buckets.values()))[1] > self.idle_expiry):
+            buckets.popitem(last=False)
+
+    def purge(self, now):
+        with self._lock:
+            self._prune(now)
+
+
+class DatabaseBackend:
+    """Token buckets shared by every worker through the rate_limits table.
+
+    Refill and consumption happen in one atomic upsert, so concurrent workers
+    never read-modify-write the same bucket.
+    """
+
+    REFILL = "LEAST(%(burst)s, rate_limits.tokens + (%(now)s - rate_limits.updated_at) * %(rate)s)"
+    CONSUME_SQL = f"""
+        INSERT INTO rate_limits (key, tokens, updated_at, allowed)
+        VALUES (%(key)s, %(burst)s - 1, %(now)s, TRUE)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = CASE WHEN {REFILL} >= 1 THEN {REFILL} - 1 ELSE {REFILL} END,
+            allowed = {REFILL} >= 1,
+            updated_at = %(now)s
+        RETURNING allowed, tokens
+    """
+
+    PURGE_SQL = "DELETE FROM rate_limits WHERE updated_at < %s"
+
+    def __init__(self, connection_factory, idle_expiry=3600):
+        self._connect = connection_factory
+        self.idle_expiry = idle_expiry
+
+    def consume(self, key, rate, burst, now):
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            cur.execute(self.CONSUME_SQL, {'key': key, 'rate': rate, 'burst': burst, 'now': now})
+            allowed, tokens = cur.fetchone()
+            conn.commit()
+            return allowed, tokens
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+
+    def purge(self, now):
+        """Delete buckets idle for ``idle_expiry`` seconds; they have refilled completely"""
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            cur.execute(self.PURGE_SQL, (now - self.idle_expiry,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+
+class DisabledBackend:
+    """Always allows; for load tests that replay many logins from one address"""
+
+    def consume(self, key, rate, burst, now):
+        return True, burst
+
+    def purge(self, now):
+        pass
+
+
+class RateLimiter:
+    """Token-bucket limiter; ``rate`` is tokens per second, ``burst`` the bucket size"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def hit(self, key, rate, burst):
+        """Consume one token for ``key``; returns (allowed, retry_after_seconds)"""
+        try:
+            allowed, tokens = self.backend.consume(key, float(rate), float(burst), time.time())
+        except Exception as e:
+            # Never turn a limiter outage into a login outage
+            logger.error(f"Rate limiter backend error: {str(e)}")
+            return True, 0
+        retry_after = 0 if allowed else max(1, int((1 - tokens) / rate) + 1)
+        return allowed, retry_after
+
+    def purge(self):
+        """Drop idle buckets; run periodically by the KPI refresher thread (see app.py)"""
+        self.backend.purge(time.time())
+
+
+def create_rate_limiter(connection_factory=None):
+    """Build the limiter selected by RATE_LIMIT_BACKEND (local | database | off)"""
+    backend_name = os.getenv('RATE_LIMIT_BACKEND', 'local').lower()
+    # Must cover the longest (count, seconds) window used with @rate_limit
+    idle_expiry = float(os.getenv('RATE_LIMIT_IDLE_SECONDS', 3600))
+    if backend_name == 'off':
+        logger.warning("Rate limiting is disabled (RATE_LIMIT_BACKEND=off)")
+        return RateLimiter(DisabledBackend())
+    if backend_name == 'database' and connection_factory is not None:
+        return RateLimiter(DatabaseBackend(connection_factory, idle_expiry))
+    return RateLimiter(LocalBackend(idle_expiry=idle_expiry))
+
+
+def main():
+    import argparse
+
+    from migrate import connect_from_env
+
+    parser = argparse.ArgumentParser(description='Rate-limit bucket maintenance')
+    parser.add_argument('command', choices=('purge',))
+    parser.parse_args()
+
+    DatabaseBackend(connect_from_env, float(os.getenv('RATE_LIMIT_IDLE_SECONDS', 3600))).purge(time.time())
+    print("Idle rate-limit buckets removed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Reports, company status and the snapshot-backed analytics API."""
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, request, session, jsonify
+
+import kpi_views
+from reports import aggregate_report
+import analytics
+from app import (analytics_store, cached_json, convert_to_pln, get_db_connection,
+                 login_required, pln_rate)
+
+bp = Blueprint('reporting', __name__)
+
+# Endpoint for company status
+@bp.route('/api/companies/<int:company_id>/status', methods=['GET'])
+@login_required
+def api_company_status(company_id):
+    """Endpoint to check company status (the caller's own company only)"""
+    if company_id != session['company_id']:
+        return jsonify({'error': 'Forbidden'}), 403
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        projects = kpi_views.fetch_project_kpis(cur, company_id, pln_rate)
+        return jsonify(projects)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error fetching dashboard data: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+# Reporting routes
+@bp.route('/reporting')
+@login_required
+def reporting():
+    """Reporting page"""
+    return render_template('reporting.html')
+
+@bp.route('/api/report-data')
+@login_required
+@cached_json
+def report_data():
+    """API for report data"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Monthly per-project/currency totals from the materialized ledger view
+        incomes, project_expenses, general_expenses = kpi_views.fetch_monthly_ledger(cur, session['company_id'])
+        
+        return jsonify(aggregate_report(incomes, project_expenses, general_expenses, convert_to_pln))
+    except Exception as e:
+        current_app.logger.error(f"Error generating reports: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+def load_analytics_snapshot():
+    """Tables and state of the current tenant's snapshot, taken on first use"""
+    company_id = session['company_id']
+    tables, state = analytics_store.load(company_id)
+    if tables is None:
+        conn = get_db_connection()
+        try:
+            analytics_store.refresh(conn, company_id, wait=True)
+        finally:
+            conn.close()
+        tables, state = analytics_store.load(company_id)
+    return tables, state
+
+def analytics_date_range():
+    """from/to query arguments as dates (ValueError if malformed)"""
+    parse = lambda value: datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    return parse(request.args.get('from')), parse(request.args.get('to'))
+
+def snapshot_info(state):
+    return {
+        'refreshed_at': state['refreshed_at'],
+        'rows': {table: entry['rows'] for table, entry in state['tables'].items()}
+    }
+
+@bp.route('/api/analytics/summary')
+@login_required
+def analytics_summary():
+    """PLN totals grouped by ?group_by=project,month,year,currency,type, optionally within ?from=&to="""
+    if not analytics.available():
+        return jsonify({'error': 'Analytics are not available on this server'}), 503
+    group_by = [key for key in request.args.get('group_by', 'month').split(',') if key]
+    unknown = [key for key in group_by if key not in analytics.GROUP_KEYS]
+    if not group_by or unknown or len(set(group_by)) != len(group_by):
+        return jsonify({'error': f"group_by must list distinct keys from {', '.join(analytics.GROUP_KEYS)}"}), 400
+    try:
+        date_from, date_to = analytics_date_range()
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD'}), 400
+    try:
+        tables, state = load_analytics_snapshot()
+        rows = analytics.summarize(tables, pln_rate, group_by, date_from, date_to)
+        return jsonify({'group_by': group_by, 'rows': rows, 'snapshot': snapshot_info(state)})
+    except Exception as e:
+        current_app.logger.error(f"Error running analytics summary: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/analytics/cohorts')
+@login_required
+def analytics_cohorts():
+    """Project profit by start-month cohort and project age in months"""
+    if not analytics.available():
+        return jsonify({'error': 'Analytics are not available on this server'}), 503
+    try:
+        date_from, date_to = analytics_date_range()
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD'}), 400
+    try:
+        tables, state = load_analytics_snapshot()
+        cohorts = analytics.cohort_profit(tables, pln_rate, date_from, date_to)
+        return jsonify({'cohorts': cohorts, 'snapshot': snapshot_info(state)})
+    except Exception as e:
+        current_app.logger.error(f"Error running cohort analytics: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/analytics/refresh', methods=['POST'])
+@login_required
+def analytics_refresh():
+    """Append the tenant's rows newer than the snapshot watermark now instead of waiting for the refresher"""
+    if not analytics.available():
+        return jsonify({'error': 'Analytics are not available on this server'}), 503
+    conn = get_db_connection()
+    try:
+        appended = analytics_store.refresh(conn, session['company_id'], wait=True)
+        return jsonify({'appended': appended, 'snapshot': snapshot_info(analytics_store.state(session['company_id']))})
+    except Exception as e:
+        current_app.logger.error(f"Error refreshing analytics snapshot: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
@@ -0,0 +1,170 @@
+"""Monthly / yearly / per-project aggregation behind /api/report-data.
+
+Large tenants go through a NumPy kernel: dates, amounts, currency codes and
+project names become typed arrays, currencies are converted by indexing a
+rate vector and the groupings are ``bincount`` sums over integer codes.
+Rows are accumulated in the same order as the row loop, so both paths
+produce identical output.  Without NumPy (or for small inputs, where array
+set-up costs more than it saves) the row loop is used.
+"""
+import os
+from datetime import date
+from itertools import chain
+from operator import itemgetter
+
+from lazy import optional_import
+
+# Optional, imported on the first vectorised report; the row loop handles every input
+np = optional_import('numpy')
+
+VECTORIZE_MIN_ROWS = int(os.getenv('REPORT_VECTORIZE_MIN_ROWS', 500))
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _rate_lookup(convert):
+    """PLN rate per currency, resolved once per report instead of once per row"""
+    rates = {}
+
+    def rate(currency):
+        value = rates.get(currency)
+        if value is None:
+            value = rates[currency] = convert(1, currency)
+        return value
+    return rate
+
+
+def _bucket(buckets, key):
+    entry = buckets.get(key)
+    if entry is None:
+        entry = buckets[key] = {'income': 0, 'expenses': 0, 'profit': 0}
+    return entry
+
+
+def _rows(buckets, label):
+    return [{
+        label: k,
+        'income': round(v['income'], 2),
+        'expenses': round(v['expenses'], 2),
+        'profit': round(v['profit'], 2)
+    } for k, v in buckets]
+
+
+def _aggregate_rows(incomes, project_expenses, general_expenses, rate):
+    monthly_data = {}
+    yearly_data = {}
+    project_data = {}
+
+    for day, amount, currency, project in incomes:
+        amount = float(amount) * rate(currency)
+        for entry in (_bucket(monthly_data, day.strftime('%Y-%m')),
+                      _bucket(yearly_data, day.strftime('%Y')),
+                      _bucket(project_data, project)):
+            entry['income'] += amount
+            entry['profit'] += amount
+
+    for day, amount, currency, project in project_expenses:
+        amount = float(amount) * rate(currency)
+        for entry in (_bucket(monthly_data, day.strftime('%Y-%m')),
+                      _bucket(yearly_data, day.strftime('%Y')),
+                      _bucket(project_data, project)):
+            entry['expenses'] += amount
+            entry['profit'] -= amount
+
+    # General expenses are not tied to a project
+    for day, amount, currency in general_expenses:
+        amount = float(amount) * rate(currency)
+        for entry in (_bucket(monthly_data, day.strftime('%Y-%m')),
+                      _bucket(yearly_data, day.strftime('%Y'))):
+            entry['expenses'] += amount
+            entry['profit'] -= amount
+
+    return {
+        'monthly': _rows(sorted(monthly_data.items()), 'month'),
+        'yearly': _rows(sorted(yearly_data.items()), 'year'),
+        'projects': _rows(project_data.items(), 'project')
+    }
+
+
+def _column(streams, index):
+    return list(map(itemgetter(index), chain(*streams)))
+
+
+def _codes(values):
+    """Distinct values in first-seen order and the code of every value"""
+    index = {value: code for code, value in enumerate(dict.fromkeys(values))}
+    return list(index), np.fromiter(map(index.__getitem__, values), dtype=np.intp, count=len(values))
+
+
+def _periods(days, unit):
+    """Sorted 'YYYY-MM' / 'YYYY' labels and the code of every day"""
+    values = days.astype(f'datetime64[{unit}]').view(np.int64)
+    low = values.min()
+    present = np.flatnonzero(np.bincount(values - low))
+    remap = np.zeros(present[-1] + 1, dtype=np.intp)
+    remap[present] = np.arange(len(present))
+    labels = np.datetime_as_string((present + low).astype(f'datetime64[{unit}]'), unit=unit)
+    return list(labels), remap[values - low]
+
+
+def _grouped(labels, codes, signed, is_income, label):
+    """Report rows for one grouping; ``codes`` index ``labels`` per input row"""
+    size = len(labels)
+    income = np.bincount(codes, weights=np.where(is_income, signed, 0.0), minlength=size)
+    expenses = np.bincount(codes, weights=np.where(is_income, 0.0, -signed), minlength=size)
+    profit = np.bincount(codes, weights=signed, minlength=size)
+    income_rows = np.bincount(codes, weights=is_income, minlength=size)
+    expense_rows = np.bincount(codes, minlength=size) - income_rows
+    # The row loop starts every bucket at int 0; keep that for untouched sides
+    return [{
+        label: labels[i],
+        'income': round(float(income[i]), 2) if income_rows[i] else 0,
+        'expenses': round(float(expenses[i]), 2) if expense_rows[i] else 0,
+        'profit': round(float(profit[i]), 2)
+    } for i in range(size)]
+
+
+def _aggregate_vectorized(incomes, project_expenses, general_expenses, rate):
+    ledgers = (incomes, project_expenses, general_expenses)
+    total = len(incomes) + len(project_expenses) + len(general_expenses)
+    n_income, n_projected = len(incomes), len(incomes) + len(project_expenses)
+    if not total:
+        return {'monthly': [], 'yearly': [], 'projects': []}
+
+    ordinals = np.fromiter(map(date.toordinal, map(itemgetter(0), chain(*ledgers))), dtype=np.int64, count=total)
+    days = (ordinals - _EPOCH).view('datetime64[D]')
+    amounts = np.fromiter(map(float, map(itemgetter(1), chain(*ledgers))), dtype=np.float64, count=total)
+    currencies, currency_codes = _codes(_column(ledgers, 2))
+    pln = amounts * np.array([rate(currency) for currency in currencies], dtype=np.float64)[currency_codes]
+
+    # Income adds, expenses subtract: summing the signed amounts in input order
+    # reproduces the row loop's running profit bit for bit
+    is_income = np.zeros(total, dtype=bool)
+    is_income[:n_income] = True
+    signed = np.where(is_income, pln, -pln)
+
+    monthly = _grouped(*_periods(days, 'M'), signed, is_income, 'month')
+    yearly = _grouped(*_periods(days, 'Y'), signed, is_income, 'year')
+    projects = []
+    if n_projected:
+        projects = _grouped(*_codes(_column(ledgers[:2], 3)), signed[:n_projected],
+                            is_income[:n_projected], 'project')
+
+    return {'monthly': monthly, 'yearly': yearly, 'projects': projects}
+
+
+def aggregate_report(incomes, project_expenses, general_expenses, convert, vectorize=None):
+    """Totals in PLN by month, year and project.
+
+    ``incomes`` and ``project_expenses`` are (date, amount, currency, project)
+    rows, ``general_expenses`` (date, amount, currency) rows; ``convert`` maps
+    (amount, currency) to PLN.  ``vectorize`` forces (True) or disables
+    (False) the NumPy kernel; by default it is used from
+    REPORT_VECTORIZE_MIN_ROWS rows on.
+    """
+    rate = _rate_lookup(convert)
+    if vectorize is None:
+        total = len(incomes) + len(project_expenses) + len(general_expenses)
+        vectorize = total >= VECTORIZE_MIN_ROWS
+    if vectorize and np is not None:
+        return _aggregate_vectorized(incomes, project_expenses, general_expenses, rate)
+    return _aggregate_rows(incomes, project_expenses, general_expenses, rate)
@@ -0,0 +1,92 @@
+"""Per-tenant cache of JSON API responses, validated by a data version.
+
+Every write to a tenant's data bumps its row in ``tenant_data_versions`` in
+the same transaction (``bump_data_version``).  A cached response is only
+served while the tenant's version, the KPI views' refresh time (responses
+may be built from them) and the current TTL window are the ones it was
+built under; the three are folded into the ETag, so any worker can answer
+``If-None-Match`` with 304 after one version lookup, cached body or not.
+The TTL window also bounds how long PLN figures keep using old FX rates.
+
+Each bump is also published with ``pg_notify`` so open dashboards are told
+about the change (see change_feed.py) instead of polling for it.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# LISTEN/NOTIFY channel carrying one JSON payload per bump
+CHANGES_CHANNEL = 'tenant_changes'
+
+VERSION_SQL = """
+    SELECT COALESCE((SELECT version FROM tenant_data_versions WHERE company_id = %s), 0),
+           COALESCE((SELECT EXTRACT(EPOCH FROM refreshed_at) FROM kpi_refresh_state WHERE id = 1), 0)
+"""
+
+
+def tenant_version(cur, company_id):
+    """The tenant's write counter alone (the id of its change_feed events)"""
+    cur.execute("SELECT version FROM tenant_data_versions WHERE company_id = %s", (company_id,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def data_version(cur, company_id):
+    """Opaque version of everything a tenant's cached responses are built from"""
+    cur.execute(VERSION_SQL, (company_id,))
+    version, kpis_refreshed = cur.fetchone()
+    return f"{version}.{float(kpis_refreshed):.3f}"
+
+
+def bump_data_version(cur, company_id, topic='data', project_id=None):
+    """Invalidate the tenant's cached responses once the caller's transaction commits
+
+    Also queues a ``NOTIFY`` on ``CHANGES_CHANNEL`` (delivered only on commit)
+    for change_feed.ChangeFeed to push to the tenant's open dashboards.
+    """
+    cur.execute("""
+        WITH bumped AS (
+            INSERT INTO tenant_data_versions (company_id, version) VALUES (%s, 1)
+            ON CONFLICT (company_id) DO UPDATE
+            SET version = tenant_data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+            RETURNING company_id, version
+        )
+        SELECT pg_notify(%s, json_build_object(
+            'company_id', company_id, 'version', version, 'topic', %s, 'project_id', %s,
+            'txid', txid_current()
+        )::text)
+        FROM bumped
+    """, (company_id, CHANGES_CHANNEL, topic, project_id))
+
+
+class ResponseCache:
+    """LRU of response bodies keyed by (company_id, endpoint, params), each tagged with its ETag"""
+
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def etag(self, key, version):
+        window = int(time.time() // self.ttl) if self.ttl > 0 else 0
+        return hashlib.sha256(repr((key, version, window)).encode('utf-8')).hexdigest()[:32]
+
+    def lookup(self, key, version):
+        """(etag, (body, mimetype) or None) for the current version of ``key``"""
+        etag = self.etag(key, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return etag, None
+            self._entries.move_to_end(key)
+            return etag, entry[1]
+
+    def store(self, key, etag, body, mimetype):
+        with self._lock:
+            self._entries[key] = (etag, (body, mimetype))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
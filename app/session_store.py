@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, date
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+# Resolves everything a request handler usually needs about the logged-in user
+# in a single round trip (user + company + latest subscription + plan).
+CONTEXT_QUERY = """
+    SELECT u.id, u.company_id, u.first_name, u.last_name, u.email,
+           u.is_admin, u.role, u.email_verified,
+           c.name, c.email, c.country, c.industry, c.is_active,
+           s.status, s.current_period_end,
+           p.id, p.name, p.features
+    FROM users u
+    JOIN companies c ON u.company_id = c.id
+    LEFT JOIN subscriptions s ON c.id = s.company_id
+    LEFT JOIN plans p ON s.plan_id = p.id
+    WHERE u.id = %s
+    ORDER BY s.created_at DESC NULLS LAST
+    LIMIT 1
+"""
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _row_to_context(row):
+    """Convert the CONTEXT_QUERY row into a plain, JSON-serializable dict"""
+    features = row[17]
+    if isinstance(features, str):
+        try:
+            features = json.loads(features)
+        except ValueError:
+            features = {}
+    return {
+        'user_id': row[0],
+        'company_id': row[1],
+        'first_name': row[2],
+        'last_name': row[3],
+        'email': row[4],
+        'is_admin': bool(row[5]),
+        'role': row[6],
+        'email_verified': bool(row[7]),
+        'company_name': row[8],
+        'company_email': row[9],
+        'country': row[10],
+        'industry': row[11],
+        'company_active': bool(row[12]),
+        'subscription_status': row[13],
+        'current_period_end': row[14].isoformat() if row[14] else None,
+        'plan_id': row[15],
+        'plan_name': row[16],
+        'plan_features': features or {},
+    }
+
+
+class SessionStore:
+    """Server-side session store: PostgreSQL table with an in-process LRU in front.
+
+    The signed Flask cookie only carries an opaque session id (``session['sid']``);
+    the resolved user/company/plan context lives in ``user_sessions`` and is cached
+    locally for ``cache_ttl`` seconds so most requests cost zero queries.  Local
+    entries are re-validated against the table after the TTL, which bounds how
+    long a revocation done in another worker process can go unnoticed.
+    """
+
+    def __init__(self, connection_factory, max_entries=None, cache_ttl=None, lifetime=None):
+        self._connect = connection_factory
+        self.max_entries = max_entries or int(os.getenv('SESSION_CACHE_SIZE', 2048))
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv('SESSION_CACHE_TTL', 30))
+        self.lifetime = lifetime or timedelta(hours=int(os.getenv('SESSION_LIFETIME_HOURS', 24)))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ----- local LRU -----
+    def _cache_get(self, sid):
+        with self._lock:
+            entry = self._cache.get(sid)
+            if entry is None:
+                return None
+            loaded_at, context = entry
+            if monotonic() - loaded_at > self.cache_ttl:
+                del self._cache[sid]
+                return None
+            self._cache.move_to_end(sid)
+            return context
+
+    def _cache_put(self, sid, context):
+        with self._lock:
+            self._cache[sid] = (monotonic(), context)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _cache_drop(self, predicate):
+        with self._lock:
+            for sid in [k for k, (_, ctx) in self._cache.items() if predicate(k, ctx)]:
+                del self._cache[sid]
+
+    # ----- context resolution -----
+    def resolve_context(self, cur, user_id):
+        """Load the user/company/plan context for ``user_id`` using an open cursor"""
+        cur.execute(CONTEXT_QUERY, (user_id,))
+        row = cur.fetchone()
+        return _row_to_context(row) if row else None
+
+    def create(self, user_id, context=None):
+        """Create a server-side session for ``user_id`` and return its id"""
+        sid = secrets.token_urlsafe(32)
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            if context is None:
+                context = self.resolve_context(cur, user_id)
+            if context is None:
+                return None
+            cur.execute("""
+                INSERT INTO user_sessions (id, user_id, company_id, context, expires_at)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (sid, user_id, context['company_id'],
+                  json.dumps(context, default=_json_default),
+                  datetime.now() + self.lifetime))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+        self._cache_put(sid, context)
+        return sid
+
+    def get(self, sid):
+        """Return the cached context for ``sid`` or None if unknown, expired or revoked"""
+        if not sid:
+            return None
+        context = self._cache_get(sid)
+        if context is not None:
+            return context
+
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT user_id, context FROM user_sessions
+                WHERE id = %s AND expires_at > %s
+            """, (sid, datetime.now()))
+            row = cur.fetchone()
+            if not row:
+                return None
+            context = row[1]
+            if context is None:
+                # Invalidated (e.g. plan or subscription change): rebuild in place
+                context = self.resolve_context(cur, row[0])
+                if context is None:
+                    cur.execute("DELETE FROM user_sessions WHERE id = %s", (sid,))
+                    conn.commit()
+                    return None
+                cur.execute("UPDATE user_sessions SET context = %s WHERE id = %s",
+                            (json.dumps(context, default=_json_default), sid))
+                conn.commit()
+            elif isinstance(context, str):
+                context = json.loads(context)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error loading session: {str(e)}")
+            return None
+        finally:
+            cur.close()
+            conn.close()
+
+        self._cache_put(sid, context)
+        return context
+
+    # ----- revocation / invalidation -----
+    def _execute(self, statement, params):
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            cur.execute(statement, params)
+            conn.commit()
+            return cur.rowcount
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Session store error: {str(e)}")
+            return None
+        finally:
+            cur.close()
+            conn.close()
+
+    def revoke(self, sid):
+        """Delete a single session (logout)"""
+        if not sid:
+            return
+        self._cache_drop(lambda k, ctx: k == sid)
+        self._execute("DELETE FROM user_sessions WHERE id = %s", (sid,))
+
+    def revoke_user(self, user_id):
+        """Delete every session of a user (role change, removal)"""
+        self._cache_drop(lambda k, ctx: ctx.get('user_id') == user_id)
+        self._execute("DELETE FROM user_sessions WHERE user_id = %s", (user_id,))
+
+    def invalidate_company(self, company_id):
+        """Keep sessions alive but force the company's contexts to be re-resolved"""
+        try:
+            company_id = int(company_id)
+        except (TypeError, ValueError):
+            return
+        self._cache_drop(lambda k, ctx: ctx.get('company_id') == company_id)
+        self._execute("UPDATE user_sessions SET context = NULL WHERE company_id = %s", (company_id,))
+
+    def purge_expired(self):
+        """Remove expired rows and return how many, or None on error
+
+        Run periodically by the KPI refresher thread (see app.py).
+        """
+        return self._execute("DELETE FROM user_sessions WHERE expires_at <= %s", (datetime.now(),))
+
+
+def main():
+    import argparse
+
+    from migrate import connect_from_env
+
+    parser = argparse.ArgumentParser(description='Server-side session maintenance')
+    parser.add_argument('command', choices=('purge',))
+    parser.parse_args()
+
+    removed = SessionStore(connect_from_env).purge_expired()
+    if removed is None:
+        raise SystemExit("Purge failed (see log)")
+    print(f"Removed {removed} expired sessions")
+
+
+if __name__ == '__main__':
+    main()
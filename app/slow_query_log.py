@@ -0,0 +1,123 @@
+import os
+import random
+import re
+import threading
+import time
+
+from flask import has_request_context, request
+from psycopg2 import extensions
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s')
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+# Statements that do something besides reading when run: ANALYZE would do it
+# again (row locks, writes in a CTE, advisory locks, notifications, sequences)
+_SIDE_EFFECTS = re.compile(
+    r'\b(?:INSERT|UPDATE|DELETE|MERGE|FOR\s+(?:NO\s+KEY\s+)?UPDATE|FOR\s+(?:KEY\s+)?SHARE)\b'
+    r'|\b(?:pg_(?:try_)?advisory\w*|pg_notify|nextval|setval|txid_current|pg_current_xact_id|set_config'
+    r'|pg_sleep\w*|pg_cancel_backend|pg_terminate_backend|lo_\w+|dblink\w*)\s*\(',
+    re.I)
+
+
+def normalize_sql(query):
+    """Collapse a statement to its shape: no literals, placeholders or extra whitespace"""
+    text = _COMMENTS.sub(' ', query)
+    text = _STRINGS.sub('?', text)
+    text = _PLACEHOLDERS.sub('?', text)
+    text = _NUMBERS.sub('?', text)
+    text = _IN_LISTS.sub('(?...)', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def params_shape(params):
+    """Types of the bound parameters, never their values"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+class SlowQueryLog:
+    """Query observer that reports statements slower than ``threshold_ms``.
+
+    Each slow statement is logged (sampled by ``sample_rate``) with its
+    normalized SQL, parameter shape and row count.  SELECTs additionally get a
+    plan, at most once per fingerprint every ``explain_interval`` seconds and
+    ``max_explains_per_minute`` overall.  ANALYZE runs the query a second time,
+    so it is used only for plain reads, inside a transaction or savepoint that is
+    always rolled back; anything locking, writing or calling a side-effecting
+    function (see ``_SIDE_EFFECTS``) gets an estimated plan instead.
+    """
+
+    def __init__(self, logger, threshold_ms=None, sample_rate=None,
+                 explain_interval=None, max_explains_per_minute=None):
+        self.logger = logger
+        self.threshold = (threshold_ms if threshold_ms is not None
+                          else float(os.getenv('SLOW_QUERY_MS', 200))) / 1000
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('SLOW_QUERY_SAMPLE_RATE', 1.0))
+        self.explain_interval = explain_interval or float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+        self.max_explains = max_explains_per_minute or int(os.getenv('SLOW_QUERY_MAX_EXPLAINS_PER_MINUTE', 10))
+        self._last_explain = {}
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+
+    def __call__(self, cursor, query, params, duration, rows):
+        if duration < self.threshold or random.random() >= self.sample_rate:
+            return
+        if not isinstance(query, str):
+            query = query.as_string(cursor)
+        normalized = normalize_sql(query)
+        record = {
+            'duration_ms': round(duration * 1000, 2),
+            'sql': normalized,
+            'params_shape': params_shape(params),
+            'rows': rows,
+            'route': request.path if has_request_context() else None,
+        }
+        if normalized[:6].upper() == 'SELECT' and self._may_explain(normalized):
+            record['plan'] = self._explain(cursor, query, params, analyze=not _SIDE_EFFECTS.search(normalized))
+        self.logger.warning(f"Slow query ({record['duration_ms']} ms): {normalized[:200]}", extra=record)
+
+    def _may_explain(self, fingerprint):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_explain.get(fingerprint, -self.explain_interval) < self.explain_interval:
+                return False
+            window_start, count = self._window
+            if now - window_start >= 60:
+                window_start, count = now, 0
+            if count >= self.max_explains:
+                return False
+            self._window = (window_start, count + 1)
+            self._last_explain[fingerprint] = now
+            return True
+
+    @staticmethod
+    def _explain(cursor, query, params, analyze=True):
+        conn = cursor.connection
+        if conn.closed or conn.get_transaction_status() == extensions.TRANSACTION_STATUS_INERROR:
+            return None
+        # A plain cursor, so the EXPLAIN is not observed (and timed) again.  The
+        # re-run is always undone: a savepoint inside the caller's transaction,
+        # its own transaction on an autocommit connection
+        explain_cursor = conn.cursor(cursor_factory=extensions.cursor)
+        begin, undo = (('BEGIN', 'ROLLBACK') if conn.autocommit
+                       else ('SAVEPOINT slow_query_explain', 'ROLLBACK TO SAVEPOINT slow_query_explain'))
+        options = '(ANALYZE, BUFFERS)' if analyze else '(VERBOSE)'
+        try:
+            explain_cursor.execute(begin)
+            try:
+                explain_cursor.execute(f'EXPLAIN {options} ' + query, params)
+                return '\n'.join(row[0] for row in explain_cursor.fetchall())
+            finally:
+                explain_cursor.execute(undo)
+                if not conn.autocommit:
+                    explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        except Exception as e:
+            return f"EXPLAIN failed: {str(e)}"
+        finally:
+            explain_cursor.close()
@@ -2005,17 +2005,61 @@ function refreshDashboard() {
 
 // Add real-time dashboard updates
 function initializeRealTimeUpdates() {
-    // Polling interval (every 5 minutes)
+    // Polling interval (every 5 minutes), only used while the event stream is down
     const POLLING_INTERVAL = 5 * 60 * 1000;
-    
-    // Set up interval for data refresh
-    setInterval(() => {
-        // Only refresh if tab is visible
-        if (!document.hidden) {
-            console.log('Performing automatic data refresh');
-            fetchDashboardData();
+    // KPI figures arrive with the next view refresh ('kpis'); refetch anyway
+    // if it has not come this long after a change
+    const KPI_FALLBACK_DELAY = 30 * 1000;
+    let pollTimer = null;
+    let fallbackTimer = null;
+    let refreshWhenVisible = false;
+
+    function refreshVisible() {
+        // Only refresh if tab is visible, otherwise once it becomes visible
+        if (document.hidden) {
+            refreshWhenVisible = true;
+            return;
+        }
+        refreshWhenVisible = false;
+        clearTimeout(fallbackTimer);
+        fallbackTimer = null;
+        console.log('Performing automatic data refresh');
+        fetchDashboardData().then(updateLastUpdatedTime);
+    }
+
+    function startPolling() {
+        if (pollTimer === null) {
+            pollTimer = setInterval(refreshVisible, POLLING_INTERVAL);
+        }
+    }
+
+    function stopPolling() {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    }
+
+    document.addEventListener('visibilitychange', () => {
+        if (refreshWhenVisible && !document.hidden) {
+            refreshVisible();
         }
-    }, POLLING_INTERVAL);
+    });
+
+    if (window.EventSource) {
+        const events = new EventSource('/api/events');
+        events.addEventListener('open', stopPolling);
+        // The browser reconnects on its own; poll until it succeeds
+        events.addEventListener('error', startPolling);
+        events.addEventListener('change', (e) => {
+            const change = JSON.parse(e.data);
+            if (change.topic !== 'subscription' && fallbackTimer === null) {
+                fallbackTimer = setTimeout(refreshVisible, KPI_FALLBACK_DELAY);
+            }
+        });
+        events.addEventListener('kpis', refreshVisible);
+        events.addEventListener('resync', refreshVisible);
+    } else {
+        startPolling();
+    }
     
     // Add last updated timestamp
     addLastUpdatedIndicator();
@@ -0,0 +1,136 @@
+"""Jinja fragment cache, page cache storage and on-disk bytecode cache.
+
+``{% cache 'plan-cards', plans, subscription %} ... {% endcache %}`` renders
+its body once per distinct key and serves the stored HTML afterwards.  The
+key is made of the template, the fragment name, a digest of the fragment's
+own source (editing it invalidates), the current tenant (``scope``, so
+tenants never share a fragment) and every further argument: pass whatever
+the body reads, or a version of it.  Entries are evicted LRU beyond
+``max_entries`` and expire after ``ttl`` seconds.
+
+Compiled templates are kept as bytecode in TEMPLATE_CACHE_DIR, shared by all
+workers and restarts.  Fill it at deploy time with
+
+    python app/template_cache.py compile
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+import metrics
+
+
+class FragmentCache:
+    """LRU of rendered HTML with a per-entry TTL"""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def fragment_key(*parts):
+    # repr of the rows a fragment is built from is stable within a process
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+
+class FragmentCacheExtension(Extension):
+    """The ``{% cache name, *vary %}`` tag; no-op until ``environment.fragment_cache`` is set"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None, fragment_cache_scope=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        vary = []
+        while parser.stream.skip_if('comma'):
+            vary.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        source = hashlib.sha1(repr(body).encode('utf-8')).hexdigest()[:12]
+        args = [nodes.Const(parser.name), name, nodes.Const(source), nodes.List(vary)]
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, template, name, source, vary, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        scope = self.environment.fragment_cache_scope
+        key = fragment_key(template, name, source, scope() if scope else None, vary)
+        html = cache.get(key)
+        if html is None:
+            metrics.inc('template_cache_requests_total', {'kind': 'fragment', 'result': 'miss'})
+            html = caller()
+            cache.set(key, html)
+        else:
+            metrics.inc('template_cache_requests_total', {'kind': 'fragment', 'result': 'hit'})
+        return html
+
+
+def bytecode_cache():
+    directory = os.getenv('TEMPLATE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'ayist-jinja')
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+def precompile(environment):
+    """Compile every HTML template into the bytecode cache; number compiled"""
+    names = environment.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        environment.get_template(name)
+    return len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('compile',))
+    parser.parse_args()
+
+    # The app's own environment: bytecode depends on its autoescape and extensions
+    from app import create_app
+
+    environment = create_app().jinja_env
+    started = time.perf_counter()
+    count = precompile(environment)
+    print(f"Compiled {count} templates into {environment.bytecode_cache.directory} "
+          f"in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
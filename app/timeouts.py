@@ -0,0 +1,109 @@
+"""Per-route request deadlines.
+
+Every request gets a budget: REQUEST_TIMEOUT_SECONDS, or its endpoint's
+entry in ROUTE_TIMEOUTS (defaults below, overridden with e.g.
+``ROUTE_TIMEOUTS=ai.analyze_tender=60,reporting.report_data=10``; 0 means
+no deadline).  Database connections opened during a request get
+``statement_timeout`` set to what is left of it, whatever the worker class.
+Under gevent workers the request as a whole is interrupted too: ``init_app``
+arms a ``gevent.Timeout`` that fires at the next cooperative switch (socket,
+database, sleep) once the budget is spent, and the client gets a 504.  Sync
+workers cannot interrupt a request; there gunicorn's ``timeout``
+(gunicorn.conf.py) is the backstop.
+"""
+import os
+import time
+
+from flask import g, has_request_context, request
+from werkzeug.exceptions import GatewayTimeout
+
+import metrics
+
+try:
+    import gevent
+    from gevent import monkey
+except ImportError:
+    gevent = None
+
+# Endpoints whose normal work is slower than the default, or that do not end (event streams)
+DEFAULT_ROUTE_TIMEOUTS = {
+    'ai.analyze_tender': 120,
+    'reporting.analytics_summary': 120,
+    'reporting.analytics_cohorts': 120,
+    'reporting.analytics_refresh': 300,
+    'projects.tenant_events': 0,
+}
+
+
+class RequestTimeout(BaseException):
+    """Raised into a request's greenlet when its deadline passes
+
+    A BaseException, so the routes' ``except Exception`` handlers do not turn
+    it into their own error page; the WSGI wrapper answers 504.
+    """
+
+
+def route_timeouts():
+    """{endpoint: seconds} from DEFAULT_ROUTE_TIMEOUTS and ROUTE_TIMEOUTS"""
+    timeouts = dict(DEFAULT_ROUTE_TIMEOUTS)
+    for item in filter(None, os.getenv('ROUTE_TIMEOUTS', '').split(',')):
+        endpoint, _, seconds = item.partition('=')
+        timeouts[endpoint.strip()] = float(seconds)
+    return timeouts
+
+
+def remaining():
+    """Seconds left of the current request's budget, or None outside a request / without one"""
+    if not has_request_context():
+        return None
+    deadline = g.get('request_deadline')
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def statement_timeout_option():
+    """libpq ``options`` bounding every statement by the rest of the request's budget, or None"""
+    left = remaining()
+    if left is None:
+        return None
+    # 0 would disable the limit; a spent budget still gets a token allowance
+    return f"-c statement_timeout={max(int(left * 1000), 100)}"
+
+
+def _interruptible():
+    return gevent is not None and monkey.is_module_patched('socket')
+
+
+def init_app(app, default=30.0):
+    """Register the deadline hooks on ``app``"""
+    timeouts = route_timeouts()
+
+    @app.before_request
+    def _start_deadline():
+        budget = timeouts.get(request.endpoint, default)
+        if budget <= 0:
+            return
+        g.request_deadline = time.monotonic() + budget
+        if _interruptible():
+            g.request_timer = gevent.Timeout(budget, RequestTimeout)
+            g.request_timer.start()
+
+    @app.teardown_request
+    def _cancel_deadline(exc):
+        timer = g.pop('request_timer', None)
+        if timer is not None:
+            timer.close()
+        if isinstance(exc, RequestTimeout):
+            metrics.inc('http_request_timeouts_total', {'route': request.endpoint or 'unmatched'})
+            app.logger.warning(f"Request deadline exceeded: {request.method} {request.path}")
+
+    wsgi_app = app.wsgi_app
+
+    def deadline_wsgi_app(environ, start_response):
+        try:
+            return wsgi_app(environ, start_response)
+        except RequestTimeout:
+            return GatewayTimeout()(environ, start_response)
+
+    app.wsgi_app = deadline_wsgi_app
@@ -0,0 +1,72 @@
+"""Cold-start cost of ``import app``, as paid by every worker boot.
+
+Imports the app in fresh interpreters (``python -X importtime``) and prints
+the median and best wall time, then the packages with the largest
+cumulative import time in the last run.  Service clients (Stripe, Gemini,
+mail, cipher) are built on first use and do not appear here; a running
+worker reports them at /api/startup-stats.  Needs the app's requirements,
+not a database.
+
+    python benchmarks/bench_cold_start.py --runs 10 --top 15
+"""
+import argparse
+import base64
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+
+
+def import_once(env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=APP_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.exit(f"import app failed:\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr
+
+
+def top_level_imports(importtime_output, top):
+    """(cumulative seconds, package) of the slowest top-level packages"""
+    totals = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        package = name.strip().split('.')[0]
+        # Nested imports are indented; keep the outermost (largest) figure per package
+        totals[package] = max(totals.get(package, 0), int(cumulative) / 1e6)
+    return sorted(((seconds, package) for package, seconds in totals.items()), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('ENCRYPTION_KEY', base64.urlsafe_b64encode(os.urandom(32)).decode())
+    env.setdefault('SECRET_KEY', 'bench')
+
+    import_once(env)  # warm the OS file cache and __pycache__
+    times, output = [], ''
+    for _ in range(args.runs):
+        elapsed, output = import_once(env)
+        times.append(elapsed)
+
+    print(f"import app: median {statistics.median(times) * 1000:.0f} ms, "
+          f"best {min(times) * 1000:.0f} ms over {args.runs} runs (interpreter start included)")
+    print(f"\n{'cumulative ms':>14}  package")
+    for seconds, package in top_level_imports(output, args.top):
+        print(f"{seconds * 1000:>14.1f}  {package}")
+
+
+if __name__ == '__main__':
+    main()
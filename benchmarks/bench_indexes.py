@@ -0,0 +1,174 @@
+"""Before/after query plans for the composite indexes of migrations/0002_tenant_indexes.sql.
+
+Loads synthetic tenants into a throw-away schema of the configured PostgreSQL
+database (DB_* variables) with only the original foreign-key indexes, runs
+EXPLAIN (ANALYZE, BUFFERS) on the hot queries, applies the migration's
+statements and explains them again.
+
+    python benchmarks/bench_indexes.py --companies 200 --projects 10 --rows 200 [--plans]
+"""
+import argparse
+import os
+import re
+import sys
+
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from migrate import load_migrations, split_statements  # noqa: E402
+
+SCHEMA = 'bench_indexes'
+
+# The index set of the baseline schema before migration 0002
+BASELINE_INDEXES = """
+    CREATE INDEX idx_projects_company ON projects(company_id);
+    CREATE INDEX idx_tasks_project ON tasks(project_id);
+    CREATE INDEX idx_income_project ON income(project_id);
+    CREATE INDEX idx_expenses_project ON expenses(project_id);
+    CREATE INDEX idx_plan_changes_company ON plan_changes(company_id);
+"""
+
+HOT_QUERIES = [
+    ('projects list', "SELECT * FROM projects WHERE company_id = %(company_id)s ORDER BY start_date DESC"),
+    ('project income', "SELECT * FROM income WHERE project_id = %(project_id)s ORDER BY date DESC"),
+    ('project tasks', "SELECT COUNT(*), SUM(CASE WHEN status = 'Completed' THEN 1 ELSE 0 END) "
+                      "FROM tasks WHERE project_id = %(project_id)s"),
+    ('income duplicate check', "SELECT COUNT(*) FROM income WHERE date = %(date)s AND project_id = %(project_id)s"),
+    ('general expenses', "SELECT * FROM general_expenses WHERE company_id = %(company_id)s ORDER BY date DESC"),
+    ('invoices', "SELECT i.id, i.invoice_id, i.date, i.amount, p.name FROM income i "
+                 "JOIN projects p ON i.project_id = p.id WHERE p.company_id = %(company_id)s ORDER BY i.date DESC"),
+    ('payments', "SELECT id, amount, payment_date FROM payments WHERE company_id = %(company_id)s "
+                 "ORDER BY payment_date DESC"),
+    ('verification token', "SELECT id FROM users WHERE verification_token = %(token)s"),
+    ('reset token', "SELECT id FROM users WHERE reset_token = %(token)s"),
+]
+
+
+def index_migration():
+    return next(m for m in load_migrations() if m.name == 'tenant_indexes')
+
+
+def build(cur, companies, projects, rows):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    cur.execute("""
+        CREATE TABLE users (id SERIAL PRIMARY KEY, company_id INTEGER NOT NULL,
+                            verification_token TEXT, reset_token TEXT);
+        CREATE TABLE projects (id SERIAL PRIMARY KEY, company_id INTEGER NOT NULL, name TEXT NOT NULL,
+                               start_date DATE, end_date DATE);
+        CREATE TABLE tasks (id SERIAL PRIMARY KEY, project_id INTEGER NOT NULL, status TEXT NOT NULL);
+        CREATE TABLE income (id SERIAL PRIMARY KEY, project_id INTEGER NOT NULL, type TEXT, date DATE NOT NULL,
+                             amount NUMERIC(15, 2) NOT NULL, currency VARCHAR(3), invoice_id TEXT);
+        CREATE TABLE expenses (LIKE income INCLUDING ALL);
+        CREATE TABLE general_expenses (id SERIAL PRIMARY KEY, company_id INTEGER, type TEXT, date DATE NOT NULL,
+                                       amount NUMERIC(15, 2) NOT NULL, currency VARCHAR(3));
+        CREATE TABLE payments (id SERIAL PRIMARY KEY, company_id INTEGER NOT NULL, amount NUMERIC(10, 2),
+                               payment_date TIMESTAMP NOT NULL);
+        CREATE TABLE plan_changes (id SERIAL PRIMARY KEY, company_id INTEGER NOT NULL,
+                                   change_date TIMESTAMP NOT NULL);
+    """)
+    cur.execute(BASELINE_INDEXES)
+    # A handful of users per company, one in twenty with a pending token
+    cur.execute("""
+        INSERT INTO users (company_id, verification_token, reset_token)
+        SELECT 1 + g %% %(companies)s,
+               CASE WHEN g %% 20 = 0 THEN md5(g::text) END,
+               CASE WHEN g %% 20 = 1 THEN md5('r' || g) END
+        FROM generate_series(1, %(companies)s * 5) g
+    """, {'companies': companies})
+    cur.execute("""
+        INSERT INTO projects (company_id, name, start_date)
+        SELECT 1 + g %% %(companies)s, 'P' || g, DATE '2020-01-01' + (g %% 1500)
+        FROM generate_series(1, %(companies)s * %(projects)s) g
+    """, {'companies': companies, 'projects': projects})
+    total_projects = companies * projects
+    for table in ('income', 'expenses'):
+        cur.execute(f"""
+            INSERT INTO {table} (project_id, type, date, amount, currency, invoice_id)
+            SELECT 1 + g %% %(total)s, 'Service', DATE '2020-01-01' + (g %% 1500), g %% 997, 'PLN', 'INV' || g
+            FROM generate_series(1, %(total)s * %(rows)s) g
+        """, {'total': total_projects, 'rows': rows})
+    cur.execute("""
+        INSERT INTO general_expenses (company_id, type, date, amount, currency)
+        SELECT 1 + g %% %(companies)s, 'Rent', DATE '2020-01-01' + (g %% 1500), g %% 997, 'PLN'
+        FROM generate_series(1, %(companies)s * %(rows)s) g
+    """, {'companies': companies, 'rows': rows})
+    cur.execute("""
+        INSERT INTO tasks (project_id, status)
+        SELECT 1 + g %% %(total)s, CASE WHEN g %% 3 = 0 THEN 'Completed' ELSE 'Pending' END
+        FROM generate_series(1, %(total)s * 20) g
+    """, {'total': total_projects})
+    cur.execute("""
+        INSERT INTO payments (company_id, amount, payment_date)
+        SELECT 1 + g %% %(companies)s, 99, TIMESTAMP '2020-01-01' + g * INTERVAL '1 hour'
+        FROM generate_series(1, %(companies)s * 24) g
+    """, {'companies': companies})
+    cur.execute("ANALYZE")
+
+
+def explain(cur, query, params):
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+    plan = [row[0] for row in cur.fetchall()]
+    elapsed = next((float(m.group(1)) for line in plan
+                    for m in [re.search(r'Execution Time: ([\d.]+) ms', line)] if m), 0.0)
+    return plan, elapsed
+
+
+def run(cur, params, show_plans):
+    results = {}
+    for label, query in HOT_QUERIES:
+        plan, elapsed = explain(cur, query, params)
+        results[label] = (plan[0].strip(), elapsed)
+        if show_plans:
+            print(f"--- {label}")
+            print('\n'.join(plan))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--projects', type=int, default=10, help='projects per company')
+    parser.add_argument('--rows', type=int, default=200, help='income/expense rows per project')
+    parser.add_argument('--plans', action='store_true', help='print the full plans')
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = psycopg2.connect(host=os.getenv('DB_HOST'), database=os.getenv('DB_NAME'),
+                            user=os.getenv('DB_USER'), password=os.getenv('DB_PASSWORD'),
+                            port=os.getenv('DB_PORT', 5432))
+    cur = conn.cursor()
+    try:
+        build(cur, args.companies, args.projects, args.rows)
+        cur.execute("SELECT verification_token FROM users WHERE verification_token IS NOT NULL LIMIT 1")
+        params = {'company_id': 7, 'project_id': 7 + args.companies, 'date': '2021-01-01',
+                  'token': cur.fetchone()[0]}
+
+        print("== before")
+        before = run(cur, params, args.plans)
+        conn.commit()
+        conn.autocommit = True  # CREATE INDEX CONCURRENTLY cannot run in a transaction
+        cur.execute(f"SET search_path TO {SCHEMA}")
+        for statement in split_statements(index_migration().sql):
+            cur.execute(statement)
+        cur.execute("ANALYZE")
+        print("== after")
+        after = run(cur, params, args.plans)
+
+        print(f"\n{'query':<24} {'before ms':>10} {'after ms':>10}  plan (before -> after)")
+        for label, _ in HOT_QUERIES:
+            (plan_before, ms_before), (plan_after, ms_after) = before[label], after[label]
+            print(f"{label:<24} {ms_before:10.2f} {ms_after:10.2f}  "
+                  f"{plan_before.split('  (')[0]} -> {plan_after.split('  (')[0]}")
+    finally:
+        conn.rollback()
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Login throughput benchmark for the password hashing service.
+
+Reports logins/sec overall and per core for the configured (or given) hashing
+method, both inline and through the process pool.
+
+    python benchmarks/bench_password_hashing.py --method scrypt --logins 200
+    python benchmarks/bench_password_hashing.py --method pbkdf2:sha256:600000 --workers 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from password_hasher import PasswordHasher  # noqa: E402
+
+
+def run(hasher, pwhash, logins, concurrency):
+    """Verify ``logins`` passwords from ``concurrency`` request threads"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        results = list(threads.map(lambda _: hasher.verify(pwhash, 'Sup3r$ecret'), range(logins)))
+    elapsed = time.perf_counter() - start
+    assert all(results), "verification failed"
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--method', default=os.getenv('PASSWORD_HASH_METHOD', 'scrypt'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    inline = PasswordHasher(method=args.method, workers=0)
+    pooled = PasswordHasher(method=args.method, workers=args.workers)
+    pwhash = inline.hash('Sup3r$ecret')
+    cores = min(args.workers, os.cpu_count() or 1)
+
+    print(f"method={args.method} cores={os.cpu_count()} workers={args.workers}")
+    rate = run(inline, pwhash, max(args.logins // 4, 1), 1)
+    print(f"inline   : {rate:8.1f} logins/s  ({rate:8.1f} /core)")
+    pooled.verify(pwhash, 'warmup')
+    rate = run(pooled, pwhash, args.logins, args.concurrency)
+    print(f"pool     : {rate:8.1f} logins/s  ({rate / cores:8.1f} /core)")
+    pooled.shutdown()
+
+
+if __name__ == '__main__':
+    main()
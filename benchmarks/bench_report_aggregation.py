@@ -0,0 +1,77 @@
+"""Row loop vs NumPy kernel for the /api/report-data aggregation.
+
+Builds in-memory ledgers of increasing size (shaped like the rows the
+endpoint fetches: Decimal amounts, date objects, a handful of currencies and
+projects), checks that both paths return identical reports and prints the
+CPU time of each.  No database or network needed.
+
+    python benchmarks/bench_report_aggregation.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import reports  # noqa: E402
+
+RATES = {'PLN': 1.0, 'EUR': 4.28, 'USD': 3.94, 'GBP': 5.02, 'CHF': 4.46}
+
+
+def convert(amount, currency):
+    return float(amount) * RATES[currency]
+
+
+def ledger(count, seed, with_project=True, projects=200):
+    rng = random.Random(seed)
+    start = date(2019, 1, 1)
+    currencies = list(RATES)
+    rows = []
+    for _ in range(count):
+        row = (start + timedelta(days=rng.randrange(6 * 365)), Decimal(f"{rng.lognormvariate(7, 1):.2f}"),
+               rng.choices(currencies, (55, 20, 15, 7, 3))[0])
+        rows.append(row + (f"Project {rng.randrange(projects)}",) if with_project else row)
+    return rows
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        result = func()
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='total rows per run, comma separated')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if reports.np is None:
+        sys.exit("NumPy is not installed; only the row loop is available")
+
+    print(f"{'rows':>10} {'loop ms':>10} {'numpy ms':>10} {'speed-up':>9}  identical")
+    for size in (int(s) for s in args.sizes.split(',')):
+        incomes = ledger(size * 4 // 10, seed=1)
+        expenses = ledger(size * 5 // 10, seed=2)
+        general = ledger(size - len(incomes) - len(expenses), seed=3, with_project=False)
+        loop_s, expected = timed(lambda: reports.aggregate_report(incomes, expenses, general, convert,
+                                                                  vectorize=False), args.repeat)
+        numpy_s, actual = timed(lambda: reports.aggregate_report(incomes, expenses, general, convert,
+                                                                 vectorize=True), args.repeat)
+        print(f"{size:>10,} {loop_s * 1000:>10.1f} {numpy_s * 1000:>10.1f} {loop_s / max(numpy_s, 1e-9):>8.1f}x"
+              f"  {'yes' if actual == expected else 'NO'}")
+        if actual != expected:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
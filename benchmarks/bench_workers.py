@@ -0,0 +1,81 @@
+"""Sync vs gevent gunicorn workers on the load-test scenarios.
+
+Runs ``loadtest.py`` once per worker class (same tenants, mix, duration,
+worker count and fake-service latencies) and prints total and per-endpoint
+throughput and p95 side by side.  The fake FX and Stripe services answer after
+``--fx-latency`` / ``--stripe-latency`` seconds, standing in for the outbound
+calls that hold a sync worker for their whole duration.  Needs a database
+filled by ``datagen.py``.
+
+    python benchmarks/datagen.py --companies 200 --reset
+    python benchmarks/bench_workers.py --workers 4 --concurrency 64 --duration 30
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+LOADTEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest.py')
+WORKER_CLASSES = ('sync', 'gevent')
+
+
+def run_loadtest(worker_class, args, port):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as fh:
+        output = fh.name
+    try:
+        command = [sys.executable, LOADTEST, '--worker-class', worker_class, '--workers', str(args.workers),
+                   '--port', str(port), '--duration', str(args.duration), '--warmup', str(args.warmup),
+                   '--concurrency', str(args.concurrency), '--users', str(args.users), '--mix', args.mix,
+                   '--fx-latency', str(args.fx_latency), '--stripe-latency', str(args.stripe_latency),
+                   '--json', output]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(output, encoding='utf-8') as fh:
+            return json.load(fh)
+    finally:
+        os.remove(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='gunicorn workers per run')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--mix', default='dashboard=30,report=25,transactions=25,webhook=20')
+    parser.add_argument('--fx-latency', type=float, default=0.08)
+    parser.add_argument('--stripe-latency', type=float, default=0.15)
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--json', help='write both runs to this file')
+    args = parser.parse_args()
+
+    results = {}
+    for offset, worker_class in enumerate(WORKER_CLASSES):
+        print(f"{worker_class}: {args.workers} workers, {args.concurrency} clients, {args.duration:.0f}s ...",
+              flush=True)
+        results[worker_class] = run_loadtest(worker_class, args, args.port + offset)
+
+    endpoints = sorted({name for result in results.values() for name in result['endpoints']})
+    print(f"\n{'endpoint':<14}" + ''.join(f" {worker_class + ' rps':>11} {'p95 ms':>9} {'err':>5}"
+                                          for worker_class in WORKER_CLASSES))
+    for name in endpoints:
+        row = f"{name:<14}"
+        for worker_class in WORKER_CLASSES:
+            stats = results[worker_class]['endpoints'].get(name, {'rps': 0, 'p95_ms': 0, 'errors': 0})
+            row += f" {stats['rps']:>11.1f} {stats['p95_ms']:>9.1f} {stats['errors']:>5}"
+        print(row)
+    print(f"{'total':<14}" + ''.join(f" {results[worker_class]['total_rps']:>11.1f} {'':>9} {'':>5}"
+                                     for worker_class in WORKER_CLASSES))
+    sync_rps = results['sync']['total_rps']
+    if sync_rps:
+        print(f"\ngevent / sync throughput: {results['gevent']['total_rps'] / sync_rps:.2f}x")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump({'config': vars(args), 'runs': results}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
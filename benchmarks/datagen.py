@@ -0,0 +1,211 @@
+"""Synthetic multi-tenant data for local load and query testing.
+
+Populates companies, users, subscriptions, projects, tasks, income, expenses
+and general_expenses in the configured PostgreSQL database (DB_* variables)
+with production-like shapes:
+
+* tenant sizes follow a Pareto distribution (a few large tenants own most of
+  the rows, the long tail has a project or two),
+* amounts are log-normal, currencies weighted towards PLN with EUR/USD/GBP/CHF,
+* dates spread over ``--years`` years, with entries inside each project's span.
+
+Generated tenants use ``@load.test`` e-mail addresses and share the password
+``PASSWORD``; ``--reset`` removes them before generating.  Rows are loaded
+with COPY, one batch per tenant and table.
+
+    python benchmarks/datagen.py --companies 500 --years 4 --seed 7 --reset
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from import_sqlite import copy_rows  # noqa: E402
+from migrate import connect_from_env, migrate  # noqa: E402
+from password_hasher import PasswordHasher  # noqa: E402
+
+EMAIL_DOMAIN = 'load.test'
+PASSWORD = 'LoadTest#2024'
+
+CURRENCIES = (('PLN', 55), ('EUR', 20), ('USD', 15), ('GBP', 7), ('CHF', 3))
+PLAN_WEIGHTS = (('Free', 40), ('Basic', 35), ('Professional', 20), ('Enterprise', 5))
+COUNTRIES = (('PL', 60), ('DE', 15), ('BR', 10), ('US', 10), ('GB', 5))
+INDUSTRIES = ('Technology', 'Construction', 'Consulting', 'Retail', 'Logistics', 'Healthcare')
+INCOME_TYPES = ('Service', 'Product Sale', 'Consulting', 'Subscription', 'Extra Fees')
+EXPENSE_TYPES = ('Salaries', 'Software', 'Materials', 'Travel', 'Subcontractors', 'Marketing')
+GENERAL_TYPES = ('Rent', 'Utilities', 'Accounting', 'Insurance', 'Transport', 'Office Supplies')
+TASK_STATUSES = (('Completed', 45), ('In Progress', 25), ('Not Started', 30))
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def amount(rng, mu, sigma=1.1):
+    return round(math.exp(rng.gauss(mu, sigma)), 2)
+
+
+def random_date(rng, start, end):
+    span = max(0, (end - start).days)
+    return start + timedelta(days=rng.randint(0, span))
+
+
+def allocate_ids(cur, table, count):
+    cur.execute(f"SELECT nextval(pg_get_serial_sequence('{table}', 'id')) FROM generate_series(1, %s)", (count,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def plan_ids(cur):
+    cur.execute("SELECT name, id FROM plans")
+    return dict(cur.fetchall())
+
+
+def reset(cur):
+    """Delete every generated tenant and its rows"""
+    cur.execute("SELECT id FROM companies WHERE email LIKE %s", (f"%@{EMAIL_DOMAIN}",))
+    company_ids = [row[0] for row in cur.fetchall()]
+    if not company_ids:
+        return 0
+    # Children first: databases created by the old init_db() have no ON DELETE CASCADE
+    cur.execute("DELETE FROM audit_log WHERE company_id = ANY(%(ids)s) "
+                "OR user_id IN (SELECT id FROM users WHERE company_id = ANY(%(ids)s))", {'ids': company_ids})
+    for table in ('tasks', 'income', 'expenses'):
+        cur.execute(f"DELETE FROM {table} WHERE project_id IN "
+                    f"(SELECT id FROM projects WHERE company_id = ANY(%s))", (company_ids,))
+    for table in ('projects', 'general_expenses', 'plan_changes', 'payment_events', 'payments',
+                  'subscriptions', 'user_sessions', 'users', 'companies'):
+        column = 'id' if table == 'companies' else 'company_id'
+        cur.execute(f"DELETE FROM {table} WHERE {column} = ANY(%s)", (company_ids,))
+    return len(company_ids)
+
+
+def generate_tenant(cur, rng, index, company_id, plans, password_hash, args, today):
+    """Insert one tenant; returns {table: rows}"""
+    first_day = today - timedelta(days=365 * args.years)
+    size = min(rng.paretovariate(args.skew), args.max_scale)
+    plan = weighted(rng, PLAN_WEIGHTS)
+    registered = datetime.combine(random_date(rng, first_day, today - timedelta(days=30)), datetime.min.time())
+    paying = plan != 'Free'
+
+    copy_rows(cur, 'companies',
+              ('id', 'name', 'email', 'country', 'industry', 'stripe_customer_id', 'date_registered',
+               'is_active', 'plan_id'),
+              [(company_id, f"Load Tenant {index}", f"tenant{index}@{EMAIL_DOMAIN}", weighted(rng, COUNTRIES),
+                rng.choice(INDUSTRIES), f"cus_load_{company_id}", registered, True, plans.get(plan))])
+    if paying:
+        period_end = datetime.combine(today + timedelta(days=rng.randint(1, 30)), datetime.min.time())
+        copy_rows(cur, 'subscriptions',
+                  ('company_id', 'plan_id', 'stripe_subscription_id', 'status', 'current_period_start',
+                   'current_period_end'),
+                  [(company_id, plans.get(plan), f"sub_load_{company_id}", 'active',
+                    period_end - timedelta(days=30), period_end)])
+
+    user_count = 1 + min(args.max_users - 1, int(size * args.users_per_scale))
+    users = [(company_id, f"User{u}", f"Tenant{index}", f"user{u}@tenant{index}.{EMAIL_DOMAIN}", password_hash,
+              u == 0, True, 'Admin' if u == 0 else 'User')
+             for u in range(user_count)]
+    copy_rows(cur, 'users', ('company_id', 'first_name', 'last_name', 'email', 'password', 'is_admin',
+                             'email_verified', 'role'), users)
+
+    project_count = max(1, int(size * args.projects_per_scale))
+    project_ids = allocate_ids(cur, 'projects', project_count)
+    projects, income, expenses, tasks = [], [], [], []
+    home_currency = weighted(rng, CURRENCIES)
+    for n, project_id in enumerate(project_ids):
+        start = random_date(rng, max(first_day, registered.date()), today)
+        end = start + timedelta(days=rng.randint(30, 540))
+        projects.append((project_id, company_id, f"Project {n + 1}", f"Synthetic project {n + 1} of tenant {index}",
+                         start, end))
+        active_end = min(end, today)
+        volume = rng.lognormvariate(math.log(args.entries_per_project), 0.8)
+        for _ in range(max(1, int(volume))):
+            currency = home_currency if rng.random() < 0.7 else weighted(rng, CURRENCIES)
+            income.append((project_id, rng.choice(INCOME_TYPES), random_date(rng, start, active_end),
+                           amount(rng, 8.2), currency, None, None))
+        for _ in range(max(1, int(volume * 1.6))):
+            currency = home_currency if rng.random() < 0.7 else weighted(rng, CURRENCIES)
+            expenses.append((project_id, rng.choice(EXPENSE_TYPES), random_date(rng, start, active_end),
+                             amount(rng, 7.4), currency, None, None))
+        for t in range(rng.randint(3, 40)):
+            tasks.append((project_id, f"Task {t + 1}", None, random_date(rng, start, end),
+                          ' '.join(users[rng.randrange(user_count)][1:3]), weighted(rng, TASK_STATUSES)))
+    copy_rows(cur, 'projects', ('id', 'company_id', 'name', 'description', 'start_date', 'end_date'), projects)
+    ledger_columns = ('project_id', 'type', 'date', 'amount', 'currency', 'invoice_id', 'invoice_link')
+    copy_rows(cur, 'income', ledger_columns, income)
+    copy_rows(cur, 'expenses', ledger_columns, expenses)
+    copy_rows(cur, 'tasks', ('project_id', 'title', 'description', 'due_date', 'assigned_user', 'status'), tasks)
+
+    # Recurring monthly costs since registration, more kinds for bigger tenants
+    general = []
+    month = registered.date().replace(day=1)
+    while month <= today:
+        for kind in rng.sample(GENERAL_TYPES, k=min(len(GENERAL_TYPES), 1 + int(math.log1p(size)))):
+            general.append((company_id, kind, month + timedelta(days=rng.randint(0, 27)),
+                            amount(rng, 7.0, 0.6), home_currency, None))
+        month = (month + timedelta(days=32)).replace(day=1)
+    copy_rows(cur, 'general_expenses', ('company_id', 'type', 'date', 'amount', 'currency', 'description'), general)
+
+    return {'users': len(users), 'projects': len(projects), 'income': len(income), 'expenses': len(expenses),
+            'tasks': len(tasks), 'general_expenses': len(general)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--skew', type=float, default=1.16, help='Pareto shape; 1.16 gives the 80/20 rule')
+    parser.add_argument('--max-scale', type=float, default=150, help='cap on the largest tenant size factor')
+    parser.add_argument('--projects-per-scale', type=float, default=3)
+    parser.add_argument('--users-per-scale', type=float, default=2)
+    parser.add_argument('--max-users', type=int, default=50)
+    parser.add_argument('--entries-per-project', type=float, default=40, help='median income rows per project')
+    parser.add_argument('--reset', action='store_true', help='delete previously generated tenants first')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    migrate(connect_from_env)
+    conn = connect_from_env()
+    cur = conn.cursor()
+    try:
+        if args.reset:
+            print(f"Removed {reset(cur)} generated tenants")
+            conn.commit()
+        plans = plan_ids(cur)
+        password_hash = PasswordHasher(workers=0).hash(PASSWORD)
+        company_ids = allocate_ids(cur, 'companies', args.companies)
+        cur.execute("SELECT COALESCE(MAX(CAST(substring(email FROM 'tenant([0-9]+)@') AS INTEGER)), 0) "
+                    "FROM companies WHERE email LIKE %s", (f"%@{EMAIL_DOMAIN}",))
+        first_index = cur.fetchone()[0] + 1
+        today = date.today()
+
+        totals = {}
+        start = time.perf_counter()
+        for offset, company_id in enumerate(company_ids):
+            counts = generate_tenant(cur, rng, first_index + offset, company_id, plans, password_hash, args, today)
+            conn.commit()
+            for table, count in counts.items():
+                totals[table] = totals.get(table, 0) + count
+            if (offset + 1) % 50 == 0:
+                print(f"  {offset + 1}/{args.companies} tenants, {sum(totals.values()):,} rows")
+        cur.execute("ANALYZE")
+        conn.commit()
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    rows = sum(totals.values()) + args.companies
+    print(f"\nGenerated {args.companies} tenants in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    for table, count in totals.items():
+        print(f"  {table:<18} {count:>10,}")
+    print(f"Log in as userN@tenantM.{EMAIL_DOMAIN} with password {PASSWORD}")
+
+
+if __name__ == '__main__':
+    main()
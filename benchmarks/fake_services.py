@@ -0,0 +1,207 @@
+"""Local stand-ins for the external services the app calls.
+
+* FX: ``GET /latest?from=EUR&to=PLN`` answering like api.frankfurter.app
+  (point the app at it with FX_API_URL),
+* Stripe: the handful of REST calls the app makes (customers, subscription
+  retrieve/modify), enough for webhooks and checkout (STRIPE_API_BASE),
+* SMTP: a sink that accepts and counts every message (MAIL_SERVER/MAIL_PORT).
+
+Each can add a fixed latency to mimic the real round trip.  Run standalone to
+keep them up for a manually started server:
+
+    python benchmarks/fake_services.py --fx-latency 0.08 --stripe-latency 0.15
+"""
+import argparse
+import json
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Units of PLN per unit of currency
+FX_RATES_TO_PLN = {'PLN': 1.0, 'EUR': 4.28, 'USD': 3.94, 'GBP': 5.02, 'CHF': 4.46, 'BRL': 0.71}
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    counter = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.counter.add()
+
+
+class FxHandler(_JsonHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        source = query.get('from', ['EUR'])[0].upper()
+        target = query.get('to', ['PLN'])[0].upper()
+        if url.path != '/latest' or source not in FX_RATES_TO_PLN or target not in FX_RATES_TO_PLN:
+            return self._reply(404, {'message': 'not found'})
+        rate = round(FX_RATES_TO_PLN[source] / FX_RATES_TO_PLN[target], 5)
+        self._reply(200, {'amount': 1.0, 'base': source, 'date': time.strftime('%Y-%m-%d'),
+                          'rates': {target: rate}})
+
+
+class StripeHandler(_JsonHandler):
+    SUBSCRIPTION = re.compile(r'^/v1/subscriptions/([\w-]+)$')
+
+    def _subscription(self, subscription_id, **fields):
+        now = int(time.time())
+        company = subscription_id.rsplit('_', 1)[-1]
+        payload = {
+            'id': subscription_id, 'object': 'subscription', 'status': 'active',
+            'customer': f"cus_load_{company}", 'cancel_at_period_end': False,
+            'current_period_start': now, 'current_period_end': now + 30 * 86400,
+        }
+        payload.update(fields)
+        return payload
+
+    def _form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return {key: values[-1] for key, values in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+
+    def do_GET(self):
+        match = self.SUBSCRIPTION.match(urlparse(self.path).path)
+        if match:
+            return self._reply(200, self._subscription(match.group(1)))
+        self._reply(404, {'error': {'type': 'invalid_request_error', 'message': 'No such resource'}})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        form = self._form()
+        if path == '/v1/customers':
+            return self._reply(200, {'id': f"cus_fake_{int(time.time() * 1e6)}", 'object': 'customer',
+                                     'email': form.get('email')})
+        match = self.SUBSCRIPTION.match(path)
+        if match:
+            cancel = form.get('cancel_at_period_end', 'false') == 'true'
+            return self._reply(200, self._subscription(match.group(1), cancel_at_period_end=cancel))
+        self._reply(404, {'error': {'type': 'invalid_request_error', 'message': 'No such resource'}})
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: greet, accept every command, swallow DATA"""
+
+    counter = None
+
+    def _send(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        self._send('220 fake-smtp ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().upper()
+            if command.startswith('EHLO'):
+                self._send('250-fake-smtp')
+                self._send('250 SIZE 10485760')
+            elif command == 'DATA':
+                self._send('354 end with <CRLF>.<CRLF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                self.counter.add()
+                self._send('250 queued')
+            elif command == 'QUIT':
+                self._send('221 bye')
+                return
+            else:
+                self._send('250 ok')
+
+
+class _Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.value += 1
+
+
+class _ThreadingSmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeServices:
+    """FX, Stripe and SMTP fakes on free localhost ports, each in a daemon thread"""
+
+    def __init__(self, fx_latency=0.0, stripe_latency=0.0, host='127.0.0.1'):
+        self.host = host
+        self.counts = {'fx': _Counter(), 'stripe': _Counter(), 'smtp': _Counter()}
+        fx = type('Fx', (FxHandler,), {'latency': fx_latency, 'counter': self.counts['fx']})
+        stripe = type('Stripe', (StripeHandler,), {'latency': stripe_latency, 'counter': self.counts['stripe']})
+        smtp = type('Smtp', (SmtpHandler,), {'counter': self.counts['smtp']})
+        self.servers = {
+            'fx': ThreadingHTTPServer((host, 0), fx),
+            'stripe': ThreadingHTTPServer((host, 0), stripe),
+            'smtp': _ThreadingSmtpServer((host, 0), smtp),
+        }
+        for server in self.servers.values():
+            server.daemon_threads = True
+
+    def port(self, name):
+        return self.servers[name].server_address[1]
+
+    def start(self):
+        for server in self.servers.values():
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def env(self):
+        """Environment that points the app at the fakes"""
+        return {
+            'FX_API_URL': f"http://{self.host}:{self.port('fx')}",
+            'STRIPE_API_BASE': f"http://{self.host}:{self.port('stripe')}",
+            'MAIL_SERVER': self.host,
+            'MAIL_PORT': str(self.port('smtp')),
+            'MAIL_USE_TLS': 'False',
+            'MAIL_USE_SSL': 'False',
+            'MAIL_USERNAME': '',
+            'MAIL_PASSWORD': '',
+        }
+
+    def request_counts(self):
+        return {name: counter.value for name, counter in self.counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fx-latency', type=float, default=0.0, help='seconds added to every FX reply')
+    parser.add_argument('--stripe-latency', type=float, default=0.0, help='seconds added to every Stripe reply')
+    args = parser.parse_args()
+
+    fakes = FakeServices(args.fx_latency, args.stripe_latency).start()
+    for key, value in fakes.env().items():
+        print(f"{key}={value}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"requests so far: {fakes.request_counts()}")
+    except KeyboardInterrupt:
+        fakes.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""HTTP load test against a local server backed by generated tenants.
+
+Starts the fake FX/Stripe/SMTP services, launches the app pointed at them
+(or targets ``--base-url`` if a server is already running), logs in a sample
+of the users created by ``datagen.py`` and drives a weighted mix of
+
+* ``GET /dashboard``
+* ``GET /api/report-data``
+* ``GET /api/unified-transactions``
+* ``POST /api/subscriptions/webhook`` (signed subscription.updated and
+  invoice.payment_succeeded events for the generated subscriptions)
+
+from ``--concurrency`` client threads.  Reports throughput and latency
+percentiles per endpoint; ``--json`` writes the same numbers to a file.
+The harness serves the app with gunicorn (app/gunicorn.conf.py, worker class
+and count from ``--worker-class`` / ``--workers``), or with the development
+server for ``--server dev``.
+
+    python benchmarks/datagen.py --companies 200 --reset
+    python benchmarks/loadtest.py --duration 60 --concurrency 16 --users 64
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import psycopg2
+import requests
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from datagen import EMAIL_DOMAIN, PASSWORD  # noqa: E402
+from fake_services import FakeServices  # noqa: E402
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+DEFAULT_MIX = 'dashboard=30,report=25,transactions=25,webhook=20'
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def sign_webhook(payload, secret):
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode('utf-8'), f"{timestamp}.{payload}".encode('utf-8'),
+                         hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def webhook_event(tenant):
+    """Webhook payload for one generated subscription (signed by the caller)"""
+    company_id, subscription_id, customer_id = tenant
+    now = int(time.time())
+    if random.random() < 0.5:
+        event_type = 'customer.subscription.updated'
+        obj = {'id': subscription_id, 'object': 'subscription', 'customer': customer_id, 'status': 'active',
+               'current_period_end': now + 30 * 86400, 'cancel_at_period_end': random.random() < 0.1}
+    else:
+        event_type = 'invoice.payment_succeeded'
+        obj = {'id': f"in_load_{uuid.uuid4().hex}", 'object': 'invoice', 'customer': customer_id,
+               'subscription': subscription_id, 'amount_paid': random.choice((9900, 19900, 49900)),
+               'currency': 'pln', 'hosted_invoice_url': f"https://invoice.{EMAIL_DOMAIN}/{company_id}"}
+    return json.dumps({'id': f"evt_{uuid.uuid4().hex}", 'object': 'event', 'type': event_type,
+                       'created': now, 'data': {'object': obj}})
+
+
+def load_fixtures(users, seed):
+    """Sample login e-mails (tenants weighted by their user count) and paying subscriptions"""
+    load_dotenv()
+    conn = psycopg2.connect(host=os.getenv('DB_HOST'), database=os.getenv('DB_NAME'),
+                            user=os.getenv('DB_USER'), password=os.getenv('DB_PASSWORD'),
+                            port=os.getenv('DB_PORT', 5432))
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT setseed(%s)", (1 / (abs(seed) + 2),))
+        cur.execute("""
+            SELECT u.email FROM users u JOIN companies c ON c.id = u.company_id
+            WHERE c.email LIKE %s AND u.email_verified AND c.is_active
+            ORDER BY random() LIMIT %s
+        """, (f"%@{EMAIL_DOMAIN}", users))
+        emails = [row[0] for row in cur.fetchall()]
+        cur.execute("""
+            SELECT c.id, s.stripe_subscription_id, c.stripe_customer_id
+            FROM companies c JOIN subscriptions s ON s.company_id = c.id
+            WHERE c.email LIKE %s
+        """, (f"%@{EMAIL_DOMAIN}",))
+        tenants = cur.fetchall()
+    finally:
+        conn.close()
+    if not emails:
+        sys.exit("No generated tenants found; run benchmarks/datagen.py first")
+    return emails, tenants
+
+
+def start_server(port, extra_env, server='gunicorn', worker_class='gevent', workers=None):
+    env = dict(os.environ)
+    env.update(extra_env)
+    env.update({'FLASK_PORT': str(port), 'FLASK_HOST': '127.0.0.1', 'FLASK_DEBUG': 'False',
+                'RATE_LIMIT_BACKEND': 'off', 'NPLUSONE_DETECT': '0', 'STRIPE_SECRET_KEY': 'sk_test_load'})
+    env.setdefault('SECRET_KEY', secrets.token_hex(16))
+    if server == 'dev':
+        command = [sys.executable, 'app.py']
+    else:
+        env.update({'GUNICORN_BIND': f"127.0.0.1:{port}", 'GUNICORN_WORKER_CLASS': worker_class})
+        if workers:
+            env['WEB_CONCURRENCY'] = str(workers)
+        command = [sys.executable, '-m', 'gunicorn', 'wsgi:app']
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"Server exited with status {process.returncode}")
+        try:
+            requests.get(f"{base_url}/login", timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    sys.exit("Server did not come up within 60s")
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        rows = {}
+        for name, values in sorted(self.samples.items()):
+            ordered = sorted(values)
+            rows[name] = {
+                'requests': len(ordered),
+                'errors': self.errors.get(name, 0),
+                'rps': round(len(ordered) / elapsed, 2),
+                'p50_ms': round(percentile(ordered, 0.50) * 1000, 1),
+                'p90_ms': round(percentile(ordered, 0.90) * 1000, 1),
+                'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+                'max_ms': round(ordered[-1] * 1000, 1),
+            }
+        return rows
+
+
+def client(base_url, email, tenants, mix, secret, recorder, warmup_end, deadline, login_errors):
+    http = requests.Session()
+    response = http.post(f"{base_url}/login", data={'email': email, 'password': PASSWORD},
+                         allow_redirects=False, timeout=30)
+    if response.status_code != 302 or '/login' in response.headers.get('Location', ''):
+        login_errors.append(email)
+        return
+    names, weights = zip(*mix)
+    while time.monotonic() < deadline:
+        name = random.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            if name == 'dashboard':
+                response = http.get(f"{base_url}/dashboard", allow_redirects=False, timeout=60)
+            elif name == 'report':
+                response = http.get(f"{base_url}/api/report-data", allow_redirects=False, timeout=60)
+            elif name == 'transactions':
+                response = http.get(f"{base_url}/api/unified-transactions", allow_redirects=False, timeout=60)
+            else:
+                payload = webhook_event(random.choice(tenants))
+                response = requests.post(f"{base_url}/api/subscriptions/webhook", data=payload, timeout=60,
+                                         headers={'Content-Type': 'application/json',
+                                                  'Stripe-Signature': sign_webhook(payload, secret)})
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        if time.monotonic() >= warmup_end:
+            recorder.add(name, time.perf_counter() - started, ok)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', help='target a running server instead of starting one')
+    parser.add_argument('--port', type=int, default=5055, help='port for the server started by the harness')
+    parser.add_argument('--server', choices=('gunicorn', 'dev'), default='gunicorn',
+                        help='gunicorn with app/gunicorn.conf.py, or the development server')
+    parser.add_argument('--worker-class', choices=('gevent', 'sync'), default='gevent')
+    parser.add_argument('--workers', type=int, help='gunicorn workers (default: gunicorn.conf.py)')
+    parser.add_argument('--duration', type=float, default=60, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=64, help='distinct logins sampled from generated tenants')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"endpoint weights (default {DEFAULT_MIX})")
+    parser.add_argument('--fx-latency', type=float, default=0.08)
+    parser.add_argument('--stripe-latency', type=float, default=0.15)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    mix = [(name, float(weight)) for name, weight in (item.split('=') for item in args.mix.split(','))]
+    emails, tenants = load_fixtures(args.users, args.seed)
+    if not tenants:
+        mix = [(name, weight) for name, weight in mix if name != 'webhook']
+    secret = os.getenv('STRIPE_WEBHOOK_SECRET') or f"whsec_{secrets.token_hex(16)}"
+
+    fakes = FakeServices(args.fx_latency, args.stripe_latency).start()
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = start_server(args.port, dict(fakes.env(), STRIPE_WEBHOOK_SECRET=secret),
+                                        args.server, args.worker_class, args.workers)
+    try:
+        recorder, login_errors = Recorder(), []
+        start = time.monotonic()
+        warmup_end, deadline = start + args.warmup, start + args.warmup + args.duration
+        threads = [threading.Thread(target=client, daemon=True,
+                                    args=(base_url, emails[i % len(emails)], tenants, mix, secret, recorder,
+                                          warmup_end, deadline, login_errors))
+                   for i in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = max(0.001, time.monotonic() - warmup_end)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        fakes.stop()
+
+    results = recorder.summary(elapsed)
+    total = sum(row['requests'] for row in results.values())
+    print(f"\n{'endpoint':<14} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p90':>8} {'p95':>8} "
+          f"{'p99':>8} {'max':>8}  (ms)")
+    for name, row in results.items():
+        print(f"{name:<14} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p90_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}")
+    print(f"{'total':<14} {total:>7} {'':>5} {total / elapsed:>8.1f}")
+    print(f"fake service calls: {fakes.request_counts()}")
+    if login_errors:
+        print(f"{len(login_errors)} client(s) failed to log in, e.g. {login_errors[0]}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'elapsed_s': round(elapsed, 2), 'total_rps': round(total / elapsed, 2),
+                       'endpoints': results, 'fake_calls': fakes.request_counts(),
+                       'login_failures': len(login_errors)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Micro-benchmarks for the per-row / per-request helpers, with stored baselines.
+
+Each case is timed with ``timeit`` (best of ``--repeat`` runs, auto-ranged
+loop count) and reported in nanoseconds per call.  Results are compared with
+benchmarks/baselines.json; a case slower than its baseline by more than its
+threshold (``--threshold`` unless the case sets its own) fails the run.
+
+Timings are normalised by a fixed pure-Python calibration loop measured in
+the same run, so a baseline recorded on one machine stays meaningful on
+another.
+
+    python benchmarks/microbench.py                 # compare against baselines
+    python benchmarks/microbench.py --save          # record new baselines
+    python benchmarks/microbench.py -k report       # only cases matching "report"
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import date, timedelta
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+CURRENCIES = ('PLN', 'EUR', 'USD', 'GBP', 'CHF')
+RATES = {'PLN': 1.0, 'EUR': 4.28, 'USD': 3.94, 'GBP': 5.02, 'CHF': 4.46}
+
+CASES = []
+
+
+def case(name, threshold=None):
+    """Register ``setup() -> callable`` as a benchmark case"""
+    def register(setup):
+        CASES.append((name, setup, threshold))
+        return setup
+    return register
+
+
+def load_app():
+    """Import app.py with throw-away settings and a warm FX cache (no network, no database)"""
+    from cryptography.fernet import Fernet
+
+    scratch = tempfile.mkdtemp(prefix='microbench-')
+    os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+    os.environ.setdefault('SECRET_KEY', 'microbench')
+    os.environ.setdefault('LOG_DIR', os.path.join(scratch, 'logs'))
+    os.environ.setdefault('METRICS_DIR', os.path.join(scratch, 'metrics'))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as webapp
+
+    for currency, rate in RATES.items():
+        webapp.exchange_rate_cache[f"{currency}_PLN"] = (webapp.datetime.now(), rate)
+    return webapp
+
+
+def ledger_rows(count, seed=1, with_project=True):
+    rng = random.Random(seed)
+    start = date(2021, 1, 1)
+    rows = []
+    for _ in range(count):
+        row = (start + timedelta(days=rng.randrange(1460)), round(rng.lognormvariate(7, 1), 2),
+               rng.choice(CURRENCIES))
+        rows.append(row + (f"Project {rng.randrange(40)}",) if with_project else row)
+    return rows
+
+
+@case('calibration')
+def _calibration():
+    values = list(range(1000))
+    return lambda: sum(values)
+
+
+@case('convert_to_pln')
+def _convert_to_pln():
+    webapp = load_app()
+    convert, rows = webapp.convert_to_pln, ledger_rows(64, with_project=False)
+
+    def run():
+        for _, amount, currency in rows:
+            convert(amount, currency)
+    return run
+
+
+@case('get_exchange_rate_cached.hit')
+def _exchange_rate_hit():
+    webapp = load_app()
+    lookup = webapp.get_exchange_rate_cached
+    return lambda: lookup('EUR')
+
+
+@case('is_password_valid.valid')
+def _password_valid():
+    check = load_app().is_password_valid
+    return lambda: check('Sup3r$ecretPassw0rd')
+
+
+@case('is_password_valid.invalid')
+def _password_invalid():
+    check = load_app().is_password_valid
+    return lambda: check('alllowercase123')
+
+
+@case('validate_cnpj')
+def _validate_cnpj():
+    validate = load_app().validate_cnpj
+    return lambda: validate('11.222.333/0001-81')
+
+
+@case('encrypt_data', threshold=0.5)
+def _encrypt():
+    encrypt = load_app().encrypt_data
+    return lambda: encrypt('customer@example.com')
+
+
+@case('decrypt_data', threshold=0.5)
+def _decrypt():
+    webapp = load_app()
+    token = webapp.encrypt_data('customer@example.com')
+    return lambda: webapp.decrypt_data(token)
+
+
+@case('aggregate_report.10k')
+def _aggregate_report():
+    from reports import aggregate_report
+
+    webapp = load_app()
+    incomes, expenses = ledger_rows(4000, seed=1), ledger_rows(5000, seed=2)
+    general = ledger_rows(1000, seed=3, with_project=False)
+    return lambda: aggregate_report(incomes, expenses, general, webapp.convert_to_pln)
+
+
+@case('aggregate_report.rows.10k')
+def _aggregate_report_rows():
+    from reports import aggregate_report
+
+    webapp = load_app()
+    incomes, expenses = ledger_rows(4000, seed=1), ledger_rows(5000, seed=2)
+    general = ledger_rows(1000, seed=3, with_project=False)
+    return lambda: aggregate_report(incomes, expenses, general, webapp.convert_to_pln, vectorize=False)
+
+
+@case('summary_row_to_dict')
+def _summary_row():
+    from project_summary import summary_row_to_dict
+
+    today = date.today()
+    row = (1, 'Project', 'Description', date(2024, 1, 1), date(2030, 1, 1), 1000, 250, 750, 12, 5)
+    return lambda: summary_row_to_dict(row, today)
+
+
+def measure(func, repeat):
+    """Best nanoseconds per call over ``repeat`` auto-ranged runs"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern', help='only run cases whose name contains this')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown (0.25 = 25%%)')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--baselines', default=BASELINE_FILE)
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding='utf-8') as f:
+            baselines = json.load(f)
+
+    results = {}
+    for name, setup, _ in CASES:
+        if name == 'calibration' or not args.pattern or args.pattern in name:
+            results[name] = measure(setup(), args.repeat)
+
+    # Scale this machine's numbers onto the baseline machine
+    scale = baselines.get('calibration', results['calibration']) / results['calibration']
+    regressions = []
+    print(f"{'case':<32} {'ns/call':>12} {'baseline':>12} {'change':>8}")
+    for name, setup, threshold in CASES:
+        if name not in results or name == 'calibration':
+            continue
+        normalised = results[name] * scale
+        baseline = baselines.get(name)
+        if baseline is None:
+            print(f"{name:<32} {normalised:>12,.0f} {'-':>12} {'new':>8}")
+            continue
+        change = normalised / baseline - 1
+        limit = threshold if threshold is not None else args.threshold
+        flag = '  REGRESSION' if change > limit else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:<32} {normalised:>12,.0f} {baseline:>12,.0f} {change:>+8.1%}{flag}")
+
+    if args.save:
+        if baselines and 'calibration' in baselines:
+            saved = {name: value * scale for name, value in results.items()}
+            saved['calibration'] = baselines['calibration']
+        else:
+            saved = dict(results)
+        baselines.update({name: round(value, 1) for name, value in saved.items()})
+        with open(args.baselines, 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(baselines.items())), f, indent=2)
+            f.write('\n')
+        print(f"Baselines written to {args.baselines}")
+        return 0
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
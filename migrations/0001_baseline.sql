@@ -1,3 +1,7 @@
+-- Baseline schema. Replaces schema.sql and the CREATE block of init_db():
+-- fresh databases get the full schema, databases created by either of them
+-- are brought to the same shape by the ALTER statements further down.
+
 -- Table of available plans
 CREATE TABLE IF NOT EXISTS plans (
     id SERIAL PRIMARY KEY,
@@ -18,6 +22,7 @@ CREATE TABLE IF NOT EXISTS companies (
     email TEXT NOT NULL UNIQUE,
     country TEXT NOT NULL,
     industry TEXT NOT NULL,
+    cnpj VARCHAR(20),
     stripe_customer_id TEXT,
     date_registered TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     is_active BOOLEAN NOT NULL DEFAULT FALSE,
@@ -31,14 +36,14 @@ CREATE TABLE IF NOT EXISTS companies (
     current_users INT DEFAULT 1
 );
 
--- Table of subscriptions (full version)
+-- Table of subscriptions (the checkout webhook records them before the plan is known)
 CREATE TABLE IF NOT EXISTS subscriptions (
     id SERIAL PRIMARY KEY,
     company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
-    plan_id INTEGER NOT NULL REFERENCES plans(id),
+    plan_id INTEGER REFERENCES plans(id),
     stripe_subscription_id TEXT NOT NULL UNIQUE,
     status TEXT NOT NULL CHECK (status IN ('active', 'trialing', 'past_due', 'canceled', 'unpaid')),
-    current_period_start TIMESTAMP NOT NULL,
+    current_period_start TIMESTAMP,
     current_period_end TIMESTAMP NOT NULL,
     cancel_at_period_end BOOLEAN NOT NULL DEFAULT FALSE,
     last_invoice_id TEXT,
@@ -64,6 +69,7 @@ CREATE TABLE IF NOT EXISTS users (
     reset_token TEXT,
     reset_token_expiry TIMESTAMP,
     last_login TIMESTAMP,
+    role TEXT DEFAULT 'User',
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
@@ -80,14 +86,14 @@ CREATE TABLE IF NOT EXISTS projects (
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
--- Table of tasks
+-- Table of tasks (assigned_user holds what the task form submits)
 CREATE TABLE IF NOT EXISTS tasks (
     id SERIAL PRIMARY KEY,
     project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
     title TEXT NOT NULL,
     description TEXT,
     due_date DATE,
-    assigned_user_id INTEGER REFERENCES users(id),
+    assigned_user TEXT,
     status TEXT NOT NULL DEFAULT 'Not Started',
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
@@ -101,6 +107,7 @@ CREATE TABLE IF NOT EXISTS income (
     date DATE NOT NULL,
     amount NUMERIC(15, 2) NOT NULL,
     currency VARCHAR(3) NOT NULL,
+    description TEXT,
     invoice_id TEXT,
     invoice_link TEXT,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -115,6 +122,7 @@ CREATE TABLE IF NOT EXISTS expenses (
     date DATE NOT NULL,
     amount NUMERIC(15, 2) NOT NULL,
     currency VARCHAR(3) NOT NULL,
+    description TEXT,
     invoice_id TEXT,
     invoice_link TEXT,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -168,6 +176,56 @@ CREATE TABLE IF NOT EXISTS plan_changes (
     stripe_event_id TEXT
 );
 
+-- Table of Stripe payment events awaiting handling
+CREATE TABLE IF NOT EXISTS payment_events (
+    id SERIAL PRIMARY KEY,
+    company_id INTEGER NOT NULL REFERENCES companies(id),
+    event_type VARCHAR(50) NOT NULL,
+    event_data JSONB,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Table of server-side sessions (resolved user/company/plan context)
+CREATE TABLE IF NOT EXISTS user_sessions (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    company_id INTEGER NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+    context JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Table of shared token buckets (RATE_LIMIT_BACKEND=database)
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at DOUBLE PRECISION NOT NULL,
+    allowed BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+-- Columns missing from databases created by schema.sql or init_db()
+ALTER TABLE plans ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE plans ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS cnpj VARCHAR(20);
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS max_projects INT DEFAULT 3;
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS max_users INT DEFAULT 1;
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS max_storage VARCHAR(20) DEFAULT '100MB';
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS current_projects INT DEFAULT 0;
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS current_users INT DEFAULT 1;
+ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS renewal_date DATE NOT NULL DEFAULT (CURRENT_DATE + INTERVAL '1 month');
+ALTER TABLE subscriptions ALTER COLUMN plan_id DROP NOT NULL;
+ALTER TABLE subscriptions ALTER COLUMN current_period_start DROP NOT NULL;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS phone TEXT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS role TEXT DEFAULT 'User';
+ALTER TABLE users ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS assigned_user TEXT;
+ALTER TABLE income ADD COLUMN IF NOT EXISTS description TEXT;
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS description TEXT;
+
 -- Indexes for optimization
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_company ON users(company_id);
@@ -175,13 +233,12 @@ CREATE INDEX IF NOT EXISTS idx_companies_email ON companies(email);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_company ON subscriptions(company_id);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_status ON subscriptions(status);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_period ON subscriptions(current_period_end);
-CREATE INDEX IF NOT EXISTS idx_projects_company ON projects(company_id);
-CREATE INDEX IF NOT EXISTS idx_tasks_project ON tasks(project_id);
-CREATE INDEX IF NOT EXISTS idx_income_project ON income(project_id);
-CREATE INDEX IF NOT EXISTS idx_expenses_project ON expenses(project_id);
-CREATE INDEX IF NOT EXISTS idx_plan_changes_company ON plan_changes(company_id);
+CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_user_sessions_company ON user_sessions(company_id);
 CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_email ON users(email);
 CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_company_email ON companies(email);
+-- init_db() created plans.name without UNIQUE; the seed below upserts on it
+CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_plan_name ON plans(name);
 
 -- Trigger to update project count in companies table
 CREATE OR REPLACE FUNCTION update_project_count()
@@ -243,7 +300,7 @@ BEGIN
 END;
 $$;
 
--- Trigger to auto-update the updated_at column
+-- Trigger to auto-update the updated_at column (only tables that have one)
 CREATE OR REPLACE FUNCTION update_modified_column()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -252,18 +309,24 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- schema.sql also attached it to tables without updated_at, failing every UPDATE on them
+DROP TRIGGER IF EXISTS update_general_expenses_updated_at ON general_expenses;
+DROP TRIGGER IF EXISTS update_audit_log_updated_at ON audit_log;
+DROP TRIGGER IF EXISTS update_payments_updated_at ON payments;
+DROP TRIGGER IF EXISTS update_plan_changes_updated_at ON plan_changes;
+
 DO $$
 DECLARE
     tbl text;
 BEGIN
     FOR tbl IN
         SELECT table_name
-        FROM information_schema.tables
-        WHERE table_schema = 'public'
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+        AND column_name = 'updated_at'
         AND table_name IN (
-            'plans', 'companies', 'subscriptions', 'users', 
-            'projects', 'tasks', 'income', 'expenses', 
-            'general_expenses', 'audit_log', 'payments', 'plan_changes'
+            'plans', 'companies', 'subscriptions', 'users',
+            'projects', 'tasks', 'income', 'expenses'
         )
     LOOP
         IF NOT EXISTS (
@@ -280,36 +343,22 @@ END;
 $$;
 
 -- Insert or update default plans
-INSERT INTO plans (name, description, features, price, stripe_price_id) 
-VALUES 
-('Free', 'Initial free plan', 
- '{"max_projects": 3, "max_users": 1, "max_storage": "100MB"}', 
+INSERT INTO plans (name, description, features, price, stripe_price_id)
+VALUES
+('Free', 'Initial free plan',
+ '{"max_projects": 3, "max_users": 1, "max_storage": "100MB"}',
  0.00, 'price_1Rap7kGK1tkBcsruKBjT5y7c'),
-('Basic', 'Basic plan for small teams', 
- '{"max_projects": 10, "max_users": 5, "max_storage": "1GB"}', 
+('Basic', 'Basic plan for small teams',
+ '{"max_projects": 10, "max_users": 5, "max_storage": "1GB"}',
  99.00, 'price_1Rap86GK1tkBcsruzIHX09Ek'),
-('Professional', 'Comprehensive plan for businesses', 
- '{"max_projects": 50, "max_users": 20, "max_storage": "10GB"}', 
+('Professional', 'Comprehensive plan for businesses',
+ '{"max_projects": 50, "max_users": 20, "max_storage": "10GB"}',
  199.00, 'price_1RapH6GK1tkBcsruge7gNO4m'),
-('Enterprise', 'Custom enterprise solution', 
- '{"max_projects": -1, "max_users": -1, "max_storage": "100GB"}', 
+('Enterprise', 'Custom enterprise solution',
+ '{"max_projects": -1, "max_users": -1, "max_storage": "100GB"}',
  499.00, 'price_1RapHbGK1tkBcsru3vvG2fbZ')
 ON CONFLICT (name) DO UPDATE SET
     description = EXCLUDED.description,
     features = EXCLUDED.features,
     price = EXCLUDED.price,
     stripe_price_id = EXCLUDED.stripe_price_id;
-
--- Insert demo company (ignores if already exists)
-INSERT INTO companies (name, email, country, industry, is_active, plan_id)
-VALUES ('Demo Company', 'demo@company.com', 'BR', 'Technology', TRUE, 
-        (SELECT id FROM plans WHERE name = 'Professional'))
-ON CONFLICT (email) DO NOTHING;
-
--- Insert admin user for demo company (password: 'password123')
-INSERT INTO users (first_name, last_name, email, password, company_id, is_admin, email_verified)
-VALUES ('Admin', 'Demo', 'admin@demo.com', 
-        '$2a$12$K9/IcF0Yd/w7WJN1d6S0.OUg4DnQ.F0n3O3V7nR7zX1bV8JkL8ZZG',
-        (SELECT id FROM companies WHERE email = 'demo@company.com'), 
-        TRUE, TRUE)
-ON CONFLICT (email) DO NOTHING;
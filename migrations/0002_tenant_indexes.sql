@@ -0,0 +1,23 @@
+-- migrate: no-transaction
+-- Composite indexes for the tenant-scoped, date-ordered access paths, built
+-- without blocking writes. Most list endpoints filter by company_id (directly
+-- or through projects) or project_id and sort by date, the income/expense
+-- forms count rows by (date, project_id) and the e-mail flows look users up
+-- by token; only users with a pending verification or reset carry a token.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_projects_company_start ON projects (company_id, start_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_income_project_date ON income (project_id, date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_expenses_project_date ON expenses (project_id, date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_general_expenses_company_date ON general_expenses (company_id, date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_project_status ON tasks (project_id, status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_company_date ON payments (company_id, payment_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_plan_changes_company_date ON plan_changes (company_id, change_date DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_verification_token ON users (verification_token) WHERE verification_token IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_reset_token ON users (reset_token) WHERE reset_token IS NOT NULL;
+
+-- Single-column indexes that are now a leading prefix of a composite one
+DROP INDEX CONCURRENTLY IF EXISTS idx_projects_company;
+DROP INDEX CONCURRENTLY IF EXISTS idx_income_project;
+DROP INDEX CONCURRENTLY IF EXISTS idx_expenses_project;
+DROP INDEX CONCURRENTLY IF EXISTS idx_tasks_project;
+DROP INDEX CONCURRENTLY IF EXISTS idx_plan_changes_company;
@@ -0,0 +1,157 @@
+-- Per-project and per-company KPIs as materialized views, refreshed
+-- CONCURRENTLY by app/kpi_views.py. Every materialized view is a snapshot of
+-- a plain "_live" view with the same columns; readers switch to the live
+-- view when the snapshot is older than the configured bound.
+--
+-- Amounts are kept per currency (jsonb {"EUR": 1234.50, ...}) and converted
+-- to PLN when read, with the current exchange rates.
+
+CREATE OR REPLACE VIEW project_kpis_live AS
+SELECT
+    p.id AS project_id,
+    p.company_id,
+    p.name,
+    p.description,
+    p.start_date,
+    p.end_date,
+    COALESCE(inc.by_currency, '{}'::jsonb) AS income_by_currency,
+    COALESCE(exp.by_currency, '{}'::jsonb) AS expenses_by_currency,
+    COALESCE(inc.entries, 0) AS income_entries,
+    COALESCE(exp.entries, 0) AS expense_entries,
+    COALESCE(t.total, 0) AS total_tasks,
+    COALESCE(t.completed, 0) AS completed_tasks
+FROM projects p
+LEFT JOIN LATERAL (
+    SELECT jsonb_object_agg(currency, total) AS by_currency, SUM(entries)::integer AS entries
+    FROM (
+        SELECT currency, SUM(amount) AS total, COUNT(*) AS entries
+        FROM income
+        WHERE project_id = p.id
+        GROUP BY currency
+    ) s
+) inc ON TRUE
+LEFT JOIN LATERAL (
+    SELECT jsonb_object_agg(currency, total) AS by_currency, SUM(entries)::integer AS entries
+    FROM (
+        SELECT currency, SUM(amount) AS total, COUNT(*) AS entries
+        FROM expenses
+        WHERE project_id = p.id
+        GROUP BY currency
+    ) s
+) exp ON TRUE
+LEFT JOIN LATERAL (
+    SELECT COUNT(*)::integer AS total,
+           (COUNT(*) FILTER (WHERE status = 'Completed'))::integer AS completed
+    FROM tasks
+    WHERE project_id = p.id
+) t ON TRUE;
+
+-- Monthly totals per project and currency; general expenses use project_id 0
+-- (a unique index over NULLs cannot drive REFRESH ... CONCURRENTLY)
+CREATE OR REPLACE VIEW ledger_monthly_live AS
+SELECT p.company_id, i.project_id, 'income'::text AS kind, date_trunc('month', i.date)::date AS month,
+       i.currency, SUM(i.amount) AS amount, COUNT(*)::integer AS entries
+FROM income i
+JOIN projects p ON p.id = i.project_id
+GROUP BY p.company_id, i.project_id, date_trunc('month', i.date)::date, i.currency
+UNION ALL
+SELECT p.company_id, e.project_id, 'expense'::text, date_trunc('month', e.date)::date,
+       e.currency, SUM(e.amount), COUNT(*)::integer
+FROM expenses e
+JOIN projects p ON p.id = e.project_id
+GROUP BY p.company_id, e.project_id, date_trunc('month', e.date)::date, e.currency
+UNION ALL
+SELECT g.company_id, 0, 'general'::text, date_trunc('month', g.date)::date,
+       g.currency, SUM(g.amount), COUNT(*)::integer
+FROM general_expenses g
+WHERE g.company_id IS NOT NULL
+GROUP BY g.company_id, date_trunc('month', g.date)::date, g.currency;
+
+CREATE OR REPLACE VIEW company_kpis_live AS
+SELECT
+    c.id AS company_id,
+    COALESCE(pr.projects, 0) AS project_count,
+    COALESCE(u.users, 0) AS user_count,
+    COALESCE(t.total, 0) AS total_tasks,
+    COALESCE(t.completed, 0) AS completed_tasks,
+    COALESCE(l.income, '{}'::jsonb) AS income_by_currency,
+    COALESCE(l.expenses, '{}'::jsonb) AS expenses_by_currency,
+    COALESCE(l.general, '{}'::jsonb) AS general_by_currency
+FROM companies c
+LEFT JOIN LATERAL (
+    SELECT COUNT(*)::integer AS projects FROM projects WHERE company_id = c.id
+) pr ON TRUE
+LEFT JOIN LATERAL (
+    SELECT COUNT(*)::integer AS users FROM users WHERE company_id = c.id
+) u ON TRUE
+LEFT JOIN LATERAL (
+    SELECT COUNT(*)::integer AS total,
+           (COUNT(*) FILTER (WHERE t.status = 'Completed'))::integer AS completed
+    FROM tasks t
+    JOIN projects p ON p.id = t.project_id
+    WHERE p.company_id = c.id
+) t ON TRUE
+LEFT JOIN LATERAL (
+    SELECT jsonb_object_agg(currency, total) FILTER (WHERE kind = 'income') AS income,
+           jsonb_object_agg(currency, total) FILTER (WHERE kind = 'expense') AS expenses,
+           jsonb_object_agg(currency, total) FILTER (WHERE kind = 'general') AS general
+    FROM (
+        SELECT kind, currency, SUM(amount) AS total
+        FROM ledger_monthly_live
+        WHERE company_id = c.id
+        GROUP BY kind, currency
+    ) s
+) l ON TRUE;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS project_kpis AS SELECT * FROM project_kpis_live;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_project_kpis_project ON project_kpis (project_id);
+CREATE INDEX IF NOT EXISTS idx_project_kpis_company ON project_kpis (company_id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ledger_monthly AS SELECT * FROM ledger_monthly_live;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ledger_monthly_key ON ledger_monthly (company_id, kind, project_id, month, currency);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS company_kpis AS SELECT * FROM company_kpis_live;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_company_kpis_company ON company_kpis (company_id);
+
+-- Single row: when the views were last refreshed and since when writes are
+-- waiting for the next refresh (NULL = none)
+CREATE TABLE IF NOT EXISTS kpi_refresh_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    refreshed_at TIMESTAMP WITH TIME ZONE,
+    dirty_since TIMESTAMP WITH TIME ZONE
+);
+INSERT INTO kpi_refresh_state (id, refreshed_at) VALUES (1, NOW()) ON CONFLICT (id) DO NOTHING;
+
+-- Statement-level, and only the first write after a refresh updates the row,
+-- so concurrent writers do not queue on it
+CREATE OR REPLACE FUNCTION mark_kpis_dirty()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE kpi_refresh_state SET dirty_since = clock_timestamp()
+    WHERE id = 1 AND dirty_since IS NULL;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS kpis_dirty_income ON income;
+CREATE TRIGGER kpis_dirty_income AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON income
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_kpis_dirty();
+DROP TRIGGER IF EXISTS kpis_dirty_expenses ON expenses;
+CREATE TRIGGER kpis_dirty_expenses AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON expenses
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_kpis_dirty();
+DROP TRIGGER IF EXISTS kpis_dirty_general_expenses ON general_expenses;
+CREATE TRIGGER kpis_dirty_general_expenses AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON general_expenses
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_kpis_dirty();
+DROP TRIGGER IF EXISTS kpis_dirty_tasks ON tasks;
+CREATE TRIGGER kpis_dirty_tasks AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tasks
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_kpis_dirty();
+DROP TRIGGER IF EXISTS kpis_dirty_projects ON projects;
+CREATE TRIGGER kpis_dirty_projects AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON projects
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_kpis_dirty();
+-- Logins update users all the time; only membership changes move the counts
+DROP TRIGGER IF EXISTS kpis_dirty_users ON users;
+CREATE TRIGGER kpis_dirty_users AFTER INSERT OR DELETE OR UPDATE OF company_id ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_kpis_dirty();
+DROP TRIGGER IF EXISTS kpis_dirty_companies ON companies;
+CREATE TRIGGER kpis_dirty_companies AFTER INSERT OR DELETE ON companies
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_kpis_dirty();
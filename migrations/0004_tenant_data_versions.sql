@@ -0,0 +1,9 @@
+-- Per-tenant data version, bumped by every write to the tenant's projects,
+-- ledger and tasks; cached API responses and their ETags are tied to it
+-- (see app/response_cache.py).
+
+CREATE TABLE IF NOT EXISTS tenant_data_versions (
+    company_id INTEGER PRIMARY KEY REFERENCES companies(id) ON DELETE CASCADE,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
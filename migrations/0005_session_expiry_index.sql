@@ -0,0 +1,5 @@
+-- migrate: no-transaction
+-- Expired sessions are deleted periodically (SessionStore.purge_expired);
+-- without this every purge scans the whole table.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_sessions_expires ON user_sessions (expires_at);
@@ -0,0 +1,135 @@
+"""Shared fixtures: the app with throw-away settings, and cursors answering from canned rows.
+
+No database is needed; a test lists ``(fragment, rows)`` pairs and every
+statement containing ``fragment`` gets ``rows``.
+"""
+import os
+import secrets
+import sys
+import tempfile
+
+from cryptography.fernet import Fernet
+
+import pytest
+from psycopg2 import sql
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+
+_scratch = tempfile.mkdtemp(prefix='ayist-tests-')
+os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+os.environ.setdefault('SECRET_KEY', 'tests')
+os.environ.setdefault('LOG_DIR', os.path.join(_scratch, 'logs'))
+os.environ.setdefault('METRICS_DIR', os.path.join(_scratch, 'metrics'))
+os.environ.setdefault('ANALYTICS_DIR', os.path.join(_scratch, 'analytics'))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import instrumentation  # noqa: E402
+
+
+def render(query):
+    """SQL text of ``query`` without a connection (sql.Composed needs one to quote)"""
+    if isinstance(query, sql.Composed):
+        return ''.join(render(part) for part in query.seq)
+    if isinstance(query, sql.Identifier):
+        return '.'.join(f'"{name}"' for name in query.strings)
+    if isinstance(query, sql.SQL):
+        return query.string
+    return query
+
+
+class CannedCursor:
+    """Answers each statement with the rows of the first matching ``(fragment, rows)``
+    and reports it to the query observers like instrumentation.InstrumentedCursor"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.executed = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        text = render(query)
+        self.executed.append(text)
+        self._rows = next((list(rows) for fragment, rows in self.answers if fragment in text), [])
+        for observer in instrumentation.query_observers:
+            observer(self, text, params, 0.0, len(self._rows))
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class CannedConnection:
+    def __init__(self, answers):
+        self.answers = answers
+        self.autocommit = False
+        self.closed = False
+
+    def cursor(self, *args, **kwargs):
+        return CannedCursor(self.answers)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+CONTEXT = {
+    'user_id': 1, 'company_id': 7, 'first_name': 'Ada', 'last_name': 'Lovelace', 'email': 'ada@example.com',
+    'is_admin': True, 'role': 'admin', 'email_verified': True, 'company_name': 'Analytical Engines',
+    'company_email': 'billing@example.com', 'country': 'PL', 'industry': 'Engineering', 'company_active': True,
+    'subscription_status': 'active', 'current_period_end': '2030-01-01T00:00:00', 'plan_id': 2,
+    'plan_name': 'Business', 'plan_features': {'max_projects': 50, 'max_users': 10},
+}
+
+
+@pytest.fixture
+def canned_cursor():
+    return CannedCursor
+
+
+@pytest.fixture(scope='session')
+def webapp():
+    import app
+
+    flask_app = app.create_app()
+    flask_app.testing = True
+    return flask_app
+
+
+@pytest.fixture
+def db(webapp, monkeypatch):
+    """Canned answers for every connection the app opens: append ``(fragment, rows)``"""
+    answers = []
+    app_dir = os.path.abspath(APP_DIR)
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path and os.path.abspath(path).startswith(app_dir) and hasattr(module, 'get_db_connection'):
+            monkeypatch.setattr(module, 'get_db_connection', lambda: CannedConnection(answers))
+    return answers
+
+
+@pytest.fixture
+def login(webapp):
+    """``login(**context_overrides)`` -> test client with a cached server-side session"""
+    from app import session_store
+
+    def logged_in_client(**overrides):
+        context = {**CONTEXT, **overrides}
+        sid = secrets.token_urlsafe(16)
+        session_store._cache_put(sid, context)
+        client = webapp.test_client()
+        with client.session_transaction() as session:
+            session.update(sid=sid, user_id=context['user_id'], company_id=context['company_id'],
+                           is_admin=context['is_admin'])
+        return client
+    return logged_in_client
@@ -0,0 +1,45 @@
+import os
+from datetime import date
+from decimal import Decimal
+
+import pyarrow.parquet as pq
+import pytest
+
+import analytics
+
+
+def write_snapshot(store, company_id, part, refreshed_at):
+    os.makedirs(store._path(company_id), exist_ok=True)
+    rows = [(1, 10, 'income', date(2025, 1, 1), Decimal('12.50'), 'PLN')]
+    pq.write_table(analytics._to_table(rows, analytics._ledger_schema()), store._path(company_id, part))
+    pq.write_table(analytics._to_table([(10, 'Bridge', date(2024, 1, 1))], analytics._project_schema()),
+                   store._path(company_id, 'projects.parquet'))
+    state = {'tables': {'income': {'watermark': 1, 'rows': 1, 'amount': '12.50', 'parts': [part]}},
+             'next_part': 2, 'refreshed_at': refreshed_at}
+    store._write_state(company_id, state)
+    return state
+
+
+def test_load_rereads_state_when_parts_were_compacted_meanwhile(tmp_path, monkeypatch):
+    store = analytics.SnapshotStore(str(tmp_path))
+    stale = write_snapshot(store, 3, 'income-000000.parquet', '2025-01-01T00:00:00')
+    write_snapshot(store, 3, 'income-000001.parquet', '2025-01-01T00:05:00')
+    os.remove(store._path(3, 'income-000000.parquet'))
+
+    # The first state read happens before the other process replaced state.json
+    states = iter([stale])
+    read_state = store.state
+    monkeypatch.setattr(store, 'state', lambda company_id: next(states, None) or read_state(company_id))
+
+    tables, state = store.load(3)
+    assert state['refreshed_at'] == '2025-01-01T00:05:00'
+    assert tables['income'].num_rows == 1
+    assert tables['projects'].column('name').to_pylist() == ['Bridge']
+
+
+def test_load_gives_up_after_one_retry(tmp_path):
+    store = analytics.SnapshotStore(str(tmp_path))
+    write_snapshot(store, 3, 'income-000000.parquet', '2025-01-01T00:00:00')
+    os.remove(store._path(3, 'income-000000.parquet'))
+    with pytest.raises(FileNotFoundError):
+        store.load(3)
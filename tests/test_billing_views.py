@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from nplusone import assert_max_queries, capture_queries
+
+PLANS = [(1, 'Free', 'Starter', 0, {'max_projects': 3}), (2, 'Business', 'Teams', 99, {'max_projects': 50})]
+
+
+def test_plans_for_inactive_company_only_queries_plans(db, login):
+    db.append(('FROM plans', PLANS))
+    response = assert_max_queries(login(company_active=False), '/plans', 1)
+    assert response.status_code == 200
+
+
+def test_plans_redirects_active_company_without_queries(db, login):
+    response = assert_max_queries(login(company_active=True), '/plans', 0)
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/dashboard')
+
+
+def test_company_status_takes_subscription_from_session(db, login):
+    db.extend([
+        ('FROM companies', [(7, 'Analytical Engines', 'billing@example.com', 'PL', 'Engineering',
+                             datetime(2024, 3, 1), True)]),
+        ('kpi_refresh_state', [(True,)]),
+        ('company_kpis', [(5, 4, 0, 0, {}, {}, {})]),
+    ])
+    client = login(plan_name='Business', plan_features={'max_projects': 10, 'max_users': 8})
+    with capture_queries() as statements:
+        response = client.get('/company-status')
+
+    assert response.status_code == 200
+    assert not any('subscriptions' in sql for sql, _ in statements)
+    assert len(statements) == 3
+    page = response.get_data(as_text=True)
+    assert 'Business' in page and '01/03/2024' in page and 'Projects: 5 / 10 (50%)' in page
+
+
+def webhook_count(event_type, result):
+    import metrics
+
+    return metrics._local().counters.get(metrics._key('webhook_events_total', {'type': event_type, 'result': result}), 0)
+
+
+def test_webhook_events_counted_by_result(db, webapp, monkeypatch):
+    import billing_views
+
+    events = iter([{'type': 'customer.created', 'data': {'object': {}}},
+                   {'type': 'invoice.payment_succeeded', 'data': {'object': {}}}])
+    monkeypatch.setattr(billing_views.stripe.Webhook, 'construct_event', lambda *args: next(events))
+    before = webhook_count('customer.created', 'ignored'), webhook_count('invoice.payment_succeeded', 'error')
+
+    client = webapp.test_client()
+    assert client.post('/api/subscriptions/webhook', data=b'{}').status_code == 200
+    # An invoice without a customer makes the handler fail
+    assert client.post('/api/subscriptions/webhook', data=b'{}').status_code == 200
+
+    after = webhook_count('customer.created', 'ignored'), webhook_count('invoice.payment_succeeded', 'error')
+    assert (after[0] - before[0], after[1] - before[1]) == (1, 1)
@@ -0,0 +1,73 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import kpi_views
+from nplusone import capture_queries
+from project_summary import summary_row_to_dict
+
+TODAY = date(2025, 6, 15)
+RATES = {'PLN': 1.0, 'EUR': 4.0, 'USD': 3.5}
+
+
+def kpi_row(project_id, income, expenses, tasks=4, completed=2):
+    return (project_id, f"Project {project_id}", None, date(2024, 1, 1), None, income, expenses, tasks, completed)
+
+
+@pytest.mark.parametrize('row, expected', [
+    ((1, 'Done', 'd', date(2024, 1, 1), date(2025, 1, 1), Decimal('1000.50'), 250, Decimal('750.50'), 4, 3),
+     {'project_id': 1, 'name': 'Done', 'description': 'd', 'start_date': '2024-01-01', 'end_date': '2025-01-01',
+      'income': 1000.5, 'expenses': 250.0, 'profit': 750.5, 'status': 'Completed', 'completion': 75}),
+    ((2, 'Running', None, date(2025, 1, 1), date(2026, 1, 1), 0, 0, 0, 3, 1),
+     {'status': 'In Progress', 'completion': 33, 'income': 0.0}),
+    ((3, 'Open-ended', None, date(2025, 6, 15), None, 10, 20, -10, None, None),
+     {'status': 'In Progress', 'completion': 0, 'end_date': None, 'profit': -10.0}),
+    ((4, 'Future', None, date(2025, 7, 1), None, 0, 0, 0, 0, 0),
+     {'status': 'Not Started', 'completion': 0}),
+    ((5, 'Undated', None, None, None, 0, 0, 0, 2, 2),
+     {'status': 'Not Started', 'start_date': None, 'completion': 100}),
+])
+def test_summary_row_to_dict(row, expected):
+    summary = summary_row_to_dict(row, TODAY)
+    assert {key: summary[key] for key in expected} == expected
+
+
+@pytest.mark.parametrize('count', [1, 10, 500])
+def test_project_kpis_convert_to_pln_in_constant_queries(canned_cursor, count):
+    rows = [kpi_row(i, {'PLN': 100, 'EUR': Decimal('10')}, {'USD': 20}) for i in range(1, count + 1)]
+    cur = canned_cursor([('kpi_refresh_state', [(True,)]), ('project_kpis', rows)])
+    with capture_queries() as statements:
+        projects = kpi_views.fetch_project_kpis(cur, 7, RATES.get)
+
+    assert len(statements) == 2
+    assert [p['project_id'] for p in projects] == list(range(1, count + 1))
+    # 100 PLN + 10 EUR * 4.0; 20 USD * 3.5
+    assert (projects[0]['income'], projects[0]['expenses'], projects[0]['profit']) == (140.0, 70.0, 70.0)
+
+
+def test_project_kpis_read_live_view_when_snapshot_is_stale(canned_cursor):
+    cur = canned_cursor([('kpi_refresh_state', [(False,)]), ('project_kpis', [])])
+    kpi_views.fetch_project_kpis(cur, 7, RATES.get)
+    assert '"project_kpis_live"' in cur.executed[-1]
+
+
+COMPANY_ROW = (3, 2, 10, 4, {'PLN': 1000}, {'EUR': 50}, {'PLN': 100})
+COMPANY_KPIS = {'project_count': 3, 'user_count': 2, 'total_tasks': 10, 'completed_tasks': 4, 'completion': 40,
+                'income': 1000.0, 'project_expenses': 200.0, 'general_expenses': 100.0, 'expenses': 300.0,
+                'profit': 700.0}
+
+
+def test_company_kpis(canned_cursor):
+    cur = canned_cursor([('kpi_refresh_state', [(True,)]), ('company_kpis', [COMPANY_ROW])])
+    with capture_queries() as statements:
+        assert kpi_views.fetch_company_kpis(cur, 7, RATES.get) == COMPANY_KPIS
+    assert len(statements) == 2
+
+
+def test_company_kpis_fall_back_to_live_view_for_new_company(canned_cursor):
+    cur = canned_cursor([('kpi_refresh_state', [(True,)]), ('company_kpis_live', [COMPANY_ROW]),
+                         ('company_kpis', [])])
+    with capture_queries() as statements:
+        assert kpi_views.fetch_company_kpis(cur, 7, RATES.get) == COMPANY_KPIS
+    assert len(statements) == 3
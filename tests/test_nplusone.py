@@ -0,0 +1,56 @@
+import itertools
+import logging
+
+import pytest
+from flask import Flask
+
+import nplusone
+from nplusone import assert_max_queries
+
+
+# A fresh tenant data version per test, so the response cache never answers instead of the handler
+_versions = itertools.count(1)
+
+
+def dashboard_answers(projects):
+    rows = [(i, f"Project {i}", None, None, None, {'PLN': 100}, {}, 0, 0) for i in range(1, projects + 1)]
+    return [('tenant_data_versions', [(next(_versions), 1700000000.0)]), ('kpi_refresh_state', [(True,)]),
+            ('project_kpis', rows)]
+
+
+@pytest.mark.parametrize('projects', [1, 50])
+def test_dashboard_data_query_count_does_not_grow_with_projects(db, login, projects):
+    db.extend(dashboard_answers(projects))
+    response = assert_max_queries(login(), '/api/project-dashboard-data', 3)
+    assert response.status_code == 200
+    assert len(response.get_json()) == projects
+
+
+def test_assert_max_queries_lists_the_statements(db, login):
+    db.extend(dashboard_answers(1))
+    with pytest.raises(AssertionError, match=r'ran 3 queries \(max 2\)[\s\S]*project_kpis'):
+        assert_max_queries(login(), '/api/project-dashboard-data', 2)
+
+
+def test_detector_reports_repeated_statements_through_the_logger(canned_cursor, monkeypatch, caplog, capsys):
+    monkeypatch.setenv('NPLUSONE_DETECT', '1')
+    app = Flask(__name__)
+    logger = logging.getLogger('tests.nplusone')
+    detector = nplusone.init_app(app, logger)
+
+    @app.route('/loop')
+    def loop():
+        cur = canned_cursor([])
+        for project_id in range(6):
+            cur.execute("SELECT COUNT(*) FROM tasks WHERE project_id = %s", (project_id,))
+        return 'ok'
+
+    try:
+        with caplog.at_level(logging.WARNING, logger='tests.nplusone'):
+            app.test_client().get('/loop')
+    finally:
+        nplusone.instrumentation.query_observers.remove(detector.observe)
+
+    assert len(caplog.records) == 1
+    assert '6 executions, 6 distinct parameter sets' in caplog.records[0].getMessage()
+    assert capsys.readouterr().err == ''
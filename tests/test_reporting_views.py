@@ -0,0 +1,19 @@
+from datetime import date
+
+
+def test_company_status_api_needs_a_session(db, webapp):
+    response = webapp.test_client().get('/api/companies/7/status')
+    assert response.status_code == 302
+    assert db == []
+
+
+def test_company_status_api_refuses_other_companies(db, login):
+    assert login(company_id=7).get('/api/companies/8/status').status_code == 403
+
+
+def test_company_status_api_serves_own_company(db, login):
+    db.extend([('kpi_refresh_state', [(True,)]),
+               ('project_kpis', [(1, 'Bridge', None, date(2024, 1, 1), None, {'PLN': 10}, {}, 0, 0)])])
+    response = login(company_id=7).get('/api/companies/7/status')
+    assert response.status_code == 200
+    assert [project['name'] for project in response.get_json()] == ['Bridge']